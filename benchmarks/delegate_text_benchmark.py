@@ -0,0 +1,182 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Compares the text formatting cost of painting 1,000 publish rows with the
+thumbnail and list delegates, between the previous implementation formatting
+the text on every paint and the display text precomputed by the model.
+
+Usage: python delegate_text_benchmark.py [number of paints]
+"""
+
+import os
+import sys
+import imp
+import time
+import random
+import datetime
+
+# load the module directly, the package requires Toolkit
+display_text = imp.load_source(
+    "display_text",
+    os.path.join(os.path.dirname(__file__), "..", "python", "tk_multi_loader", "display_text.py")
+)
+
+NUM_ROWS = 1000
+
+
+def legacy_thumb_text(sg_data, publish_type_name, sub_items_mode):
+    """
+    The formatting previously done by SgPublishThumbDelegate._format_publish on every paint.
+    """
+    name_str = "Unnamed"
+    if sg_data.get("name"):
+        name_str = sg_data.get("name")
+
+    if sg_data.get("version_number"):
+        name_str += " v%s" % sg_data.get("version_number")
+
+    if sg_data.get("task_uniqueness") == False and sg_data.get("task") is not None:
+        name_str += " (%s)" % sg_data["task"]["name"]
+
+    header_text = name_str
+
+    if sub_items_mode:
+        entity_link = sg_data.get("entity")
+        if entity_link is None:
+            details_text = "Unlinked"
+        else:
+            details_text = "%s %s" % (entity_link["type"], entity_link["name"])
+    else:
+        details_text = publish_type_name
+
+    return (header_text, details_text)
+
+
+def legacy_list_text(sg_data, publish_type_name, sub_items_mode):
+    """
+    The formatting previously done by SgPublishListDelegate._format_publish on every paint.
+    """
+    main_text = "<b>%s</b>" % (sg_data.get("name") or "Unnamed")
+
+    version = sg_data.get("version_number")
+    vers_str = "%03d" % version if version is not None else "N/A"
+
+    main_text += " Version %s" % vers_str
+
+    if sub_items_mode:
+        main_text += "  ("
+
+        entity_link = sg_data.get("entity")
+        if entity_link:
+            main_text += "%s <span style='color:#2C93E2'>%s</span>" % (entity_link["type"], entity_link["name"])
+
+        if sg_data.get("task") is not None:
+            main_text += ", Task %s" % sg_data["task"]["name"]
+
+        main_text += ")"
+    elif sg_data.get("task") is not None:
+        main_text += "  (Task %s)" % sg_data["task"]["name"]
+
+    created_unixtime = sg_data.get("created_at") or 0
+    date_str = datetime.datetime.fromtimestamp(created_unixtime).strftime('%Y-%m-%d %H:%M')
+    if sg_data.get("created_by") and sg_data["created_by"].get("name"):
+        author_str = sg_data["created_by"].get("name")
+    else:
+        author_str = "Unspecified User"
+    small_text = "<span style='color:#2C93E2'>%s</span> by %s at %s" % (publish_type_name,
+                                                                        author_str,
+                                                                        date_str)
+    return (main_text, small_text)
+
+
+def make_rows(seed=0):
+    """
+    Creates synthetic publish rows, as (sg_data, publish type name) tuples.
+    """
+    rng = random.Random(seed)
+    users = [{"type": "HumanUser", "id": x, "name": "User %d" % x} for x in range(10)] + [None]
+    tasks = [{"type": "Task", "id": x, "name": "Task %d" % x} for x in range(5)] + [None]
+    rows = []
+    for idx in xrange(NUM_ROWS):
+        sg_data = {
+            "type": "PublishedFile",
+            "id": idx + 1,
+            "name": "publish_%d" % idx,
+            "version_number": rng.randint(1, 100),
+            "task": rng.choice(tasks),
+            "task_uniqueness": rng.random() < 0.8,
+            "entity": {"type": "Shot", "id": idx % 50, "name": "shot_%03d" % (idx % 50)},
+            "created_by": rng.choice(users),
+            "created_at": 1425378837.0 + idx * 60,
+        }
+        rows.append((sg_data, "Type %d" % rng.randint(0, 20)))
+    return rows
+
+
+def check_results(rows):
+    """
+    Makes sure both implementations agree.
+    """
+    for (sg_data, type_name) in rows:
+        text = display_text.PublishDisplayText(sg_data, type_name)
+        for sub_items_mode in (False, True):
+            assert text.get_thumb_text(sub_items_mode) == legacy_thumb_text(sg_data, type_name, sub_items_mode)
+            assert text.get_list_text(sub_items_mode) == legacy_list_text(sg_data, type_name, sub_items_mode)
+
+
+def paint_legacy(rows, num_paints):
+    for _ in xrange(num_paints):
+        for (sg_data, type_name) in rows:
+            legacy_thumb_text(sg_data, type_name, False)
+            legacy_list_text(sg_data, type_name, False)
+
+
+def paint_precomputed(texts, num_paints):
+    for _ in xrange(num_paints):
+        for text in texts:
+            text.get_thumb_text(False)
+            text.get_list_text(False)
+
+
+def precompute(rows):
+    return [display_text.PublishDisplayText(sg_data, type_name) for (sg_data, type_name) in rows]
+
+
+def time_call(fn, *args):
+    """
+    Returns the best of three timings for the given call.
+    """
+    timings = []
+    for _ in range(3):
+        start = time.time()
+        fn(*args)
+        timings.append(time.time() - start)
+    return min(timings)
+
+
+def main(num_paints):
+    rows = make_rows()
+    check_results(rows)
+    texts = precompute(rows)
+
+    legacy = time_call(paint_legacy, rows, num_paints) / num_paints
+    precomputed = time_call(paint_precomputed, texts, num_paints) / num_paints
+    setup = time_call(precompute, rows)
+
+    print "Text formatting cost of painting %d rows, thumbnail and list delegates:" % NUM_ROWS
+    print "%28s %10.3f ms" % ("formatted on every paint", legacy * 1000)
+    print "%28s %10.3f ms" % ("precomputed by the model", precomputed * 1000)
+    print "%28s %10.3f ms" % ("one-off precompute", setup * 1000)
+    print "%28s %9.1fx" % ("speedup per paint", legacy / precomputed)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
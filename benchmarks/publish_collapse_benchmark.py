@@ -0,0 +1,135 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Compares the latest version collapse used by the publish model against the
+previous per publish implementation, on synthetic publish lists.
+
+Usage: python publish_collapse_benchmark.py [number of rows ...]
+"""
+
+import os
+import sys
+import imp
+import time
+import random
+from collections import defaultdict
+
+# load the module directly, the package requires Toolkit
+publish_collapse = imp.load_source(
+    "publish_collapse",
+    os.path.join(os.path.dirname(__file__), "..", "python", "tk_multi_loader", "publish_collapse.py")
+)
+
+PUBLISH_TYPE_FIELD = "published_file_type"
+
+
+def legacy_collapse(sg_data_list, publish_type_field):
+    """
+    The per publish implementation previously used by SgLatestPublishModel._before_data_processing.
+    """
+    type_id_aggregates = defaultdict(int)
+    unique_data = {}
+    name_type_aggregates = defaultdict(int)
+    version_index = defaultdict(list)
+
+    for sg_item in sg_data_list:
+        type_id = None
+        type_link = sg_item[publish_type_field]
+        if type_link:
+            type_id = type_link["id"]
+
+        task_id = None
+        task_link = sg_item["task"]
+        if task_link:
+            task_id = task_link["id"]
+
+        unique_data[(sg_item["name"], type_id, task_id)] = {"sg_item": sg_item, "type_id": type_id}
+        version_index[(sg_item["name"], type_id, task_id)].append(sg_item)
+        name_type_aggregates[(sg_item["name"], type_id)] += 1
+
+    new_sg_data = []
+    for second_pass_data in unique_data.values():
+        sg_item = second_pass_data["sg_item"]
+        if name_type_aggregates[(sg_item["name"], second_pass_data["type_id"])] > 1:
+            sg_item["task_uniqueness"] = False
+        else:
+            sg_item["task_uniqueness"] = True
+        new_sg_data.append(sg_item)
+        type_id_aggregates[second_pass_data["type_id"]] += 1
+
+    return (new_sg_data, name_type_aggregates, type_id_aggregates, version_index)
+
+
+def make_publishes(num_rows, seed=0):
+    """
+    Creates a synthetic list of publishes, in ascending creation order, with
+    roughly 8 versions per publish.
+    """
+    rng = random.Random(seed)
+    types = [{"type": "PublishedFileType", "id": x, "name": "Type %d" % x} for x in range(20)] + [None]
+    tasks = [{"type": "Task", "id": x, "name": "Task %d" % x} for x in range(50)] + [None]
+    num_names = max(num_rows / 40, 1)
+
+    sg_data_list = []
+    for idx in xrange(num_rows):
+        sg_data_list.append({
+            "type": "PublishedFile",
+            "id": idx + 1,
+            "name": "publish_%d" % rng.randint(0, num_names),
+            PUBLISH_TYPE_FIELD: rng.choice(types),
+            "task": tasks[rng.randint(0, 4) * 10] if rng.random() < 0.95 else None,
+            "created_at": 1425378837.0 + idx,
+        })
+    return sg_data_list
+
+
+def check_results(sg_data_list):
+    """
+    Makes sure both implementations agree.
+    """
+    (legacy_data, legacy_name_type, legacy_type, legacy_versions) = legacy_collapse(sg_data_list, PUBLISH_TYPE_FIELD)
+    legacy_flags = dict((x["id"], x["task_uniqueness"]) for x in legacy_data)
+
+    (new_data, new_name_type, new_type, new_versions) = publish_collapse.collapse_latest_versions(
+        sg_data_list, PUBLISH_TYPE_FIELD
+    )
+    new_flags = dict((x["id"], x["task_uniqueness"]) for x in new_data)
+
+    assert legacy_flags == new_flags
+    assert dict(legacy_name_type) == new_name_type
+    assert dict(legacy_type) == new_type
+    assert dict(legacy_versions) == new_versions
+
+
+def time_call(fn, *args):
+    """
+    Returns the best of three timings for the given call.
+    """
+    timings = []
+    for _ in range(3):
+        start = time.time()
+        fn(*args)
+        timings.append(time.time() - start)
+    return min(timings)
+
+
+def main(sizes):
+    print "%10s %12s %12s %8s" % ("rows", "legacy (s)", "columnar (s)", "speedup")
+    for num_rows in sizes:
+        sg_data_list = make_publishes(num_rows)
+        check_results(sg_data_list)
+        legacy = time_call(legacy_collapse, sg_data_list, PUBLISH_TYPE_FIELD)
+        columnar = time_call(publish_collapse.collapse_latest_versions, sg_data_list, PUBLISH_TYPE_FIELD)
+        print "%10d %12.3f %12.3f %7.2fx" % (num_rows, legacy, columnar, legacy / columnar)
+
+
+if __name__ == "__main__":
+    main([int(x) for x in sys.argv[1:]] or [10000, 100000, 1000000])
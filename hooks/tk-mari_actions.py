@@ -96,6 +96,14 @@ class MariActions(HookBaseClass):
         
         return action_instances
 
+    def get_action_cache_key(self, sg_publish_data, actions, ui_area):
+        """
+        Returns None so that the action instances are never cached, see the
+        cache_action_definitions setting: they depend on the geometry loaded
+        in the current project.
+        """
+        return None
+
     def execute_multiple_actions(self, actions):
         """
         Executes the specified action on a list of items.
@@ -62,6 +62,12 @@ class ActionManager(QtCore.QObject):
         """
         return []
     
+    def clear_action_cache(self):
+        """
+        Discards any cached action definitions, e.g. when the hooks have been reloaded.
+        """
+        pass
+
     def get_default_action_for_publish(self, sg_data, ui_area):
         """
         Get the default action for the specified publish data.
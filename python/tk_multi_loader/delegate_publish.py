@@ -1,4 +1,5 @@
 import sgtk
+from collections import OrderedDict
 
 from sgtk.platform.qt import QtCore, QtGui
 
@@ -45,6 +46,7 @@ class PublishWidget(QtGui.QWidget):
         self._transp_highlight_str = "rgba(%s, %s, %s, 25%%)" % (highlight_col.red(),
                                                                  highlight_col.green(),
                                                                  highlight_col.blue())
+        self._selected = None
 
     @property
     def action_menu_is_empty(self):
@@ -79,6 +81,12 @@ class PublishWidget(QtGui.QWidget):
 
         :param selected: True if selected, false if not
         """
+        if selected == self._selected:
+            # setting a style sheet is expensive, the same widget is used to
+            # paint all the cells.
+            return
+        self._selected = selected
+
         if selected:
             # make a border around the cell
             self.ui.box.setStyleSheet("""#box {border-width: 2px;
@@ -99,6 +107,34 @@ class PublishWidget(QtGui.QWidget):
         """
         self.ui.thumbnail.setPixmap(pixmap)
 
+    def get_thumbnail_size(self):
+        """
+        Returns the size the thumbnail is displayed at.
+
+        :returns: QSize
+        """
+        return self.ui.thumbnail.size()
+
+
+class _CellText(object):
+    """
+    Collects the text formatted by the delegates for a cell, standing in for
+    the widget when cells are drawn directly with a painter.
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.lines = ("", "")
+
+    def set_text(self, first_line, second_line):
+        """
+        :param first_line: Rich text for the first line of the cell.
+        :param second_line: Rich text for the second line of the cell.
+        """
+        self.lines = (first_line or "", second_line or "")
+
 
 class PublishDelegate(shotgun_view.EditSelectedWidgetDelegate):
     """
@@ -106,18 +142,46 @@ class PublishDelegate(shotgun_view.EditSelectedWidgetDelegate):
     the ``_format_folder`` and ``_format_publish`` method to be implemented so
     it can be rendered correctly. The derived class only needs to worry about
     how things get rendered.
+
+    Thumbnails are scaled once to the size they are displayed at and cached, so that
+    repainting the view, e.g. while scrolling, only has to draw them.
+
+    Optionally, the cells which are not selected are drawn directly with a painter,
+    using cached static texts and layouts, rather than by rendering a widget. The
+    widgets are then only used for the selected cells, which show the actions button.
+    Derived classes need to implement ``_get_cell_layout(size)``, returning the frame
+    and thumbnail rectangles of a cell of the given size followed by anything else
+    needed to draw its text, and ``_paint_cell_text(painter, layout, lines)`` to
+    support this. Painted cells don't follow the widget style sheet: the frame is
+    drawn with the palette Mid color and hover states are not shown.
     """
 
-    def __init__(self, view, action_manager):
+    # maximum number of scaled thumbnails to keep
+    MAX_SCALED_THUMBNAILS = 500
+
+    # maximum number of laid out texts to keep
+    MAX_STATIC_TEXTS = 2000
+
+    # maximum number of cell layouts to keep, one per cell size
+    MAX_CELL_LAYOUTS = 4
+
+    def __init__(self, view, action_manager, paint_cells=False):
         """
         Constructor
 
         :param view: The view where this delegate is being used
         :param action_manager: Action manager instance
+        :param paint_cells: If True, the cells which are not selected are drawn directly
+                            with a painter instead of rendering a widget.
         """
         self._action_manager = action_manager
         self._view = view
         self._sub_items_mode = False
+        self._scaled_thumbnails = OrderedDict()
+        self._cache_scaled_thumbnails = True
+        self._paint_cells = paint_cells
+        self._cell_layouts = OrderedDict()
+        self._static_texts = OrderedDict()
         shotgun_view.EditSelectedWidgetDelegate.__init__(self, view)
 
     def set_sub_items_mode(self, enabled):
@@ -130,6 +194,114 @@ class PublishDelegate(shotgun_view.EditSelectedWidgetDelegate):
         """
         self._sub_items_mode = enabled
 
+    def set_thumbnail_caching(self, enabled):
+        """
+        Enables or disables the caching of the thumbnails scaled to the size they
+        are displayed at. Caching should be disabled while that size keeps changing,
+        e.g. while the thumbnail size slider is dragged, as the scaled thumbnails
+        wouldn't be reused. Any change releases the scaled thumbnails and the
+        cell layouts computed for the sizes passed through.
+
+        :param enabled: True to cache the scaled thumbnails.
+        """
+        self._cache_scaled_thumbnails = enabled
+        self._scaled_thumbnails = OrderedDict()
+        self._cell_layouts = OrderedDict()
+
+    def _get_scaled_thumbnail(self, pixmap, size):
+        """
+        Returns a thumbnail scaled to the size it is displayed at.
+
+        :param pixmap: QPixmap with the full size thumbnail.
+        :param size: QSize the thumbnail is displayed at.
+        :returns: QPixmap
+        """
+        if not self._cache_scaled_thumbnails or size.isEmpty() or pixmap.size() == size:
+            # the thumbnail widget scales it as it is drawn
+            return pixmap
+
+        key = (pixmap.cacheKey(), size.width(), size.height())
+        scaled_pixmap = self._scaled_thumbnails.pop(key, None)
+        if scaled_pixmap is None:
+            # the thumbnail widget stretches its pixmap to fill its area
+            scaled_pixmap = pixmap.scaled(size, QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
+            if len(self._scaled_thumbnails) >= self.MAX_SCALED_THUMBNAILS:
+                self._scaled_thumbnails.popitem(last=False)
+        # most recently used last
+        self._scaled_thumbnails[key] = scaled_pixmap
+        return scaled_pixmap
+
+    def paint(self, painter, style_options, model_index):
+        """
+        Paints a cell of the view.
+
+        :param painter: QPainter to paint with.
+        :param style_options: QT style options
+        :param model_index: Model index to paint
+        """
+        if not self._paint_cells or self._view.selectionModel().isSelected(model_index):
+            # selected cells are rendered by the widgets, which hold the actions button
+            shotgun_view.EditSelectedWidgetDelegate.paint(self, painter, style_options, model_index)
+            return
+
+        cell_text = _CellText()
+        if shotgun_model.get_sanitized_data(model_index, SgLatestPublishModel.IS_FOLDER_ROLE):
+            self._format_folder(model_index, cell_text)
+        else:
+            self._format_publish(model_index, cell_text)
+
+        key = (style_options.rect.width(), style_options.rect.height())
+        layout = self._cell_layouts.pop(key, None)
+        if layout is None:
+            layout = self._get_cell_layout(style_options.rect.size())
+            if len(self._cell_layouts) >= self.MAX_CELL_LAYOUTS:
+                self._cell_layouts.popitem(last=False)
+        # most recently used last
+        self._cell_layouts[key] = layout
+        (frame_rect, thumbnail_rect) = layout[:2]
+
+        painter.save()
+        try:
+            painter.translate(style_options.rect.topLeft())
+
+            # the frame of the box around the widget content
+            painter.setPen(style_options.palette.color(QtGui.QPalette.Mid))
+            painter.setBrush(QtCore.Qt.NoBrush)
+            painter.drawRect(frame_rect)
+
+            icon = shotgun_model.get_sanitized_data(model_index, QtCore.Qt.DecorationRole)
+            if icon:
+                # the thumbnail widget stretches its pixmap to fill its area
+                thumb = self._get_scaled_thumbnail(icon.pixmap(512), thumbnail_rect.size())
+                painter.drawPixmap(thumbnail_rect, thumb)
+
+            painter.setPen(style_options.palette.color(QtGui.QPalette.Text))
+            self._paint_cell_text(painter, layout, cell_text.lines)
+        finally:
+            painter.restore()
+
+    def _get_static_text(self, text, width, font):
+        """
+        Returns laid out rich text, which can be drawn repeatedly at no cost.
+
+        :param text: Rich text.
+        :param width: Width available to the text, in pixels.
+        :param font: QFont to lay the text out with.
+        :returns: QStaticText
+        """
+        key = (text, width, font.key())
+        static_text = self._static_texts.pop(key, None)
+        if static_text is None:
+            static_text = QtGui.QStaticText(text)
+            static_text.setTextFormat(QtCore.Qt.RichText)
+            static_text.setTextWidth(width)
+            static_text.prepare(QtGui.QTransform(), font)
+            if len(self._static_texts) >= self.MAX_STATIC_TEXTS:
+                self._static_texts.popitem(last=False)
+        # most recently used last
+        self._static_texts[key] = static_text
+        return static_text
+
     def _on_before_selection(self, widget, model_index, style_options):
         """
         Called when the associated widget is selected. This method
@@ -190,7 +362,7 @@ class PublishDelegate(shotgun_view.EditSelectedWidgetDelegate):
 
         if icon:
             thumb = icon.pixmap(512)
-            widget.set_thumbnail(thumb)
+            widget.set_thumbnail(self._get_scaled_thumbnail(thumb, widget.get_thumbnail_size()))
 
         if shotgun_model.get_sanitized_data(model_index, SgLatestPublishModel.IS_FOLDER_ROLE):
             self._format_folder(model_index, widget)
@@ -10,7 +10,6 @@
 
 import sgtk
 from sgtk.platform.qt import QtCore, QtGui
-import datetime
 from .model_latestpublish import SgLatestPublishModel
 
 # import the shotgun_model and view modules from the shotgun utils framework
@@ -121,91 +120,62 @@ class SgPublishListDelegate(PublishDelegate):
         :param model_index: Model index to process
         :param widget: widget to adjust
         """
-        
-        # example data:
-        
-        # {'code': 'aaa_00010_F004_C003_0228F8_v000.%04d.dpx',
-        #  'created_at': 1425378837.0,
-        #  'created_by': {'id': 42, 'name': 'Manne Ohrstrom', 'type': 'HumanUser'},
-        #  'created_by.HumanUser.image': 'https://...',
-        #  'description': 'testing testing, 1,2,3',
-        #  'entity': {'id': 1660, 'name': 'aaa_00010', 'type': 'Shot'},
-        #  'id': 1340,
-        #  'image': 'https:...',
-        #  'name': 'aaa_00010, F004_C003_0228F8',
-        #  'path': {'content_type': 'image/dpx',
-        #           'id': 24116,
-        #           'link_type': 'local',
-        #           'local_path': '/mnt/projects...',
-        #           'local_path_linux': '/mnt/projects...',
-        #           'local_path_mac': '/mnt/projects...',
-        #           'local_path_windows': 'z:\\mnt\\projects...',
-        #           'local_storage': {'id': 4,
-        #                             'name': 'primary',
-        #                             'type': 'LocalStorage'},
-        #           'name': 'aaa_00010_F004_C003_0228F8_v000.%04d.dpx',
-        #           'type': 'Attachment',
-        #           'url': 'file:///mnt/projects...'},
-        #  'project': {'id': 289, 'name': 'Climp', 'type': 'Project'},
-        #  'published_file_type': {'id': 53,
-        #                          'name': 'Flame Render',
-        #                          'type': 'PublishedFileType'},
-        #  'task': None,
-        #  'task.Task.content': None,
-        #  'task.Task.due_date': None,
-        #  'task.Task.sg_status_list': None,
-        #  'task_uniqueness': False,
-        #  'type': 'PublishedFile',
-        #  'version': {'id': 6697,
-        #              'name': 'aaa_00010_F004_C003_0228F8_v000',
-        #              'type': 'Version'},
-        #  'version.Version.sg_status_list': 'rev',
-        #  'version_number': 2}
-        
-        # Publish Name Version 002
-        sg_data = shotgun_model.get_sg_data(model_index)
-        main_text = "<b>%s</b>" % (sg_data.get("name") or "Unnamed")
-
-        version = sg_data.get("version_number")
-        vers_str = "%03d" % version if version is not None else "N/A"
+        # the text is formatted by the model when the publish is loaded, e.g.:
+        # Publish Name Version 002  (Task Layout)
+        # Quicktime by John Smith at 2014-02-23 10:34
+        #
+        # In "show subfolders" mode, the first line contains the entity information
+        # instead, because we are displaying info from several entities in a single view.
+        display_text = model_index.data(SgLatestPublishModel.DISPLAY_TEXT_ROLE)
+        if display_text is None:
+            # the publish is still being loaded
+            widget.set_text("", "")
+            return
+        (main_text, small_text) = display_text.get_list_text(self._sub_items_mode)
+        widget.set_text(main_text, small_text)
 
-        main_text += " Version %s" % vers_str        
+    def _get_cell_layout(self, size):
+        """
+        Computes where the elements of a cell are drawn, following the layout of the
+        list widget: the thumbnail on the left and two lines of text next to it.
 
-        # If we are in "show subfolders mode, this line will contain
-        # the entity information (because we are displaying info from several entities 
-        # in a single view. If show subfolders mode is off, the latest description is shown.
-        if self._sub_items_mode:
-            # show items in subfolders mode enabled
-            # get the name of the associated entity
-            
-            main_text += "  ("
-            
-            entity_link = sg_data.get("entity")
-            if entity_link:
-                main_text += "%s <span style='color:#2C93E2'>%s</span>" % (entity_link["type"], entity_link["name"])
-
-            if sg_data.get("task") is not None:
-                main_text += ", Task %s" % sg_data["task"]["name"]
-               
-            main_text += ")"
-        elif sg_data.get("task") is not None:
-            # When not in subfolders mode always show Task info
-            # (similar to the logic in the thumbnail view, but always show)
-            main_text += "  (Task %s)" % sg_data["task"]["name"]
+        :param size: QSize of the cell.
+        :returns: Tuple with the QRects of the frame, thumbnail and text, and the QFonts
+                  of the two lines of text.
+        """
+        frame_rect = QtCore.QRect(1, 1, size.width() - 3, size.height() - 3)
+        thumbnail_rect = QtCore.QRect(12, (size.height() - 40) / 2, 50, 40)
+        text_rect = QtCore.QRect(thumbnail_rect.right() + 11,
+                                 frame_rect.top() + 3,
+                                 frame_rect.right() - thumbnail_rect.right() - 22,
+                                 frame_rect.height() - 6)
+        large_font = QtGui.QFont(self._view.font())
+        large_font.setPixelSize(11)
+        small_font = QtGui.QFont(self._view.font())
+        small_font.setPixelSize(10)
+        return (frame_rect, thumbnail_rect, text_rect, large_font, small_font)
+
+    def _paint_cell_text(self, painter, layout, lines):
+        """
+        Draws the text of a cell.
 
-        # Quicktime by John Smith at 2014-02-23 10:34
-        pub_type_str = shotgun_model.get_sanitized_data(model_index, SgLatestPublishModel.PUBLISH_TYPE_NAME_ROLE)            
-        created_unixtime = sg_data.get("created_at") or 0
-        date_str = datetime.datetime.fromtimestamp(created_unixtime).strftime('%Y-%m-%d %H:%M')
-        # created_by is set to None if the user has been deleted.
-        if sg_data.get("created_by") and sg_data["created_by"].get("name"):
-            author_str = sg_data["created_by"].get("name")
-        else:
-            author_str = "Unspecified User"
-        small_text = "<span style='color:#2C93E2'>%s</span> by %s at %s" % (pub_type_str, 
-                                                                            author_str,
-                                                                            date_str)
-        widget.set_text(main_text, small_text)
+        :param painter: QPainter to draw with, translated to the cell.
+        :param layout: Cell layout, as returned by _get_cell_layout.
+        :param lines: Tuple with the large and small rich text of the cell.
+        """
+        (_, _, text_rect, large_font, small_font) = layout
+        large_text = self._get_static_text(lines[0], text_rect.width(), large_font)
+        small_text = self._get_static_text(lines[1], text_rect.width(), small_font)
+
+        # both lines are vertically centered, 2px apart
+        large_height = large_text.size().height()
+        top = text_rect.top() + (text_rect.height() - large_height - small_text.size().height() - 2) / 2
+
+        painter.setClipRect(text_rect)
+        painter.setFont(large_font)
+        painter.drawStaticText(QtCore.QPointF(text_rect.left(), top), large_text)
+        painter.setFont(small_font)
+        painter.drawStaticText(QtCore.QPointF(text_rect.left(), top + large_height + 2), small_text)
 
     def sizeHint(self, style_options, model_index):
         """
@@ -125,105 +125,54 @@ class SgPublishThumbDelegate(PublishDelegate):
         :param model_index: Index of the item being drawn by the delegate.
         :param widget: Qt widget created by the delegate for rendering.
         """
-
-        # this is a publish!
-        sg_data = shotgun_model.get_sg_data(model_index)
-
-        header_text = ""
-        details_text = ""
-
-        # example data:
-
-        # {'code': 'aaa_00010_F004_C003_0228F8_v000.%04d.dpx',
-        #  'created_at': 1425378837.0,
-        #  'created_by': {'id': 42, 'name': 'Manne Ohrstrom', 'type': 'HumanUser'},
-        #  'created_by.HumanUser.image': 'https://...',
-        #  'description': 'testing testing, 1,2,3',
-        #  'entity': {'id': 1660, 'name': 'aaa_00010', 'type': 'Shot'},
-        #  'id': 1340,
-        #  'image': 'https:...',
-        #  'name': 'aaa_00010, F004_C003_0228F8',
-        #  'path': {'content_type': 'image/dpx',
-        #           'id': 24116,
-        #           'link_type': 'local',
-        #           'local_path': '/mnt/projects...',
-        #           'local_path_linux': '/mnt/projects...',
-        #           'local_path_mac': '/mnt/projects...',
-        #           'local_path_windows': 'z:\\mnt\\projects...',
-        #           'local_storage': {'id': 4,
-        #                             'name': 'primary',
-        #                             'type': 'LocalStorage'},
-        #           'name': 'aaa_00010_F004_C003_0228F8_v000.%04d.dpx',
-        #           'type': 'Attachment',
-        #           'url': 'file:///mnt/projects...'},
-        #  'project': {'id': 289, 'name': 'Climp', 'type': 'Project'},
-        #  'published_file_type': {'id': 53,
-        #                          'name': 'Flame Render',
-        #                          'type': 'PublishedFileType'},
-        #  'task': None,
-        #  'task.Task.content': None,
-        #  'task.Task.due_date': None,
-        #  'task.Task.sg_status_list': None,
-        #  'task_uniqueness': False,
-        #  'type': 'PublishedFile',
-        #  'version': {'id': 6697,
-        #              'name': 'aaa_00010_F004_C003_0228F8_v000',
-        #              'type': 'Version'},
-        #  'version.Version.sg_status_list': 'rev',
-        #  'version_number': 2}
-
-        # get the name (lighting v3)
-        name_str = "Unnamed"
-        if sg_data.get("name"):
-            name_str = sg_data.get("name")
-
-        if sg_data.get("version_number"):
-            name_str += " v%s" % sg_data.get("version_number")
-
-        # now we are tracking whether this item has a unique task/name/type combo
-        # or not via the specially injected task_uniqueness boolean.
-        # If this is true, that means that this is the only item in the listing
-        # with this name/type combo, and we can render its display name on two
-        # lines, name first and then type, e.g.:
-        # MyScene, v3
+        # the text is formatted by the model when the publish is loaded, e.g.:
+        # MyScene v3 (Layout)
         # Maya Render
         #
-        # However, there can be multiple *different* tasks which have the same
-        # name/type combo - in this case, we want to display the task name too
-        # since this is what differentiates the data. In that case we display it:
-        # MyScene, v3 (Layout)
-        # Maya Render
-        #
-        if sg_data.get("task_uniqueness") == False and sg_data.get("task") is not None:
-            name_str += " (%s)" % sg_data["task"]["name"]
-
-        # make this the title of the card
-        header_text = name_str
-
-        # check if we are in "deep mode". In that case, display the entity link info
-        # on the thumb card. Otherwise, display the type.
-        if self._sub_items_mode:
-
-            # display this publish in sub items node
-            # in this case we want to display the following two lines
-            # main_body v3
-            # Shot AAA001
+        # In "deep mode", the entity link info is displayed on the thumb card
+        # instead of the type, e.g.:
+        # MyScene v3
+        # Shot AAA001
+        display_text = model_index.data(SgLatestPublishModel.DISPLAY_TEXT_ROLE)
+        if display_text is None:
+            # the publish is still being loaded
+            widget.set_text("", "")
+            return
+        (header_text, details_text) = display_text.get_thumb_text(self._sub_items_mode)
+        widget.set_text(header_text, details_text)
 
-            # get the name of the associated entity
-            entity_link = sg_data.get("entity")
-            if entity_link is None:
-                details_text = "Unlinked"
-            else:
-                details_text = "%s %s" % (entity_link["type"], entity_link["name"])
+    def _get_cell_layout(self, size):
+        """
+        Computes where the elements of a cell are drawn, following the layout of the
+        thumbnail widget: the thumbnail at the top and the text underneath.
 
-        else:
-            # std publish - render with a name and a publish type
-            # main_body v3
-            # Render
-            details_text = shotgun_model.get_sanitized_data(model_index,
-                                                            SgLatestPublishModel.PUBLISH_TYPE_NAME_ROLE)
+        :param size: QSize of the cell.
+        :returns: Tuple with the QRects of the frame, thumbnail and text, and the text QFont.
+        """
+        frame_rect = QtCore.QRect(0, 0, size.width() - 1, size.height() - 1)
+        content_rect = frame_rect.adjusted(4, 4, -3, -3)
+        # the thumbnail proportions are 512x400
+        thumbnail_height = min(int(content_rect.width() * 0.78125), content_rect.height())
+        thumbnail_rect = QtCore.QRect(content_rect.left(), content_rect.top(), content_rect.width(), thumbnail_height)
+        text_rect = QtCore.QRect(content_rect.left() + 2,
+                                 thumbnail_rect.bottom() + 2,
+                                 content_rect.width() - 4,
+                                 content_rect.bottom() - thumbnail_rect.bottom() - 3)
+        return (frame_rect, thumbnail_rect, text_rect, QtGui.QFont(self._view.font()))
+
+    def _paint_cell_text(self, painter, layout, lines):
+        """
+        Draws the text of a cell.
 
-        widget.set_text(header_text, details_text)
+        :param painter: QPainter to draw with, translated to the cell.
+        :param layout: Cell layout, as returned by _get_cell_layout.
+        :param lines: Tuple with the header and body rich text of the cell.
+        """
+        (_, _, text_rect, font) = layout
+        painter.setFont(font)
+        painter.setClipRect(text_rect)
+        static_text = self._get_static_text("<b>%s</b><br>%s" % lines, text_rect.width(), font)
+        painter.drawStaticText(text_rect.topLeft(), static_text)
 
     def sizeHint(self, style_options, model_index):
         """
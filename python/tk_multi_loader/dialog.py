@@ -9,6 +9,7 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 
+import os
 import sgtk
 from sgtk import TankError
 from sgtk.platform.qt import QtCore, QtGui
@@ -27,10 +28,16 @@ from .delegate_publish_history import SgPublishHistoryDelegate
 from .search_widget import SearchWidget
 from .banner import Banner
 from .loader_action_manager import LoaderActionManager
+from .event_poller import PublishEventPoller, ShotgunEventSource
+from .prefetcher import PublishPrefetcher
+from .publish_store import PublishStore
+from .thumbnail_cache import CompositedThumbnailCache
 from .utils import resolve_filters
 
 from . import constants
+from . import utils
 from . import model_item_data
+from . import publish_record
 
 from .ui.dialog import Ui_Dialog
 
@@ -109,6 +116,25 @@ class AppDialog(QtGui.QWidget):
         # can use those in the UI
         self._status_model = SgStatusModel(self, self._task_manager)
 
+        #################################################
+        # optionally share a single copy of each publish
+        # record between all the publish models
+        self._publish_store = None
+        if sgtk.platform.current_bundle().get_setting("shared_publish_store"):
+            self._publish_store = PublishStore(self, self._task_manager)
+            self._publish_store.load()
+
+        #################################################
+        # composite the thumbnails of the publish models
+        # in background threads
+        app = sgtk.platform.current_bundle()
+        self._thumbnail_cache = CompositedThumbnailCache(
+            self,
+            os.path.join(app.cache_location, "composited_thumbs"),
+            app.get_setting("thumbnail_compositing_threads"),
+            app.get_setting("thumbnail_memory_budget_mb") * 1024 * 1024
+        )
+
         #################################################
         # details pane
         self._details_pane_visible = False
@@ -121,7 +147,10 @@ class AppDialog(QtGui.QWidget):
         self.ui.thumbnail_mode.clicked.connect(self._on_thumbnail_mode_clicked)
         self.ui.list_mode.clicked.connect(self._on_list_mode_clicked)
 
-        self._publish_history_model = SgPublishHistoryModel(self, self._task_manager)
+        self._publish_history_model = SgPublishHistoryModel(self,
+                                                            self._task_manager,
+                                                            self._publish_store,
+                                                            thumbnail_cache=self._thumbnail_cache)
 
         self._publish_history_model_overlay = ShotgunModelOverlayWidget(self._publish_history_model,
                                                                         self.ui.history_view)
@@ -183,11 +212,38 @@ class AppDialog(QtGui.QWidget):
         # setup publish model
         self._publish_model = SgLatestPublishModel(self,
                                                    self._publish_type_model,
-                                                   self._task_manager)
+                                                   self._task_manager,
+                                                   publish_store=self._publish_store,
+                                                   thumbnail_cache=self._thumbnail_cache)
 
         self._publish_main_overlay = ShotgunModelOverlayWidget(self._publish_model,
                                                                self.ui.publish_view)
 
+        # show the spinner while the model resolves its query in the background
+        self._publish_model.lookup_started.connect(self._publish_main_overlay.start_spin)
+        self._publish_model.lookup_failed.connect(self._publish_main_overlay.show_error_message)
+
+        # optionally keep the publish views up to date by polling the event log
+        self._publish_event_poller = None
+        app = sgtk.platform.current_bundle()
+        poll_interval = app.get_setting("publish_event_poll_interval")
+        if poll_interval > 0:
+            event_source = ShotgunEventSource(sgtk.util.get_published_file_entity_type(app.sgtk),
+                                              app.context.project)
+            self._publish_event_poller = PublishEventPoller(self,
+                                                            event_source,
+                                                            poll_interval,
+                                                            self._task_manager)
+            self._publish_event_poller.add_model(self._publish_model)
+            self._publish_event_poller.add_model(self._publish_history_model)
+            self._publish_event_poller.start()
+
+        # optionally prefetch the publishes of the entity tree nodes likely to be selected next
+        self._publish_prefetcher = None
+        max_prefetches = app.get_setting("publish_prefetch_max_concurrent")
+        if max_prefetches > 0:
+            self._publish_prefetcher = PublishPrefetcher(self, max_prefetches, self._publish_store)
+
         # set up a proxy model to cull results based on type selection
         self._publish_proxy_model = SgLatestPublishProxyModel(self)
         self._publish_proxy_model.setSourceModel(self._publish_model)
@@ -201,17 +257,47 @@ class AppDialog(QtGui.QWidget):
         # hook up view -> proxy model -> model
         self.ui.publish_view.setModel(self._publish_proxy_model)
 
+        # only the thumbnails of the publishes displayed in or near the viewport are
+        # requested, once the view has settled after being scrolled, resized or
+        # filtered. Requests for publishes which have left that area are cancelled.
+        self._thumbnail_request_timer = QtCore.QTimer(self)
+        self._thumbnail_request_timer.setSingleShot(True)
+        self._thumbnail_request_timer.setInterval(100)
+        self._thumbnail_request_timer.timeout.connect(self._request_visible_thumbnails)
+        self.ui.publish_view.verticalScrollBar().valueChanged.connect(
+            lambda _: self._thumbnail_request_timer.start())
+        self._publish_view_resize_filter = utils.ResizeEventFilter(self.ui.publish_view)
+        self._publish_view_resize_filter.resized.connect(self._thumbnail_request_timer.start)
+        self.ui.publish_view.installEventFilter(self._publish_view_resize_filter)
+        self._publish_proxy_model.modelReset.connect(self._thumbnail_request_timer.start)
+        self._publish_proxy_model.layoutChanged.connect(self._thumbnail_request_timer.start)
+        self._publish_proxy_model.rowsInserted.connect(lambda *_: self._thumbnail_request_timer.start())
+        self._publish_proxy_model.rowsRemoved.connect(lambda *_: self._thumbnail_request_timer.start())
+
         # set up custom delegates to use when drawing the main area
-        self._publish_thumb_delegate = SgPublishThumbDelegate(self.ui.publish_view, self._action_manager)
+        paint_cells = app.get_setting("paint_publish_cells")
+        self._publish_thumb_delegate = SgPublishThumbDelegate(self.ui.publish_view,
+                                                              self._action_manager,
+                                                              paint_cells)
 
-        self._publish_list_delegate = SgPublishListDelegate(self.ui.publish_view, self._action_manager)
+        self._publish_list_delegate = SgPublishListDelegate(self.ui.publish_view,
+                                                            self._action_manager,
+                                                            paint_cells)
 
         # recall which the most recently mode used was and set that
         main_view_mode = self._settings_manager.retrieve("main_view_mode", self.MAIN_VIEW_THUMB)
         self._set_main_view_mode(main_view_mode)
 
-        # whenever the type list is checked, update the publish filters
-        self._publish_type_model.itemChanged.connect(self._apply_type_filters_on_publishes)
+        # whenever the type list is checked, update the publish filters. Type items
+        # typically change many at a time (e.g. when the type counts are updated or
+        # all types are checked), so the changes are batched and the filters updated
+        # once, when control returns to the event loop.
+        self._type_filter_timer = QtCore.QTimer(self)
+        self._type_filter_timer.setSingleShot(True)
+        self._type_filter_timer.setInterval(0)
+        self._type_filter_timer.timeout.connect(self._apply_type_filters_on_publishes)
+        self._num_avoided_type_filter_updates = 0
+        self._publish_type_model.itemChanged.connect(self._on_publish_type_item_changed)
 
         # if an item in the table is double clicked the default action is run
         self.ui.publish_view.doubleClicked.connect(self._on_publish_double_clicked)
@@ -262,6 +348,12 @@ class AppDialog(QtGui.QWidget):
         self.ui.publish_view.setIconSize(QtCore.QSize(scale_val, scale_val))
         # and track subsequent changes
         self.ui.thumb_scale.valueChanged.connect(self._on_thumb_size_slider_change)
+        # the thumbnails scaled to the size they are displayed at are only cached
+        # once the slider has settled, as they can't be reused while it is dragged.
+        self._thumb_scale_settle_timer = QtCore.QTimer(self)
+        self._thumb_scale_settle_timer.setSingleShot(True)
+        self._thumb_scale_settle_timer.setInterval(250)
+        self._thumb_scale_settle_timer.timeout.connect(self._on_thumb_size_settled)
 
         #################################################
         # setup history
@@ -347,7 +439,7 @@ class AppDialog(QtGui.QWidget):
 
             sg_data = item.get_sg_data()
             if sg_data:
-                return [sg_data]
+                return [publish_record.as_dict(sg_data)]
 
         sg_data_list = []
 
@@ -371,7 +463,7 @@ class AppDialog(QtGui.QWidget):
 
                 sg_data = item.get_sg_data()
                 if sg_data and not item.data(SgLatestPublishModel.IS_FOLDER_ROLE):
-                    sg_data_list.append(sg_data)
+                    sg_data_list.append(publish_record.as_dict(sg_data))
 
         return sg_data_list
 
@@ -405,6 +497,18 @@ class AppDialog(QtGui.QWidget):
                 self._entity_presets[p].view.selectionModel().selectionChanged.disconnect(
                     self._on_treeview_item_selected)
 
+            if self._publish_event_poller:
+                self._publish_event_poller.stop()
+
+            if self._publish_prefetcher:
+                self._publish_prefetcher.shut_down()
+
+            if self._publish_store:
+                self._publish_store.shut_down()
+
+            self._thumbnail_request_timer.stop()
+            self._thumbnail_cache.shut_down()
+
             # gracefully close all connections
             shotgun_globals.unregister_bg_task_manager(self._task_manager)
             self._task_manager.shut_down()
@@ -518,6 +622,9 @@ class AppDialog(QtGui.QWidget):
         self.ui.publish_view.selectionModel().clear()
         self._settings_manager.store("main_view_mode", mode)
 
+        # the rows displayed in the viewport depend on the view mode
+        self._thumbnail_request_timer.start()
+
     def _show_thumb_scale(self, is_visible):
         """
         Shows or hides the scale widgets.
@@ -618,7 +725,9 @@ class AppDialog(QtGui.QWidget):
             item = source_index.model().itemFromIndex(source_index)
 
             # render out details
-            thumb_pixmap = item.icon().pixmap(512)
+            # the thumbnails are composited on demand by the model
+            thumb_icon = source_index.data(QtCore.Qt.DecorationRole)
+            thumb_pixmap = thumb_icon.pixmap(512) if thumb_icon is not None else QtGui.QPixmap()
             self.ui.details_image.setPixmap(thumb_pixmap)
 
             sg_data = item.get_sg_data()
@@ -737,8 +846,10 @@ class AppDialog(QtGui.QWidget):
                 self.ui.details_header.setText("<table>%s</table>" % msg)
 
                 # tell details pane to load stuff
+                # display the versions already retrieved by the main view straight
+                # away, the history model confirms them in the background.
                 sg_data = item.get_sg_data()
-                self._publish_history_model.load_data(sg_data)
+                self._publish_history_model.load_data(sg_data, self._publish_model.get_publish_versions(sg_data))
 
             self.ui.details_header.updateGeometry()
 
@@ -873,16 +984,39 @@ class AppDialog(QtGui.QWidget):
     ########################################################################################
     # filter view
 
+    def _on_publish_type_item_changed(self, item):
+        """
+        Executed when an item of the type listing changes. Schedules an update
+        of the type filters for when control returns to the event loop.
+
+        :param item: Type item which has changed.
+        """
+        if self._type_filter_timer.isActive():
+            # an update is already scheduled and will cover this change
+            self._num_avoided_type_filter_updates += 1
+        else:
+            self._type_filter_timer.start()
+
     def _apply_type_filters_on_publishes(self):
         """
         Executed when the type listing changes
         """
+        self._type_filter_timer.stop()
+
         # go through and figure out which checkboxes are clicked and then
         # update the publish proxy model so that only items of that type
         # is displayed
         sg_type_ids = self._publish_type_model.get_selected_types()
         show_folders = self._publish_type_model.get_show_folders()
-        self._publish_proxy_model.set_filter_by_type_ids(sg_type_ids, show_folders)
+        if not self._publish_proxy_model.set_filter_by_type_ids(sg_type_ids, show_folders):
+            # the filters are unchanged
+            self._num_avoided_type_filter_updates += 1
+
+        app = sgtk.platform.current_bundle()
+        app.log_debug(
+            "Publish type filters updated, %d redundant updates avoided so far."
+            % self._num_avoided_type_filter_updates
+        )
 
     ########################################################################################
     # publish view
@@ -931,8 +1065,31 @@ class AppDialog(QtGui.QWidget):
         """
         When scale slider is manipulated
         """
+        self._publish_thumb_delegate.set_thumbnail_caching(False)
+        self._thumb_scale_settle_timer.start()
         self.ui.publish_view.setIconSize(QtCore.QSize(value, value))
         self._settings_manager.store("thumb_size_scale", value)
+        self._thumbnail_request_timer.start()
+
+    def _on_thumb_size_settled(self):
+        """
+        Executed once the scale slider hasn't been manipulated for a moment.
+        """
+        self._publish_thumb_delegate.set_thumbnail_caching(True)
+        self.ui.publish_view.viewport().update()
+
+    def _request_visible_thumbnails(self):
+        """
+        Requests the thumbnails of the publishes displayed in the viewport of the
+        main view, or within a viewport height above or below it.
+        """
+        margin = self.ui.publish_view.viewport().height()
+        items = []
+        for row in utils.get_rows_near_viewport(self.ui.publish_view, margin):
+            proxy_index = self._publish_proxy_model.index(row, 0)
+            source_index = self._publish_proxy_model.mapToSource(proxy_index)
+            items.append(self._publish_model.itemFromIndex(source_index))
+        self._publish_model.request_thumbnails(items)
 
     def _on_publish_selection(self, selected, deselected):
         """
@@ -1037,6 +1194,7 @@ class AppDialog(QtGui.QWidget):
         """
         Hard reload all caches
         """
+        self._action_manager.clear_action_cache()
         self._status_model.hard_refresh()
         self._publish_history_model.hard_refresh()
         self._publish_type_model.hard_refresh()
@@ -1296,6 +1454,8 @@ class AppDialog(QtGui.QWidget):
                 # Drive the proxy model with the search text.
                 search.textChanged.connect(
                     lambda text, v=view, pm=proxy_model: self._on_search_text_changed(text, v, pm))
+                proxy_model.search_applied.connect(
+                    lambda v=view, pm=proxy_model: self._on_tree_search_applied(v, pm))
 
                 # Keep a handle to all the new Qt objects, otherwise the GC may not work.
                 self._dynamic_widgets.extend([search_layout, search, clear_search, icon])
@@ -1540,7 +1700,7 @@ class AppDialog(QtGui.QWidget):
                               self._task_manager)
 
         # Create a proxy model.
-        proxy_model = SgEntityProxyModel(self)
+        proxy_model = SgEntityProxyModel(self, self._task_manager)
         proxy_model.setSourceModel(model)
 
         return (model, proxy_model)
@@ -1567,12 +1727,28 @@ class AppDialog(QtGui.QWidget):
                                                    border-color: #2C93E2; }
                                        QTreeView::item { padding: 6px; }
                                     """)
-            # expand all nodes in the tree
-            tree_view.expandAll()
         else:
             # revert to default style sheet
             tree_view.setStyleSheet("QTreeView::item { padding: 6px; }")
 
+    def _on_tree_search_applied(self, tree_view, proxy_model):
+        """
+        Triggered when the proxy model of a tree view has applied a search,
+        which may be resolved in the background.
+
+        :param tree_view: associated tree view.
+        :param proxy_model: associated proxy model
+        """
+        # expand the nodes leading to the matches, only the branches
+        # which have been loaded by the proxy model
+        parent_items = proxy_model.get_search_parent_items()
+        if parent_items is None:
+            # expand all nodes in the tree
+            tree_view.expandAll()
+        else:
+            for item in parent_items:
+                tree_view.expand(proxy_model.mapFromSource(item.index()))
+
     def _on_entity_profile_tab_clicked(self):
         """
         Called when someone clicks one of the profile tabs
@@ -1652,6 +1828,46 @@ class AppDialog(QtGui.QWidget):
         # tell publish UI to update itself
         self._load_publishes_for_entity_item(selected_item)
 
+        # and get ready for the next selection
+        if self._publish_prefetcher and selected_item:
+            self._publish_prefetcher.schedule(
+                self._get_prefetch_candidates(selected_item),
+                self._is_sub_items_mode(),
+                self._entity_presets[self._current_entity_preset].publish_filters
+            )
+
+    def _get_prefetch_candidates(self, item):
+        """
+        Returns the treeview items most likely to be selected after the given one:
+        its direct siblings first, then its children, then its other siblings.
+
+        Only the rows around the selected item are considered, as no more than
+        PublishPrefetcher.MAX_QUEUED_ITEMS nodes are prefetched at a time.
+
+        :param item: Selected item in the treeview.
+        :returns: List of items.
+        """
+        model = self._entity_presets[self._current_entity_preset].model
+        parent = item.parent() or model.invisibleRootItem()
+        row = item.row()
+        window = PublishPrefetcher.MAX_QUEUED_ITEMS
+
+        next_rows = range(row + 1, min(row + 1 + window, parent.rowCount()))
+        previous_rows = range(row - 1, max(row - 1 - window, -1), -1)
+
+        candidates = [parent.child(x) for x in next_rows[:1] + previous_rows[:1]]
+        candidates.extend([item.child(x) for x in range(min(item.rowCount(), window))])
+        candidates.extend([parent.child(x) for x in next_rows[1:] + previous_rows[1:]])
+        return candidates
+
+    def _is_sub_items_mode(self):
+        """
+        Returns whether publishes are displayed in the "Show items in subfolders" mode.
+        The hierarchy model cannot handle this mode.
+        """
+        return self.ui.show_sub_items.isChecked() and \
+            not isinstance(self._entity_presets[self._current_entity_preset].model, SgHierarchyModel)
+
     def _load_publishes_for_entity_item(self, item):
         """
         Given an item from the treeview, or None if no item
@@ -1703,9 +1919,7 @@ class AppDialog(QtGui.QWidget):
                 child_folders.append(i)
 
         # Is the show child folders checked?
-        # The hierarchy model cannot handle "Show items in subfolders" mode.
-        show_sub_items = self.ui.show_sub_items.isChecked() and \
-                         not isinstance(self._entity_presets[self._current_entity_preset].model, SgHierarchyModel)
+        show_sub_items = self._is_sub_items_mode()
 
         if show_sub_items:
             # indicate this with a special background color
@@ -1727,6 +1941,8 @@ class AppDialog(QtGui.QWidget):
 
         # now finally load up the data in the publish model
         publish_filters = self._entity_presets[self._current_entity_preset].publish_filters
+        if self._publish_prefetcher:
+            self._publish_prefetcher.record_selection(item, show_sub_items, publish_filters)
         self._publish_model.load_data(item, child_folders, show_sub_items, publish_filters)
 
     def _populate_entity_breadcrumbs(self, selected_item):
@@ -0,0 +1,119 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Text displayed for the publishes in the main view.
+
+Note: this module doesn't depend on Toolkit so that it can be benchmarked
+outside of an engine, see benchmarks/delegate_text_benchmark.py
+"""
+
+import datetime
+
+
+class PublishDisplayText(object):
+    """
+    The text displayed by the thumbnail and list delegates for a publish, in and
+    out of sub items mode. It is computed once when the publish is loaded in the
+    model, so that the delegates don't format it again on every paint.
+    """
+
+    __slots__ = (
+        "thumb_header",
+        "thumb_details",
+        "thumb_sub_items_details",
+        "list_main",
+        "list_sub_items_main",
+        "list_small",
+    )
+
+    def __init__(self, sg_data, publish_type_name):
+        """
+        Constructor
+
+        :param sg_data: Shotgun publish dictionary.
+        :param publish_type_name: Name of the publish type.
+        """
+        name = sg_data.get("name")
+        version = sg_data.get("version_number")
+        task_link = sg_data.get("task")
+        entity_link = sg_data.get("entity")
+
+        # thumbnail view, e.g.:
+        # MyScene v3 (Layout)
+        # Maya Render
+        name_str = name or "Unnamed"
+        if version:
+            name_str += " v%s" % version
+
+        # we are tracking whether this item has a unique task/name/type combo
+        # or not via the specially injected task_uniqueness boolean. If not,
+        # display the task name since this is what differentiates the data.
+        if sg_data.get("task_uniqueness") == False and task_link is not None:
+            name_str += " (%s)" % task_link["name"]
+
+        self.thumb_header = name_str
+        self.thumb_details = publish_type_name
+
+        # in sub items mode, display the entity link instead of the type
+        if entity_link is None:
+            self.thumb_sub_items_details = "Unlinked"
+        else:
+            self.thumb_sub_items_details = "%s %s" % (entity_link["type"], entity_link["name"])
+
+        # list view, e.g.:
+        # Publish Name Version 002  (Task Layout)
+        # Quicktime by John Smith at 2014-02-23 10:34
+        main_text = "<b>%s</b>" % (name or "Unnamed")
+        vers_str = "%03d" % version if version is not None else "N/A"
+        main_text += " Version %s" % vers_str
+
+        # in sub items mode, display the entity information as items from several
+        # entities are displayed in a single view. Otherwise, always show the task.
+        sub_items_text = main_text + "  ("
+        if entity_link:
+            sub_items_text += "%s <span style='color:#2C93E2'>%s</span>" % (entity_link["type"], entity_link["name"])
+        if task_link is not None:
+            sub_items_text += ", Task %s" % task_link["name"]
+        sub_items_text += ")"
+        self.list_sub_items_main = sub_items_text
+
+        if task_link is not None:
+            main_text += "  (Task %s)" % task_link["name"]
+        self.list_main = main_text
+
+        created_unixtime = sg_data.get("created_at") or 0
+        date_str = datetime.datetime.fromtimestamp(created_unixtime).strftime("%Y-%m-%d %H:%M")
+        # created_by is set to None if the user has been deleted.
+        if sg_data.get("created_by") and sg_data["created_by"].get("name"):
+            author_str = sg_data["created_by"].get("name")
+        else:
+            author_str = "Unspecified User"
+        self.list_small = "<span style='color:#2C93E2'>%s</span> by %s at %s" % (publish_type_name,
+                                                                                 author_str,
+                                                                                 date_str)
+
+    def get_thumb_text(self, sub_items_mode):
+        """
+        :param sub_items_mode: True if the view displays the publishes of sub items.
+        :returns: Tuple with the header and details text of a thumbnail card.
+        """
+        if sub_items_mode:
+            return (self.thumb_header, self.thumb_sub_items_details)
+        return (self.thumb_header, self.thumb_details)
+
+    def get_list_text(self, sub_items_mode):
+        """
+        :param sub_items_mode: True if the view displays the publishes of sub items.
+        :returns: Tuple with the main and small text of a list row.
+        """
+        if sub_items_mode:
+            return (self.list_sub_items_main, self.list_small)
+        return (self.list_main, self.list_small)
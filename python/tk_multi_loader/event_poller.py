@@ -0,0 +1,269 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import sgtk
+from sgtk.platform.qt import QtCore
+
+# import the shotgun_model module from the shotgun utils framework
+shotgun_model = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_model")
+shotgun_data = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_data")
+
+
+class ShotgunEventSource(object):
+    """
+    Reads the publish creation, change, retirement and revival events from the
+    Shotgun event log.
+    """
+
+    # maximum number of events read in a single poll
+    MAX_EVENTS = 500
+
+    def __init__(self, publish_entity_type, project):
+        """
+        Constructor
+
+        :param publish_entity_type: The publish entity type, PublishedFile or TankPublishedFile.
+        :param project: Project entity dictionary to restrict the events to, or None.
+        """
+        self._publish_entity_type = publish_entity_type
+        self._project = project
+
+    def get_events(self, sg, last_event_id):
+        """
+        Returns the publish events which happened after the given event.
+        This is called from a worker thread.
+
+        :param sg: Shotgun API instance.
+        :param last_event_id: Id of the last event seen, or None if no event has been
+                              seen yet, in which case only the most recent event id is
+                              looked up.
+        :returns: (last event id, list of (event type, publish id) tuples) where the
+                  event type is one of "New", "Change", "Retirement" or "Revival".
+        """
+        if last_event_id is None:
+            sg_event = sg.find_one(
+                "EventLogEntry",
+                [],
+                ["id"],
+                order=[{"field_name": "id", "direction": "desc"}]
+            )
+            return (sg_event["id"] if sg_event else 0, [])
+
+        event_prefix = "Shotgun_%s_" % self._publish_entity_type
+        filters = [
+            ["id", "greater_than", last_event_id],
+            ["event_type", "in", [
+                event_prefix + "New",
+                event_prefix + "Change",
+                event_prefix + "Retirement",
+                # revived publishes are handled like new ones
+                event_prefix + "Revival",
+            ]],
+        ]
+        if self._project:
+            filters.append(["project", "is", self._project])
+
+        sg_events = sg.find(
+            "EventLogEntry",
+            filters,
+            ["event_type", "entity", "meta"],
+            order=[{"field_name": "id", "direction": "asc"}],
+            limit=self.MAX_EVENTS
+        )
+
+        events = []
+        for sg_event in sg_events:
+            last_event_id = sg_event["id"]
+            # retired entities are no longer linked to the event, the id
+            # can then be found in the meta data.
+            meta = sg_event.get("meta") or {}
+            publish_id = sg_event["entity"]["id"] if sg_event.get("entity") else meta.get("entity_id")
+            if publish_id:
+                events.append((sg_event["event_type"][len(event_prefix):], publish_id))
+
+        return (last_event_id, events)
+
+
+class LocalEventSource(object):
+    """
+    Event source fed locally rather than from Shotgun. This makes it possible to
+    drive the poller without a Shotgun site, e.g. to test it.
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._events = []
+
+    def add_event(self, event_type, publish_id):
+        """
+        Adds an event to the source.
+
+        :param event_type: One of "New", "Change", "Retirement" or "Revival".
+        :param publish_id: Id of the publish which the event is about.
+        """
+        self._events.append((event_type, publish_id))
+
+    def get_events(self, sg, last_event_id):
+        """
+        Returns the events added after the given event.
+
+        :param sg: Shotgun API instance, unused.
+        :param last_event_id: Index of the last event seen, or None.
+        :returns: (last event id, list of (event type, publish id) tuples)
+        """
+        if last_event_id is None:
+            return (len(self._events), [])
+        return (len(self._events), self._events[last_event_id:])
+
+
+class PublishEventPoller(QtCore.QObject):
+    """
+    Periodically polls an event source for publishes which were created,
+    changed or retired, and pushes them into the publish models so that only
+    the affected rows are updated.
+    """
+
+    # signal emitted with the ids of the publishes which were created or changed
+    publishes_changed = QtCore.Signal(list)
+    # signal emitted with the ids of the publishes which were retired
+    publishes_retired = QtCore.Signal(list)
+
+    def __init__(self, parent, event_source, interval, bg_task_manager):
+        """
+        Constructor
+
+        :param parent: Parent QObject.
+        :param event_source: Object to read events from, e.g. a ShotgunEventSource.
+        :param interval: Number of seconds between two polls.
+        :param bg_task_manager: Background task manager to use for the polls.
+        """
+        QtCore.QObject.__init__(self, parent)
+
+        self._event_source = event_source
+        self._last_event_id = None
+        self._current_uid = None
+
+        self._sg_data_retriever = shotgun_data.ShotgunDataRetriever(self, bg_task_manager=bg_task_manager)
+        self._sg_data_retriever.work_completed.connect(self._on_poll_completed)
+        self._sg_data_retriever.work_failure.connect(self._on_poll_failed)
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(interval * 1000)
+        self._timer.timeout.connect(self.poll)
+
+    def add_model(self, model):
+        """
+        Registers a model to push the changes to. The model needs to implement
+        update_publishes() and remove_publishes().
+
+        :param model: Model to keep up to date.
+        """
+        self.publishes_changed.connect(model.update_publishes)
+        self.publishes_retired.connect(model.remove_publishes)
+
+    def start(self):
+        """
+        Starts polling.
+        """
+        self._sg_data_retriever.start()
+        self._timer.start()
+        # look up where the event log currently stands
+        self.poll()
+
+    def stop(self):
+        """
+        Stops polling.
+        """
+        self._timer.stop()
+        if self._current_uid:
+            self._sg_data_retriever.stop_work(self._current_uid)
+            self._current_uid = None
+        self._sg_data_retriever.stop()
+
+    def poll(self):
+        """
+        Reads the new events from the event source in the background.
+        """
+        if self._current_uid:
+            # the previous poll hasn't completed yet
+            return
+
+        self._current_uid = self._sg_data_retriever.execute_method(
+            _get_events,
+            self._event_source,
+            self._last_event_id
+        )
+
+    def process_events(self, events):
+        """
+        Emits the publish ids found in the given events.
+
+        :param events: List of (event type, publish id) tuples, in the order the events happened.
+        """
+        changed_ids = []
+        retired_ids = []
+        for (event_type, publish_id) in events:
+            if event_type == "Retirement":
+                retired_ids.append(publish_id)
+                if publish_id in changed_ids:
+                    changed_ids.remove(publish_id)
+            elif publish_id not in changed_ids:
+                changed_ids.append(publish_id)
+                if publish_id in retired_ids:
+                    # the publish was revived
+                    retired_ids.remove(publish_id)
+
+        if retired_ids:
+            self.publishes_retired.emit(retired_ids)
+        if changed_ids:
+            self.publishes_changed.emit(changed_ids)
+
+    def _on_poll_completed(self, uid, request_type, data):
+        """
+        Signaled whenever the data retriever completes a poll.
+
+        :param uid: Unique id of the request.
+        :param request_type: Type of the request.
+        :param data: Dictionary holding the results.
+        """
+        if str(shotgun_model.sanitize_qt(uid)) != str(self._current_uid):
+            return
+        self._current_uid = None
+
+        (self._last_event_id, events) = data["return_value"]
+        self.process_events(events)
+
+    def _on_poll_failed(self, uid, msg):
+        """
+        Signaled whenever a poll fails. The next poll will try again.
+
+        :param uid: Unique id of the request.
+        :param msg: Error message.
+        """
+        if str(shotgun_model.sanitize_qt(uid)) != str(self._current_uid):
+            return
+        self._current_uid = None
+
+        app = sgtk.platform.current_bundle()
+        app.log_warning("Could not retrieve publish events: %s" % msg)
+
+
+def _get_events(sg, event_source, last_event_id):
+    """
+    Reads the events from the given source. Executed in a worker thread.
+
+    :param sg: Shotgun API instance.
+    :param event_source: Source to read the events from.
+    :param last_event_id: Id of the last event seen.
+    :returns: (last event id, list of (event type, publish id) tuples)
+    """
+    return event_source.get_events(sg, last_event_id)
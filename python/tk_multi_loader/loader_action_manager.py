@@ -17,6 +17,7 @@ from tank_vendor import shotgun_api3
 from sgtk import TankError
 
 from .action_manager import ActionManager
+from . import publish_record
 
 class LoaderActionManager(ActionManager):
     """
@@ -46,6 +47,98 @@ class LoaderActionManager(ActionManager):
         else:
             self._publish_type_field = "tank_type"
 
+        # action definitions returned by the hook, see _generate_actions()
+        self.clear_action_cache()
+
+    def clear_action_cache(self):
+        """
+        Discards the cached action definitions and mappings, so that the hook and the
+        settings are queried again, e.g. when the hooks have been reloaded.
+        """
+        self._action_defs_cache = {}
+        self._action_defs_cache_context = self._app.context
+        self._hook_has_cache_key = True
+        self._cache_by_type = self._app.get_setting("cache_action_definitions")
+        self._mappings = {}
+
+    def _get_mappings(self, setting_name):
+        """
+        Returns the action or entity mappings configured for the app.
+
+        :param setting_name: Either "action_mappings" or "entity_mappings".
+        :returns: Dictionary on the form { "Maya Scene": ["reference", "import"] }
+        """
+        mappings = self._mappings.get(setting_name)
+        if mappings is None:
+            mappings = self._app.get_setting(setting_name)
+            self._mappings[setting_name] = mappings
+        return mappings
+
+    def _generate_actions(self, sg_data, type_name, actions, ui_area_str):
+        """
+        Calls the generate_actions hook for a publish or folder, or returns the
+        definitions it returned for an equivalent one.
+
+        Definitions are cached by entity type, publish type, ui area, configured actions
+        and the key returned by the get_action_cache_key hook method, which tells which
+        publishes the hook returns the same definitions for. If the hook doesn't implement
+        it, definitions are only cached when the cache_action_definitions setting is
+        enabled. They are discarded when the context changes or when clear_action_cache()
+        is called.
+
+        :param sg_data: Shotgun data of the publish or folder.
+        :param type_name: Publish type or entity type the actions are configured for.
+        :param actions: List of the actions configured for the type.
+        :param ui_area_str: UI area passed to the hook.
+        :returns: List of action definitions.
+        """
+        if self._app.context != self._action_defs_cache_context:
+            self.clear_action_cache()
+
+        cache_key = None
+        if self._hook_has_cache_key:
+            try:
+                hook_cache_key = self._app.execute_hook_method("actions_hook",
+                                                               "get_action_cache_key",
+                                                               sg_publish_data=sg_data,
+                                                               actions=actions,
+                                                               ui_area=ui_area_str)
+            except TankError:
+                # raised by the hook runner when the hook class doesn't have the method,
+                # errors raised by an implementation are logged below.
+                self._app.log_debug("The actions hook doesn't implement get_action_cache_key, "
+                                    "action definitions are cached according to the "
+                                    "cache_action_definitions setting.")
+                self._hook_has_cache_key = False
+            except Exception:
+                self._app.log_exception("Could not execute get_action_cache_key hook.")
+                hook_cache_key = None
+
+        if not self._hook_has_cache_key:
+            # the definitions only depend on the type and ui area, if enabled
+            hook_cache_key = () if self._cache_by_type else None
+
+        if hook_cache_key is not None:
+            cache_key = (sg_data.get("type"), type_name, ui_area_str, tuple(actions), hook_cache_key)
+            if cache_key in self._action_defs_cache:
+                return list(self._action_defs_cache[cache_key])
+
+        action_defs = []
+        try:
+            # call out to hook to give us the specifics.
+            action_defs = self._app.execute_hook_method("actions_hook",
+                                                        "generate_actions",
+                                                        sg_publish_data=sg_data,
+                                                        actions=actions,
+                                                        ui_area=ui_area_str)
+        except Exception:
+            self._app.log_exception("Could not execute generate_actions hook.")
+            return action_defs
+
+        if cache_key is not None:
+            self._action_defs_cache[cache_key] = list(action_defs)
+        return action_defs
+
     def _get_actions_for_publish(self, sg_data, ui_area):
         """
         Retrieves the list of actions for a given publish.
@@ -65,7 +158,7 @@ class LoaderActionManager(ActionManager):
             publish_type = publish_type_dict["name"]
         
         # check if we have logic configured to handle this publish type.
-        mappings = self._app.get_setting("action_mappings")
+        mappings = self._get_mappings("action_mappings")
         # returns a structure on the form
         # { "Maya Scene": ["reference", "import"] }
         actions = mappings.get(publish_type, [])
@@ -87,18 +180,7 @@ class LoaderActionManager(ActionManager):
         # convert created_at unix time stamp to shotgun time stamp
         self._fix_timestamp(sg_data)
 
-        action_defs = []
-        try:
-            # call out to hook to give us the specifics.
-            action_defs = self._app.execute_hook_method("actions_hook",
-                                                        "generate_actions",
-                                                        sg_publish_data=sg_data,
-                                                        actions=actions,
-                                                        ui_area=ui_area_str)
-        except Exception:
-            self._app.log_exception("Could not execute generate_actions hook.")
-
-        return action_defs
+        return self._generate_actions(sg_data, publish_type, actions, ui_area_str)
 
     def get_actions_for_publishes(self, sg_data_list, ui_area):
         """
@@ -137,6 +219,9 @@ class LoaderActionManager(ActionManager):
         if len(sg_data_list) == 0:
             return []
 
+        # the hooks get full dictionaries rather than the compact records held by the models
+        sg_data_list = [publish_record.as_dict(sg_data) for sg_data in sg_data_list]
+
         # We are going to do an intersection of all the entities' actions. We'll pick the actions from
         # the first item to initialize the intersection...
         first_entity_actions = self._get_actions_for_publish(sg_data_list[0], ui_area)
@@ -258,7 +343,7 @@ class LoaderActionManager(ActionManager):
         :param publish_type: A Shotgun publish type (e.g. 'Maya Render')
         :returns: True if the current actions setup knows how to handle this.
         """
-        mappings = self._app.get_setting("action_mappings")
+        mappings = self._get_mappings("action_mappings")
 
         # returns a structure on the form
         # { "Maya Scene": ["reference", "import"] }
@@ -277,7 +362,7 @@ class LoaderActionManager(ActionManager):
         publish_type = sg_data.get("type", None)
 
         # check if we have logic configured to handle this publish type.
-        mappings = self._app.get_setting("entity_mappings")
+        mappings = self._get_mappings("entity_mappings")
 
         # returns a structure on the form
         # { "Shot": ["reference", "import"] }
@@ -289,18 +374,8 @@ class LoaderActionManager(ActionManager):
         # convert created_at unix time stamp to shotgun time stamp
         self._fix_timestamp(sg_data)
 
-        action_defs = []
-        try:
-            # call out to hook to give us the specifics.
-            action_defs = self._app.execute_hook_method("actions_hook",
-                                                        "generate_actions",
-                                                        sg_publish_data=sg_data,
-                                                        actions=actions,
-                                                        ui_area="main")  # folder options only found in main ui area
-        except Exception:
-            self._app.log_exception("Could not execute generate_actions hook.")
-
-        return action_defs
+        # folder options only found in main ui area
+        return self._generate_actions(sg_data, publish_type, actions, "main")
 
     def get_actions_for_folder(self, sg_data):
         """
@@ -11,11 +11,35 @@
 import sgtk
 from sgtk.platform.qt import QtCore, QtGui
 
+from .search_index import SearchIndex
+
 # import the shotgun_model module from the shotgun utils framework
 shotgun_model = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_model")
 ShotgunModel = shotgun_model.ShotgunModel 
 
 
+def find_search_paths(path_index, pattern, candidates=None):
+    """
+    Returns the paths of the nodes to show for a search, i.e. the nodes whose name
+    contains the pattern and all their parents.
+
+    This only reads the given index, which is never modified once built, so it can
+    be called from a background thread.
+
+    :param path_index: SearchIndex of the node names, keyed by node path.
+    :param pattern: Search string.
+    :param candidates: Optional set of paths to restrict the search to, e.g. the
+                       result of a search this one extends.
+    :returns: Set of node paths.
+    """
+    matching_paths = path_index.find(pattern, candidates)
+    # parents of matching nodes need to be shown too
+    paths = set(matching_paths)
+    for path in matching_paths:
+        paths.update(path[:x] for x in range(1, len(path)))
+    return paths
+
+
 
 
 class SgEntityModel(ShotgunModel):
@@ -44,6 +68,12 @@ class SgEntityModel(ShotgunModel):
         self._entity_icons["Task"] = QtGui.QIcon(QtGui.QPixmap(":/res/icon_Task_dark.png"))
         self._entity_icons["Ticket"] = QtGui.QIcon(QtGui.QPixmap(":/res/icon_Ticket_dark.png"))
         self._entity_icons["Version"] = QtGui.QIcon(QtGui.QPixmap(":/res/icon_Version_dark.png"))
+
+        # index of the tree nodes, built from the Shotgun data so that the tree can be
+        # searched without creating all its items. Nodes are identified by their path,
+        # a tuple with the key of the field value of each level of the hierarchy.
+        self._hierarchy = hierarchy
+        self._path_index = None
         
         ShotgunModel.__init__(self, 
                               parent,
@@ -61,9 +91,112 @@ class SgEntityModel(ShotgunModel):
         Trigger an asynchronous refresh of the model
         """
         self._refresh_data()        
+
+    def get_path_index(self):
+        """
+        Returns the index of the names of the tree nodes, keyed by node path.
+        A new index is built whenever data arrives from Shotgun, an index is
+        never modified.
+
+        :returns: SearchIndex, or None if the nodes are not indexed yet.
+        """
+        return self._path_index
+
+    def get_item_path(self, item):
+        """
+        Returns the path identifying an item in the tree.
+
+        :param item: QStandardItem from this model.
+        :returns: Tuple with the key of the field value of each level, from the top.
+        """
+        path = []
+        while item is not None:
+            field_data = shotgun_model.get_sanitized_data(item, self.SG_ASSOCIATED_FIELD_ROLE)
+            path.append(self._get_value_key(field_data["value"] if field_data else None))
+            item = item.parent()
+        return tuple(reversed(path))
+
+    def ensure_paths_are_loaded(self, paths):
+        """
+        Creates the items of the given nodes and of their parents, if not created yet.
+        Only the branches leading to these nodes are loaded.
+
+        :param paths: Iterable of node paths, see get_item_path().
+        :returns: List of the items for the paths which have children, e.g. to expand them.
+        """
+        parent_items = []
+        # items per path, for the nodes whose children have been loaded
+        items_per_path = {(): [self.invisibleRootItem()]}
+        loaded_paths = set()
+
+        for path in sorted(paths, key=len):
+            parent_path = path[:-1]
+            if parent_path not in loaded_paths:
+                loaded_paths.add(parent_path)
+                # load the children of the parent node and index them by path
+                for parent_item in items_per_path.get(parent_path, []):
+                    parent_index = parent_item.index()
+                    if self.canFetchMore(parent_index):
+                        self.fetchMore(parent_index)
+                    for row in range(parent_item.rowCount()):
+                        child = parent_item.child(row)
+                        items_per_path.setdefault(self.get_item_path(child), []).append(child)
+
+            if len(path) < len(self._hierarchy):
+                parent_items.extend(items_per_path.get(path, []))
+
+        return parent_items
     
     ############################################################################################
     # subclassed methods
+
+    def _before_data_processing(self, sg_data_list):
+        """
+        Called just after data has been retrieved from Shotgun but before any processing
+        takes place. Indexes the nodes of the tree for searching.
+
+        :param sg_data_list: list of shotgun dictionaries, as returned by the find() call.
+        :returns: should return a list of shotgun dictionaries, on the same form as the input.
+        """
+        path_index = SearchIndex()
+        for sg_data in sg_data_list:
+            path = ()
+            for field in self._hierarchy:
+                value = sg_data.get(field)
+                path += (self._get_value_key(value),)
+                path_index.add(path, self._get_value_name(value))
+        self._path_index = path_index
+
+        return sg_data_list
+
+    def _get_value_key(self, value):
+        """
+        :param value: Shotgun field value.
+        :returns: Hashable key for the value.
+        """
+        if isinstance(value, dict):
+            return (value.get("type"), value.get("id"))
+        if isinstance(value, list):
+            return tuple(self._get_value_key(x) for x in value)
+        if isinstance(value, str):
+            # values read back from the items are unicode
+            return value.decode("utf-8", "replace")
+        return value
+
+    def _get_value_name(self, value):
+        """
+        :param value: Shotgun field value.
+        :returns: Name displayed for the value in the tree.
+        """
+        if isinstance(value, dict):
+            return value.get("name") or ""
+        if isinstance(value, list):
+            return ", ".join(self._get_value_name(x) for x in value)
+        if value is None:
+            return ""
+        if isinstance(value, basestring):
+            return value
+        return str(value)
     
     def _populate_default_thumbnail(self, item):
         """
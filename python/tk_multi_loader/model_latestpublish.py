@@ -8,18 +8,90 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from itertools import count
 from sgtk.platform.qt import QtCore, QtGui
+from tank_vendor import shotgun_api3
 
 import sgtk
 import datetime
 from . import utils, constants
 from . import model_item_data
+from . import publish_collapse
+from . import publish_record
+from .display_text import PublishDisplayText
+from .search_index import SearchIndex, extends_query
 
 # import the shotgun_model module from the shotgun utils framework
 shotgun_model = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_model")
+shotgun_data = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_data")
 ShotgunModel = shotgun_model.ShotgunModel
 
+
+def _find_latest_publish_ids(sg, entity_type, sg_filters, publish_type_field):
+    """
+    Retrieves the ids of the latest version of each publish matching the given filters.
+    Publishes are grouped by name, type and task and the most recent one in each group,
+    i.e. the one with the highest id, is kept. This is executed in a worker thread.
+
+    :param sg: Shotgun API connection.
+    :param entity_type: Publish entity type, e.g. 'PublishedFile'.
+    :param sg_filters: Shotgun filters to use for the search.
+    :param publish_type_field: Publish field holding the publish type.
+    :returns: Sorted list of publish ids.
+    """
+    summary = sg.summarize(
+        entity_type,
+        sg_filters,
+        summary_fields=[{"field": "id", "type": "maximum"}],
+        grouping=[
+            {"field": "name", "type": "exact", "direction": "asc"},
+            {"field": publish_type_field, "type": "exact", "direction": "asc"},
+            {"field": "task", "type": "exact", "direction": "asc"},
+        ]
+    )
+
+    latest_ids = []
+    groups = summary.get("groups") or []
+    while groups:
+        group = groups.pop()
+        if group.get("groups"):
+            # intermediate grouping level
+            groups.extend(group["groups"])
+        elif group.get("summaries", {}).get("id"):
+            latest_ids.append(group["summaries"]["id"])
+
+    return sorted(latest_ids)
+
+
+def _get_latest_publishes_filter(latest_ids, max_exceptions):
+    """
+    Returns a compact filter matching the given publishes, to add to the filters
+    they were looked up with.
+
+    Rather than listing every id, the filter matches all the publishes from the
+    (max_exceptions + 1)th oldest of the latest publishes onwards, plus the older
+    ones by id. This may also match previous versions of recent publishes, which
+    the model collapses away, but it keeps the query small and, since publishes
+    are created with increasing ids, it still matches when new versions are
+    published unless one of the older publishes is superseded.
+
+    :param latest_ids: Sorted list of the ids of the latest publishes.
+    :param max_exceptions: Maximum number of ids listed in the filter.
+    :returns: Shotgun filter.
+    """
+    if len(latest_ids) <= max_exceptions:
+        return ["id", "in", latest_ids]
+
+    return {
+        "filter_operator": "any",
+        "filters": [
+            ["id", "greater_than_or_equal", latest_ids[max_exceptions]],
+            ["id", "in", latest_ids[:max_exceptions]],
+        ]
+    }
+
+
 class SgLatestPublishModel(ShotgunModel):
 
     """
@@ -34,26 +106,121 @@ class SgLatestPublishModel(ShotgunModel):
     ASSOCIATED_TREE_VIEW_ITEM_ROLE = QtCore.Qt.UserRole + 103
     PUBLISH_TYPE_NAME_ROLE = QtCore.Qt.UserRole + 104
     SEARCHABLE_NAME = QtCore.Qt.UserRole + 105
-
-    def __init__(self, parent, publish_type_model, bg_task_manager):
+    SEARCH_KEY_ROLE = QtCore.Qt.UserRole + 106
+    THUMBNAIL_URL_ROLE = QtCore.Qt.UserRole + 107
+    THUMBNAIL_PATH_ROLE = QtCore.Qt.UserRole + 108
+    DISPLAY_TEXT_ROLE = QtCore.Qt.UserRole + 109
+
+    # in latest publishes only mode, maximum number of ids listed in the publish
+    # query, see _get_latest_publishes_filter().
+    MAX_LATEST_ID_EXCEPTIONS = 100
+    # maximum number of queries for which the latest publishes are remembered
+    MAX_LATEST_QUERIES = 50
+
+    # maximum number of incremental refreshes in a row. Publishes which were retired, or
+    # which no longer match the query, are only removed by a full refresh.
+    MAX_DELTA_REFRESHES = 10
+
+    # signal emitted when the model starts resolving a query in the background
+    # before it can load any publishes, e.g. in sub items mode.
+    lookup_started = QtCore.Signal()
+    # signal emitted when such a background lookup fails. Passes the error message.
+    lookup_failed = QtCore.Signal(str)
+
+    def __init__(self, parent, publish_type_model, bg_task_manager, download_thumbs=True, publish_store=None,
+                 thumbnail_cache=None):
         """
         Model which represents the latest publishes for an entity
+
+        :param parent: Parent QObject.
+        :param publish_type_model: SgPublishTypeModel to report the type counts to, or None.
+        :param bg_task_manager: Background task manager to use for the queries.
+        :param download_thumbs: Set to False to never download thumbnails, e.g. for
+                                models which are only used to fill the cache.
+        :param publish_store: Optional PublishStore to resolve the publish records through.
+        :param thumbnail_cache: Optional CompositedThumbnailCache to composite the thumbnails
+                                with. Thumbnails are composited in the main thread otherwise.
         """
         self._publish_type_model = publish_type_model
+        self._publish_store = publish_store
         self._folder_icon = QtGui.QIcon(QtGui.QPixmap(":/res/folder_512x400.png"))
         self._loading_icon = QtGui.QIcon(QtGui.QPixmap(":/res/loading_512x400.png"))
         self._associated_items = {}
 
+        # index of the searchable names, the items are identified in the index
+        # by the key held in their SEARCH_KEY_ROLE.
+        self._search_index = SearchIndex()
+        self._search_keys = count()
+        self._search_matches = None
+        # the searchable names of the publishes are only built and indexed once
+        # a search is made.
+        self._has_unindexed_items = False
+
+        # when a thumbnail cache is used, the items only hold the path to their
+        # source thumbnail and the thumbnails are composited when the items are
+        # displayed, keeping only the recently displayed ones in memory.
+        self._thumbnail_cache = thumbnail_cache
+        self._pending_composites = {}
+
+        # layout and shared values of the publish records of the current data set
+        self._record_layout = publish_record.RecordLayout()
+
         app = sgtk.platform.current_bundle()
+        self._download_thumbs = download_thumbs and app.get_setting("download_thumbnails")
+
+        # thumbnails are not requested by the base class for every item as it is
+        # created, but only for the items displayed near the viewport of the view,
+        # see request_thumbnails().
+        self._pending_thumbnails = {}
 
         # init base class
         ShotgunModel.__init__(self,
                               parent,
-                              download_thumbs=app.get_setting("download_thumbnails"),
+                              download_thumbs=False,
                              schema_generation=6,
-                             bg_load_thumbs=True,
+                             bg_load_thumbs=False,
                              bg_task_manager=bg_task_manager)
 
+        # queries which need to be resolved before the publishes can be loaded
+        # (e.g. the entities below a tree node in sub items mode) are executed
+        # in the background so that they don't block the UI.
+        self._pending_lookups = {}
+
+        # in latest publishes only mode, remember the filter matching the latest
+        # publishes for the most recent queries so that we can display them
+        # straight away when the query is run again.
+        self._latest_only_filters = None
+        self._latest_publish_filters = OrderedDict()
+
+        # state needed to incrementally refresh the current query
+        self._current_sg_filters = None
+        self._current_fields = None
+        self._name_type_aggregates = None
+        self._type_id_aggregates = {}
+        self._merged_ids = set()
+        self._delta_refresh_count = 0
+
+        # all the versions of the publishes in the current data set, including the
+        # ones collapsed away, keyed by (name, type id, task id).
+        self._version_index = {}
+
+        if self._publish_store:
+            self._publish_store.records_updated.connect(self._on_store_records_updated)
+
+        self._sg_data_retriever = shotgun_data.ShotgunDataRetriever(self, bg_task_manager=bg_task_manager)
+        self._sg_data_retriever.work_completed.connect(self._on_lookup_completed)
+        self._sg_data_retriever.work_failure.connect(self._on_lookup_failed)
+        self._sg_data_retriever.start()
+
+    def destroy(self):
+        """
+        Call this method prior to destroying this object.
+        """
+        self._cancel_pending_lookups()
+        self._cancel_pending_thumbnails()
+        self._sg_data_retriever.stop()
+        ShotgunModel.destroy(self)
+
     ############################################################################################
     # public interface
 
@@ -80,7 +247,8 @@ class SgLatestPublishModel(ShotgunModel):
         :param additional_sg_filters: List of shotgun filters to add to the shotgun query when retrieving publishes.
         """
 
-        app = sgtk.platform.current_bundle()
+        # any lookup still running for a previous selection is now obsolete
+        self._cancel_pending_lookups()
 
         if item is None:
             # nothing selected in the treeview
@@ -106,32 +274,40 @@ class SgLatestPublishModel(ShotgunModel):
                 partial_filters = model.get_filters(item)
                 entity_type = model.get_entity_type()
 
-                # now get a list of matches from the above query from
-                # shotgun - note that this is a synchronous call so
-                # it may 'pause' execution briefly for the user
-                data = app.shotgun.find(entity_type, partial_filters)
-
-
-                # now create the final query for the model - this will be
-                # a big in statement listing all the ids returned from
-                # the previous query, asking the model to only show the
-                # items matching the previous query.
-                #
-                # note that for tasks, we link via the task field
-                # rather than the std entity link field
-                #
-                if entity_type == "Task":
-                    sg_filters = [["task", "in", data]]
-                elif entity_type == "Version":
-                    sg_filters = [["version", "in", data]]
-                else:
-                    sg_filters = [["entity", "in", data]]
-
-                # lastly, when we are in this special mode, the main view
+                # when we are in this special mode, the main view
                 # is no longer functioning as a browsable hierarchy
                 # but is switching into more of a paradigm of an inverse
-                # database. Indicate the difference by not showing any folders
-                child_folders = []
+                # database. Indicate the difference by not showing any folders.
+                app = sgtk.platform.current_bundle()
+                if app.get_setting("sub_items_deep_link_filters"):
+                    # try to express the partial filters as deep links on the
+                    # publishes, so that a single publish query is needed.
+                    sg_filters = utils.get_deep_link_filters(
+                        self._get_link_field(entity_type),
+                        entity_type,
+                        partial_filters
+                    )
+                    if sg_filters is not None:
+                        self._do_load_data(self._add_publish_filters(sg_filters, additional_sg_filters), [])
+                        return
+                    app.log_debug(
+                        "Filters %s cannot be expressed as deep links, "
+                        "looking up matching entities first." % (partial_filters,)
+                    )
+
+                # Clear the view while we are waiting for the lookup to complete.
+                self._do_load_data(None, [])
+
+                # now get a list of matches from the above query from
+                # shotgun - this can be a large query, so run it in the
+                # background and load the publishes once it has completed.
+                uid = self._sg_data_retriever.execute_find(entity_type, partial_filters, ["id"])
+                self._pending_lookups[str(uid)] = (
+                    uid,
+                    lambda data: self._on_sub_items_resolved(entity_type, data["sg"], additional_sg_filters)
+                )
+                self.lookup_started.emit()
+                return
 
             else:
                 # standard mode - show folders and items for the currently selected item
@@ -167,39 +343,179 @@ class SgLatestPublishModel(ShotgunModel):
                         sg_filters = None
 
 
-        # now if sg_filters is not None (None indicates that no data should be fetched by the model),
-        # add our external filter settings
-        if sg_filters:
-            # first apply any global sg filters, as specified in the config that we should append
-            # to the main entity filters before getting publishes from shotgun. This may be stuff
-            # like 'only status approved'
-            pub_filters = app.get_setting("publish_filters", [])
-            sg_filters.extend(pub_filters)
-            
-            # now, on top of that, apply any session specific filters
-            # these typically come from the treeview and are pulled from a per-tab config setting,
-            # allowing users to configure tabs with different publish filters, so that one
-            # tab can contain approved shot publishes, another can contain only items from 
-            # your current department, etc.
-            sg_filters.extend(additional_sg_filters)
-
         # now that we have establishes the sg filters and which
         # folders to load, set up the actual model
-        self._do_load_data(sg_filters, child_folders)
+        self._do_load_data(self._add_publish_filters(sg_filters, additional_sg_filters), child_folders)
+
+    def get_publish_versions(self, sg_data):
+        """
+        Returns the versions of a publish which were retrieved along with the current
+        data set, including the ones which are not displayed because they aren't the
+        latest.
+
+        :param sg_data: Shotgun dictionary for the publish.
+        :returns: List of Shotgun publish dictionaries, in ascending creation order.
+                  The list is empty if the versions are unknown.
+        """
+        # entity ids are only unique per entity type
+        entity_key = self._get_entity_key(sg_data)
+
+        versions = []
+        for version in self._version_index.get(self._get_publish_key(sg_data), []):
+            if self._get_entity_key(version) == entity_key:
+                versions.append(version)
+        return versions
+
+    def find_search_matches(self, search_filter):
+        """
+        Returns the search keys of the items whose searchable name contains the
+        given string, case insensitive. The items' keys are held in their
+        SEARCH_KEY_ROLE.
+
+        :param search_filter: Search string.
+        :returns: Set of search keys.
+        """
+        self._index_pending_items()
+
+        # the result only changes with the query or the index content
+        generation = self._search_index.generation
+        if self._search_matches:
+            ((previous_filter, previous_generation), previous_matches) = self._search_matches
+            if previous_generation == generation:
+                if previous_filter == search_filter:
+                    return previous_matches
+                if extends_query(previous_filter, search_filter):
+                    # the user kept typing, only the previous matches can still match
+                    matches = self._search_index.find(search_filter, previous_matches)
+                    self._search_matches = ((search_filter, generation), matches)
+                    return matches
+
+        matches = self._search_index.find(search_filter)
+        self._search_matches = ((search_filter, generation), matches)
+        return matches
+
+    def has_query(self):
+        """
+        Returns whether publishes are being, or have been, retrieved from Shotgun
+        for the current selection.
+
+        :returns: True if a Shotgun query is associated with the current selection.
+        """
+        return bool(self._pending_lookups or self._current_sg_filters)
+
+    def update_publishes(self, publish_ids):
+        """
+        Retrieves the given publishes in the background and merges the ones
+        matching the current query into the model, without re-running the full
+        query.
+
+        :param publish_ids: List of ids of publishes which were created or changed.
+        """
+        if self._latest_only_filters:
+            # the latest versions have to be looked up again
+            self._start_latest_publishes_lookup(self._latest_only_filters, False)
+            return
+
+        if not self._current_sg_filters or self._name_type_aggregates is None:
+            # nothing has been fully loaded yet, the pending load will pick the changes up.
+            return
+
+        uid = self._sg_data_retriever.execute_find(
+            self._publish_entity_type,
+            list(self._current_sg_filters) + [["id", "in", list(publish_ids)]],
+            self._current_fields,
+            [{"field_name": "created_at", "direction": "asc"}]
+        )
+        self._pending_lookups[str(uid)] = (uid, lambda data: self._merge_publishes(data["sg"]))
+
+    def remove_publishes(self, publish_ids):
+        """
+        Refreshes the model if any of the given publishes, which were retired,
+        is displayed. A previous version of the publish may then have to be shown.
+
+        :param publish_ids: List of ids of publishes which were retired.
+        """
+        for x in range(self.invisibleRootItem().rowCount()):
+            item = self.invisibleRootItem().child(x)
+            sg_data = item.get_sg_data()
+            if sg_data and sg_data.get("id") in publish_ids and not item.data(SgLatestPublishModel.IS_FOLDER_ROLE):
+                self._cancel_pending_lookups()
+                if self._latest_only_filters:
+                    self._start_latest_publishes_lookup(self._latest_only_filters, False)
+                else:
+                    # retired publishes are not returned by incremental refreshes
+                    self._refresh_data()
+                return
+
+    def request_thumbnails(self, items):
+        """
+        Requests the thumbnails of the given items, typically the items displayed
+        in or near the viewport of a view, and cancels the requests still pending
+        for any other item, e.g. items which have been scrolled out of view.
+        Thumbnails are only ever downloaded for items passed to this method.
+
+        :param items: List of model items, in the order their thumbnails should be
+                      requested.
+        """
+        if not self._download_thumbs:
+            return
+
+        # all the items are at the root of the model
+        rows = set(item.row() for item in items)
+        for (uid, (request_uid, item_index, _)) in self._pending_thumbnails.items():
+            if item_index.isValid() and item_index.row() in rows:
+                continue
+            self._sg_data_retriever.stop_work(request_uid)
+            del self._pending_thumbnails[uid]
+            if item_index.isValid():
+                # make sure it is requested again when needed
+                item = self.itemFromIndex(QtCore.QModelIndex(item_index))
+                item.setData(None, SgLatestPublishModel.THUMBNAIL_URL_ROLE)
+
+        for item in items:
+            self._request_item_thumbnail(item)
 
     def async_refresh(self):
         """
         Refresh the current data set
         """
-        self._refresh_data()
+        app = sgtk.platform.current_bundle()
+        self._cancel_pending_lookups()
+
+        if self._latest_only_filters:
+            # new versions may have been published, look them up again.
+            self._start_latest_publishes_lookup(self._latest_only_filters, False)
+        elif (app.get_setting("incremental_publish_refresh") and
+                self._delta_refresh_count < self.MAX_DELTA_REFRESHES and
+                self._start_delta_refresh()):
+            # only publishes created or updated since the last refresh are retrieved
+            self._delta_refresh_count += 1
+        else:
+            self._refresh_data()
 
     def _set_tooltip(self, item, sg_item):
         """
         Sets a tooltip for this model item.
 
+        The tooltip is only built when it is first displayed, see data(), this
+        discards the tooltip built for any previous publish data.
+
         :param item: ShotgunStandardItem associated with the publish.
         :param sg_item: Publish information from Shotgun.
         """
+        item.setData(None, QtCore.Qt.ToolTipRole)
+
+    def _get_tooltip(self, item):
+        """
+        Builds the tooltip for a model item.
+
+        :param item: ShotgunStandardItem associated with the publish.
+        :returns: Tooltip, or None for items which aren't publishes.
+        """
+        sg_item = item.get_sg_data()
+        if not sg_item or item.data(SgLatestPublishModel.IS_FOLDER_ROLE):
+            return None
+
         tooltip = "<b>Name:</b> %s" % (sg_item.get("code") or "No name given.")
 
         # Version 012 by John Smith at 2014-02-23 10:34
@@ -226,11 +542,166 @@ class SgLatestPublishModel(ShotgunModel):
         tooltip += "<br><br><b>Path:</b> %s" % ((sg_item.get("path") or {}).get("local_path"))
         tooltip += "<br><br><b>Description:</b> %s" % (sg_item.get("description") or "No description given.")
 
-        item.setToolTip(tooltip)
+        return tooltip
 
     ############################################################################################
     # private methods
 
+    def _add_publish_filters(self, sg_filters, additional_sg_filters):
+        """
+        Appends the configured publish filters to the given entity filters.
+
+        :param sg_filters: Shotgun filters linking publishes to the selected entity,
+                           None if no data should be fetched by the model.
+        :param additional_sg_filters: List of shotgun filters to add to the shotgun query
+                                      when retrieving publishes.
+        :returns: The complete list of filters, None if no data should be fetched.
+        """
+        # now if sg_filters is not None (None indicates that no data should be fetched by the model),
+        # add our external filter settings
+        if sg_filters:
+            app = sgtk.platform.current_bundle()
+
+            # first apply any global sg filters, as specified in the config that we should append
+            # to the main entity filters before getting publishes from shotgun. This may be stuff
+            # like 'only status approved'
+            pub_filters = app.get_setting("publish_filters", [])
+            sg_filters.extend(pub_filters)
+
+            # now, on top of that, apply any session specific filters
+            # these typically come from the treeview and are pulled from a per-tab config setting,
+            # allowing users to configure tabs with different publish filters, so that one
+            # tab can contain approved shot publishes, another can contain only items from
+            # your current department, etc.
+            sg_filters.extend(additional_sg_filters)
+
+        return sg_filters
+
+    def _get_link_field(self, entity_type):
+        """
+        Returns the publish field used to link publishes to the given entity type.
+
+        :param entity_type: Shotgun entity type, e.g. 'Shot' or 'Task'.
+        :returns: Publish field name.
+        """
+        # note that for tasks, we link via the task field
+        # rather than the std entity link field
+        if entity_type == "Task":
+            return "task"
+        elif entity_type == "Version":
+            return "version"
+        else:
+            return "entity"
+
+    def _cancel_pending_lookups(self):
+        """
+        Stops all background lookups and makes sure their results are ignored.
+        """
+        for (uid, _) in self._pending_lookups.values():
+            self._sg_data_retriever.stop_work(uid)
+        self._pending_lookups = {}
+
+    def _request_item_thumbnail(self, item):
+        """
+        Requests the thumbnail of an item, unless it has already been requested.
+
+        :param item: Model item, which must be part of the model.
+        """
+        sg_data = item.get_sg_data()
+        url = sg_data.get("image") if sg_data else None
+        if not url or item.data(SgLatestPublishModel.THUMBNAIL_URL_ROLE) == url:
+            # no thumbnail, or already requested or loaded
+            return
+
+        item.setData(url, SgLatestPublishModel.THUMBNAIL_URL_ROLE)
+        uid = self._sg_data_retriever.request_thumbnail(url, sg_data["type"], sg_data["id"], "image")
+        self._pending_thumbnails[str(uid)] = (uid, QtCore.QPersistentModelIndex(item.index()), url)
+
+    def _cancel_pending_thumbnails(self):
+        """
+        Stops all thumbnail requests and makes sure their results are ignored.
+        """
+        for (uid, _, _) in self._pending_thumbnails.values():
+            self._sg_data_retriever.stop_work(uid)
+        self._pending_thumbnails = {}
+
+    def _on_thumbnail_retrieved(self, uid, data):
+        """
+        Called when a thumbnail requested by request_thumbnails() is available on disk.
+
+        :param uid: Unique id of the thumbnail request.
+        :param data: Dictionary holding the path to the thumbnail under the "thumb_path" key.
+        """
+        (_, item_index, url) = self._pending_thumbnails.pop(uid)
+        if not item_index.isValid() or not data.get("thumb_path"):
+            return
+        item = self.itemFromIndex(QtCore.QModelIndex(item_index))
+        if item.data(SgLatestPublishModel.THUMBNAIL_URL_ROLE) != url:
+            # the publish has been updated with a new thumbnail in the meantime
+            return
+        self._populate_thumbnail(item, "image", data["thumb_path"])
+
+    def _on_lookup_completed(self, uid, request_type, data):
+        """
+        Signal triggered when the data retriever has completed some work.
+
+        :param uid: Unique id of the request that completed.
+        :param request_type: Type of the request.
+        :param data: Dictionary holding the Shotgun result under the "sg" key, or
+                     the path to a thumbnail under the "thumb_path" key.
+        """
+        uid = str(shotgun_model.sanitize_qt(uid))
+        if uid in self._pending_thumbnails:
+            self._on_thumbnail_retrieved(uid, data)
+            return
+
+        if uid not in self._pending_lookups:
+            # not one of ours or superseded by a more recent selection
+            return
+
+        (_, callback) = self._pending_lookups.pop(uid)
+        callback(data)
+
+    def _on_lookup_failed(self, uid, msg):
+        """
+        Signal triggered when the data retriever has failed to complete some work.
+
+        :param uid: Unique id of the request that failed.
+        :param msg: Error message.
+        """
+        uid = str(shotgun_model.sanitize_qt(uid))
+        if uid in self._pending_thumbnails:
+            # the item keeps its default thumbnail
+            del self._pending_thumbnails[uid]
+            return
+
+        if uid not in self._pending_lookups:
+            return
+
+        del self._pending_lookups[uid]
+        msg = shotgun_model.sanitize_qt(msg)
+        app = sgtk.platform.current_bundle()
+        app.log_warning("Could not retrieve publishes from Shotgun: %s" % msg)
+        self.lookup_failed.emit(msg)
+
+    def _on_sub_items_resolved(self, entity_type, data, additional_sg_filters):
+        """
+        Called when the entities matching the selected tree node have been retrieved
+        in sub items mode. Loads all the publishes associated with those entities.
+
+        :param entity_type: Entity type of the tree view the selection was made in.
+        :param data: List of matching Shotgun entity dictionaries.
+        :param additional_sg_filters: List of shotgun filters to add to the shotgun query
+                                      when retrieving publishes.
+        """
+        # now create the final query for the model - this will be
+        # a big in statement listing all the ids returned from
+        # the previous query, asking the model to only show the
+        # items matching the previous query.
+        sg_filters = [[self._get_link_field(entity_type), "in", data]]
+
+        self._do_load_data(self._add_publish_filters(sg_filters, additional_sg_filters), [])
+
     def _do_load_data(self, sg_filters, treeview_folder_items):
         """
         Load and refresh data.
@@ -242,41 +713,411 @@ class SgLatestPublishModel(ShotgunModel):
         """
         # first figure out which fields to get from shotgun
         app = sgtk.platform.current_bundle()
-        publish_entity_type = sgtk.util.get_published_file_entity_type(app.tank)
+        self._publish_entity_type = sgtk.util.get_published_file_entity_type(app.tank)
 
-        if publish_entity_type == "PublishedFile":
+        if self._publish_entity_type == "PublishedFile":
             self._publish_type_field = "published_file_type"
         else:
             self._publish_type_field = "tank_type"
 
-        publish_fields = [self._publish_type_field] + constants.PUBLISHED_FILES_FIELDS \
-                         + app.get_setting("additional_publish_fields")
-
         # first add our folders to the model
         # make gc happy by keeping handle to all items
         self._treeview_folder_items = treeview_folder_items
 
+        if sg_filters and app.get_setting("latest_publishes_only_query"):
+            # only the latest version of each publish should be retrieved. Figure out
+            # which publishes these are in the background and then query them.
+            self._latest_only_filters = sg_filters
+            latest_filter = self._latest_publish_filters.pop(str(sg_filters), None)
+            if latest_filter is None:
+                # first time we see this query, nothing to display until
+                # the latest versions have been resolved.
+                self._load_publishes(None)
+            else:
+                # most recently used last
+                self._latest_publish_filters[str(sg_filters)] = latest_filter
+                # display the latest versions we know of while we look for new ones.
+                self._load_publishes(sg_filters + [latest_filter])
+            self._start_latest_publishes_lookup(sg_filters, latest_filter is None)
+        else:
+            self._latest_only_filters = None
+            self._load_publishes(sg_filters)
+
+    def _load_publishes(self, sg_filters):
+        """
+        Loads cached publish data into the model and refreshes it.
+
+        :param sg_filters: Shotgun filters to use for the search.
+        """
+        app = sgtk.platform.current_bundle()
+        publish_fields = [self._publish_type_field] + constants.PUBLISHED_FILES_FIELDS \
+                         + app.get_setting("additional_publish_fields")
+        if app.get_setting("incremental_publish_refresh"):
+            # needed to find the publishes updated since the last refresh
+            publish_fields.append("updated_at")
+
+        # keep track of the query so that it can be refreshed incrementally
+        self._current_sg_filters = sg_filters
+        self._current_fields = publish_fields
+        self._name_type_aggregates = None
+        self._version_index = {}
+
+        if self._publish_store:
+            # only the fields needed to pick the latest versions are retrieved and
+            # cached for this query, the records are resolved through the store.
+            publish_fields = self._publish_store.get_key_fields(self._publish_type_field)
+
         # load cached data
         ShotgunModel._load_data(self,
-                               entity_type=publish_entity_type,
+                               entity_type=self._publish_entity_type,
                                filters=sg_filters,
                                hierarchy=["code"],
                                fields=publish_fields,
                                order=[{"field_name":"created_at", "direction":"asc"}])
 
         # now calculate type aggregates
+        self._update_active_types()
+
+        # and now trigger a refresh
+        self._refresh_data()
+
+    def _update_active_types(self):
+        """
+        Counts the publishes of each type in the model and passes them on to the
+        publish type model.
+        """
         type_id_aggregates = defaultdict(int)
         for x in range(self.invisibleRootItem().rowCount()):
             type_id = self.invisibleRootItem().child(x).data(SgLatestPublishModel.TYPE_ID_ROLE)
             type_id_aggregates[type_id] += 1
-        self._publish_type_model.set_active_types(type_id_aggregates)
+        self._set_active_types(type_id_aggregates)
 
-        # and now trigger a refresh
-        self._refresh_data()
+    def _set_active_types(self, type_aggregates, changed_type_ids=None):
+        """
+        Passes the type counts on to the publish type model, if any.
+
+        :param type_aggregates: dict keyed by type id with value being the number of
+                                publishes of that type in the model.
+        :param changed_type_ids: Optional list of the type ids for which the counts have changed.
+        """
+        # keep the counts so that incremental refreshes only need to update the changed types
+        self._type_id_aggregates = dict(type_aggregates)
+        if self._publish_type_model:
+            self._publish_type_model.set_active_types(type_aggregates, changed_type_ids)
+
+    def _get_publish_key(self, sg_data):
+        """
+        Returns the key used to group the versions of a publish.
+
+        :param sg_data: Shotgun publish dictionary.
+        :returns: (name, type id, task id) tuple.
+        """
+        type_link = sg_data.get(self._publish_type_field)
+        task_link = sg_data.get("task")
+        return (
+            sg_data.get("name"),
+            type_link["id"] if type_link else None,
+            task_link["id"] if task_link else None
+        )
+
+    def _get_entity_key(self, sg_data):
+        """
+        Returns the key identifying the entity a publish is linked to.
+
+        :param sg_data: Shotgun publish dictionary.
+        :returns: (entity type, entity id) tuple, or None if the publish isn't linked to an entity.
+        """
+        entity = sg_data.get("entity")
+        return (entity["type"], entity["id"]) if entity else None
+
+    def _start_delta_refresh(self):
+        """
+        Starts a background query for the publishes created or updated since the
+        most recent publish currently in the model.
+
+        :returns: True if the query was started, False if a full refresh is needed.
+        """
+        if not self._current_sg_filters or self._name_type_aggregates is None:
+            # the collapsed data set needs to be fully known before it can
+            # be updated incrementally.
+            return False
+
+        watermark = None
+        for x in range(self.invisibleRootItem().rowCount()):
+            sg_data = self.invisibleRootItem().child(x).get_sg_data()
+            if sg_data and not self.invisibleRootItem().child(x).data(SgLatestPublishModel.IS_FOLDER_ROLE):
+                watermark = max(
+                    watermark,
+                    utils.get_unix_timestamp(sg_data.get("updated_at")),
+                    utils.get_unix_timestamp(sg_data.get("created_at"))
+                )
+
+        if watermark is None:
+            return False
+
+        # timestamps only have a one second resolution, publishes created or updated
+        # in the same second as the watermark are retrieved again so that none is
+        # missed. The ones which haven't changed are ignored when merged.
+        watermark = datetime.datetime.fromtimestamp(watermark, shotgun_api3.sg_timezone.LocalTimezone())
+        delta_filters = list(self._current_sg_filters) + [{
+            "filter_operator": "any",
+            "filters": [
+                ["updated_at", "greater_than_or_equal", watermark],
+                ["created_at", "greater_than_or_equal", watermark],
+            ]
+        }]
+
+        uid = self._sg_data_retriever.execute_find(
+            self._publish_entity_type,
+            delta_filters,
+            self._current_fields,
+            [{"field_name": "created_at", "direction": "asc"}]
+        )
+        self._pending_lookups[str(uid)] = (uid, lambda data: self._merge_publishes(data["sg"]))
+        return True
+
+    def _merge_publishes(self, sg_data_list):
+        """
+        Merges publishes that were created or updated into the model, keeping only
+        the latest version of each publish, without rebuilding the model.
+
+        The publishes are merged into items created by this class. The items created
+        by the base class can't be modified or removed without it losing track of
+        them, so the full query is run again instead if any of them is affected.
+
+        :param sg_data_list: List of shotgun publish dictionaries, in ascending creation order.
+        """
+        app = sgtk.platform.current_bundle()
+        sg_data_list = utils.filter_publishes(app, sg_data_list)
+        if not sg_data_list:
+            return
+
+        # index the publishes currently displayed by their latest version key
+        latest_items = {}
+        for x in range(self.invisibleRootItem().rowCount()):
+            item = self.invisibleRootItem().child(x)
+            sg_data = item.get_sg_data()
+            if sg_data and not item.data(SgLatestPublishModel.IS_FOLDER_ROLE):
+                latest_items[self._get_publish_key(sg_data)] = item
+
+        # keys of the publishes displayed by items created by the base class
+        base_keys = set(
+            key for (key, item) in latest_items.iteritems()
+            if item.get_sg_data()["id"] not in self._merged_ids
+        )
+        base_name_types = set(key[:2] for key in base_keys)
+
+        changes = []
+        for sg_data in sg_data_list:
+            # the model caches date values as unix timestamps
+            for (field, value) in sg_data.items():
+                if isinstance(value, datetime.datetime):
+                    sg_data[field] = utils.get_unix_timestamp(value)
+
+            key = self._get_publish_key(sg_data)
+            item = latest_items.get(key)
+            if item is not None:
+                current_sg_data = item.get_sg_data()
+                if current_sg_data["id"] == sg_data["id"]:
+                    updated_at = sg_data.get("updated_at")
+                    if updated_at and utils.get_unix_timestamp(current_sg_data.get("updated_at")) == updated_at:
+                        # retrieved again because it was updated in the same second as the watermark
+                        continue
+                elif utils.get_unix_timestamp(current_sg_data.get("created_at")) > sg_data.get("created_at"):
+                    # an update to a version which has been superseded
+                    changes.append((key, sg_data))
+                    continue
+
+            if key in base_keys or (key[:2] in base_name_types and self._name_type_aggregates[key[:2]] <= 1):
+                # this changes an item created by the base class, or the task
+                # uniqueness flag of one of them.
+                app.log_debug("Publish %s changes data loaded by the full query, refreshing it." % sg_data["id"])
+                if self._publish_store:
+                    self._publish_store.update(sg_data_list)
+                self._refresh_data()
+                return
+
+            changes.append((key, sg_data))
+
+        if not changes:
+            return
+
+        app.log_debug("Merging %d new or updated publishes into the model." % len(changes))
+
+        if self._publish_store:
+            # let the other views know about the changes
+            self._publish_store.update([sg_data for (_, sg_data) in changes])
+
+        changed_type_ids = set()
+        type_id_aggregates = dict(self._type_id_aggregates)
+        for (key, sg_data) in changes:
+            item = latest_items.get(key)
+
+            versions = self._version_index.setdefault(key, [])
+            versions[:] = [x for x in versions if x["id"] != sg_data["id"]] + [sg_data]
+            if item is None:
+                # a brand new publish
+                changed_type_ids.add(key[1])
+                type_id_aggregates[key[1]] = type_id_aggregates.get(key[1], 0) + 1
+                self._name_type_aggregates[key[:2]] += 1
+                item = self._create_publish_item(sg_data)
+                self.appendRow(item)
+                self._merged_ids.add(sg_data["id"])
+                latest_items[key] = item
+                continue
+
+            current_sg_data = item.get_sg_data()
+            if current_sg_data["id"] != sg_data["id"]:
+                if utils.get_unix_timestamp(current_sg_data.get("created_at")) > sg_data.get("created_at"):
+                    # an update to a version which has been superseded
+                    continue
+                # a new version of a publish merged in previously
+                self._name_type_aggregates[key[:2]] += 1
+                self._merged_ids.discard(current_sg_data["id"])
+                self._merged_ids.add(sg_data["id"])
+
+            self._update_publish_item(item, sg_data)
+
+        # update the task uniqueness flags and type counts, only the items
+        # created by this class can be affected.
+        for item in latest_items.values():
+            sg_data = item.get_sg_data()
+            if sg_data["id"] not in self._merged_ids:
+                continue
+            task_uniqueness = self._name_type_aggregates[self._get_publish_key(sg_data)[:2]] <= 1
+            if sg_data.get("task_uniqueness") != task_uniqueness:
+                sg_data["task_uniqueness"] = task_uniqueness
+                item.setData(sg_data, SgLatestPublishModel.SG_DATA_ROLE)
+                # the task is displayed for publishes which aren't unique
+                item.setData(
+                    PublishDisplayText(sg_data, item.data(SgLatestPublishModel.PUBLISH_TYPE_NAME_ROLE)),
+                    SgLatestPublishModel.DISPLAY_TEXT_ROLE
+                )
+        if changed_type_ids:
+            self._set_active_types(type_id_aggregates, changed_type_ids)
+
+        self.data_refreshed.emit(True)
+
+    def _create_publish_item(self, sg_data):
+        """
+        Creates a model item for a publish which was not retrieved by the base class,
+        in the same way the base class does.
+
+        :param sg_data: Shotgun publish dictionary.
+        :returns: ShotgunStandardItem
+        """
+        item = shotgun_model.ShotgunStandardItem(sg_data.get("code"))
+        item.setEditable(False)
+        item.setData({"name": "code", "value": sg_data.get("code")}, SgLatestPublishModel.SG_ASSOCIATED_FIELD_ROLE)
+        self._populate_default_thumbnail(item)
+        self._update_publish_item(item, sg_data)
+        self._finalize_item(item)
+        return item
+
+    def _update_publish_item(self, item, sg_data):
+        """
+        Updates a model item with new publish data.
+
+        :param item: ShotgunStandardItem to update.
+        :param sg_data: Shotgun publish dictionary.
+        """
+        previous_sg_data = item.get_sg_data() or {}
+        item.setText(sg_data.get("code"))
+        item.setData(sg_data, SgLatestPublishModel.SG_DATA_ROLE)
+        self._populate_item(item, sg_data)
+        self._set_tooltip(item, sg_data)
+
+        if item.data(SgLatestPublishModel.THUMBNAIL_URL_ROLE) and sg_data.get("image") != previous_sg_data.get("image"):
+            # the previous thumbnail was requested, the item must be near the viewport
+            item.setData(None, SgLatestPublishModel.THUMBNAIL_URL_ROLE)
+            self._request_item_thumbnail(item)
+
+    def _start_latest_publishes_lookup(self, sg_filters, show_progress):
+        """
+        Starts a background lookup of the ids of the latest version of each publish
+        matching the given filters.
+
+        :param sg_filters: Shotgun filters to use for the search.
+        :param show_progress: If True, the lookup_started signal is emitted.
+        """
+        uid = self._sg_data_retriever.execute_method(
+            _find_latest_publish_ids,
+            self._publish_entity_type,
+            sg_filters,
+            self._publish_type_field
+        )
+        self._pending_lookups[str(uid)] = (
+            uid,
+            lambda data: self._on_latest_publishes_resolved(sg_filters, data["return_value"])
+        )
+        if show_progress:
+            self.lookup_started.emit()
+
+    def _on_latest_publishes_resolved(self, sg_filters, latest_ids):
+        """
+        Called when the ids of the latest version of each publish have been retrieved.
+        Loads the associated publishes.
+
+        :param sg_filters: Shotgun filters used for the search.
+        :param latest_ids: Sorted list of publish ids.
+        """
+        filters_key = str(sg_filters)
+        latest_filter = _get_latest_publishes_filter(latest_ids, self.MAX_LATEST_ID_EXCEPTIONS)
+        previous_filter = self._latest_publish_filters.pop(filters_key, None)
+
+        # most recently used last
+        self._latest_publish_filters[filters_key] = latest_filter
+        if len(self._latest_publish_filters) > self.MAX_LATEST_QUERIES:
+            self._latest_publish_filters.popitem(last=False)
+
+        if latest_filter == previous_filter:
+            # the query still matches the latest versions, e.g. only recent
+            # publishes got new versions. Just make sure the data is up to date.
+            self._refresh_data()
+        else:
+            self._load_publishes(sg_filters + [latest_filter])
 
     ############################################################################################
     # subclassed methods
 
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """
+        Returns the data stored under the given role for the item referred to by the index.
+
+        The thumbnail of an item is composited the first time it is asked for, i.e.
+        when the item is displayed, and the default thumbnail is returned until then.
+
+        :param index: QModelIndex of the item.
+        :param role: Data role.
+        :returns: The data for the role.
+        """
+        if role == QtCore.Qt.DecorationRole and self._thumbnail_cache:
+            path = ShotgunModel.data(self, index, SgLatestPublishModel.THUMBNAIL_PATH_ROLE)
+            if path:
+                thumb = self._get_composited_thumbnail(index, path)
+                if thumb is not None:
+                    return QtGui.QIcon(thumb)
+
+        elif role == QtCore.Qt.ToolTipRole or role == SgLatestPublishModel.SEARCHABLE_NAME:
+            # these are only built for the items they are asked for, and then memoized
+            value = ShotgunModel.data(self, index, role)
+            if value is None and index.isValid():
+                item = self.itemFromIndex(index)
+                if role == QtCore.Qt.ToolTipRole:
+                    value = self._get_tooltip(item)
+                else:
+                    value = self._get_searchable_name(item)
+                if value is not None:
+                    # memoizing doesn't change the data, don't notify the views
+                    blocked = self.blockSignals(True)
+                    try:
+                        item.setData(value, role)
+                    finally:
+                        self.blockSignals(blocked)
+            return value
+
+        return ShotgunModel.data(self, index, role)
+
     def _load_external_data(self):
         """
         Called whenever the model needs to be rebuilt from scratch. This is called prior
@@ -290,6 +1131,12 @@ class SgLatestPublishModel(ShotgunModel):
 
         self._folder_items = []
         self._associated_items = {}
+        self._merged_ids = set()
+        # release the values shared by the records of the previous data set
+        self._record_layout = publish_record.RecordLayout()
+        self._search_index.clear()
+        self._cancel_pending_thumbnails()
+        self._pending_composites = {}
 
         for tree_view_item in self._treeview_folder_items:
 
@@ -301,6 +1148,7 @@ class SgLatestPublishModel(ShotgunModel):
             
             # make the item searchable by name
             item.setData(tree_view_item.text(), SgLatestPublishModel.SEARCHABLE_NAME)
+            self._index_searchable_name(item, tree_view_item.text())
 
             # all of the items created in this class get special role data assigned.
             item.setData(True, SgLatestPublishModel.IS_FOLDER_ROLE)
@@ -320,16 +1168,7 @@ class SgLatestPublishModel(ShotgunModel):
             item.setData(tree_view_sg_data, SgLatestPublishModel.SG_DATA_ROLE)
             item.setData(tree_view_field_data, SgLatestPublishModel.SG_ASSOCIATED_FIELD_ROLE)
 
-            # see if we can get a thumbnail for this node!
-            if tree_view_sg_data and tree_view_sg_data.get("image"):
-                # there is a thumbnail for this item!
-                self._request_thumbnail_download(
-                    item,
-                    "image",
-                    tree_view_sg_data["image"],
-                    tree_view_sg_data["type"],
-                    tree_view_sg_data["id"]
-                )
+            # the thumbnail for this node is requested once it is displayed, see request_thumbnails()
 
             self.appendRow(item)
 
@@ -351,30 +1190,101 @@ class SgLatestPublishModel(ShotgunModel):
                         and other settings specified in load_data()
         """
 
+        if self._publish_store and self._publish_store.is_key_row(sg_data, self._publish_type_field):
+            # associate the full record with the item
+            item_data = self._publish_store.get_item_data(sg_data)
+            if item_data:
+                sg_data = item_data
+                item.setData(sg_data, SgLatestPublishModel.SG_DATA_ROLE)
+            else:
+                # the item will be updated once the record has arrived
+                self._publish_store.fetch([sg_data["id"]])
+
         # indicate that shotgun data is NOT folder data
         item.setData(False, SgLatestPublishModel.IS_FOLDER_ROLE)
 
-        # start figuring out the searchable tokens for this item
-        search_str = "" 
-
         # add the associated publish type (both id and name) as special roles
         type_link = sg_data.get(self._publish_type_field)
         if type_link:
+            publish_type_name = type_link["name"]
             item.setData(type_link["id"], SgLatestPublishModel.TYPE_ID_ROLE)
-            item.setData(type_link["name"], SgLatestPublishModel.PUBLISH_TYPE_NAME_ROLE)
-            search_str += "%s " % type_link["name"]
         else:
+            publish_type_name = "No Type"
             item.setData(None, SgLatestPublishModel.TYPE_ID_ROLE)
-            item.setData("No Type", SgLatestPublishModel.PUBLISH_TYPE_NAME_ROLE)
+        item.setData(publish_type_name, SgLatestPublishModel.PUBLISH_TYPE_NAME_ROLE)
+
+        # format the text displayed by the delegates once rather than on every paint
+        item.setData(PublishDisplayText(sg_data, publish_type_name), SgLatestPublishModel.DISPLAY_TEXT_ROLE)
             
-        # add name and version to search string            
+        # the searchable name is only built once it is needed
+        item.setData(None, SgLatestPublishModel.SEARCHABLE_NAME)
+        self._index_searchable_name(item, None)
+
+        # hold the publish data as a compact record rather than a full dictionary
+        item.setData(publish_record.make_publish_record(sg_data, self._record_layout),
+                     SgLatestPublishModel.SG_DATA_ROLE)
+
+    def _get_searchable_name(self, item):
+        """
+        Builds the searchable name of a publish item.
+
+        :param item: QStandardItem associated with the publish.
+        :returns: Searchable name, or None for items which aren't publishes.
+        """
+        sg_data = item.get_sg_data()
+        if not sg_data or item.data(SgLatestPublishModel.IS_FOLDER_ROLE):
+            return None
+
+        # start figuring out the searchable tokens for this item
+        search_str = ""
+
+        # add the associated publish type
+        type_link = sg_data.get(self._publish_type_field)
+        if type_link:
+            search_str += "%s " % type_link["name"]
+
+        # add name and version to search string
         if sg_data.get("name"):
             search_str += " %s" % sg_data["name"]
         if sg_data.get("version_number"):
             # add this in as "v012" to make it easy to search for say all versions 12 but
             # exclude v112:s
             search_str += " v%03d" % sg_data["version_number"]
-        item.setData(search_str, SgLatestPublishModel.SEARCHABLE_NAME)
+        return search_str
+
+    def _index_searchable_name(self, item, search_str):
+        """
+        Adds the searchable name of an item to the search index.
+
+        :param item: QStandardItem to index.
+        :param search_str: Searchable name of the item, or None to index it the next
+                           time the index is searched.
+        """
+        search_key = item.data(SgLatestPublishModel.SEARCH_KEY_ROLE)
+        if search_key is None:
+            search_key = next(self._search_keys)
+            item.setData(search_key, SgLatestPublishModel.SEARCH_KEY_ROLE)
+
+        if search_str is None:
+            self._search_index.remove(search_key)
+            self._has_unindexed_items = True
+        else:
+            self._search_index.add(search_key, search_str)
+
+    def _index_pending_items(self):
+        """
+        Adds the items whose searchable name hasn't been built yet to the search index.
+        """
+        if not self._has_unindexed_items:
+            return
+        self._has_unindexed_items = False
+
+        root = self.invisibleRootItem()
+        for row in xrange(root.rowCount()):
+            item = root.child(row)
+            search_key = item.data(SgLatestPublishModel.SEARCH_KEY_ROLE)
+            if search_key is not None and search_key not in self._search_index:
+                self._search_index.add(search_key, self.data(item.index(), SgLatestPublishModel.SEARCHABLE_NAME))
 
     def _populate_default_thumbnail(self, item):
         """
@@ -388,7 +1298,7 @@ class SgLatestPublishModel(ShotgunModel):
         # set up publishes with a "thumbnail loading" icon
         item.setIcon(self._loading_icon)
 
-    def _populate_thumbnail_image(self, item, field, image, path):
+    def _populate_thumbnail(self, item, field, path):
         """
         Called whenever a thumbnail for an item has arrived on disk. In the case of
         an already cached thumbnail, this may be called very soon after data has been
@@ -403,7 +1313,7 @@ class SgLatestPublishModel(ShotgunModel):
         with the item. The default implementation will simply set the thumbnail to be icon
         of the item, but this can be altered by subclassing this method.
 
-        Any thumbnails requested via the _request_thumbnail_download() method will also
+        Any thumbnails requested via the request_thumbnails() method will also
         resurface via this callback method.
 
         :param item: QStandardItem which is associated with the given thumbnail
@@ -418,14 +1328,72 @@ class SgLatestPublishModel(ShotgunModel):
             return
 
         # pass the thumbnail through out special image compositing methods
-        # before associating it with the model
+        # before associating it with the model. The thumbnail is loaded by
+        # us rather than by the base class so that it is decoded no larger
+        # than it is displayed.
         is_folder = item.data(SgLatestPublishModel.IS_FOLDER_ROLE)
-        if is_folder:
-            # composite the thumbnail nicely on top of the folder icon
-            thumb = utils.create_overlayed_folder_thumbnail(image)
+
+        if not self._thumbnail_cache:
+            if is_folder:
+                # composite the thumbnail nicely on top of the folder icon
+                thumb = utils.create_overlayed_folder_thumbnail(utils.load_thumbnail_image(path, 460, 280))
+            else:
+                thumb = utils.create_overlayed_publish_thumbnail(utils.load_thumbnail_image(path, 512, 400))
+            item.setIcon(QtGui.QIcon(thumb))
+            return
+
+        # only keep the path to the source thumbnail, it is composited when the
+        # item is displayed, see data().
+        item.setData(path, SgLatestPublishModel.THUMBNAIL_PATH_ROLE)
+
+    def _get_composited_thumbnail(self, index, path):
+        """
+        Returns the composited thumbnail for an item if it is held in memory,
+        requests it otherwise.
+
+        :param index: QModelIndex of the item.
+        :param path: Path to the source thumbnail of the item.
+        :returns: QPixmap, or None if the thumbnail is being composited.
+        """
+        is_folder = ShotgunModel.data(self, index, SgLatestPublishModel.IS_FOLDER_ROLE)
+        key = ("folder" if is_folder else "publish", path)
+        thumb = self._thumbnail_cache.get_cached_thumbnail(*key)
+        if thumb is not None:
+            return thumb
+
+        item_index = QtCore.QPersistentModelIndex(index)
+        if key in self._pending_composites:
+            # views typically ask for the same item several times while it is composited
+            if item_index not in self._pending_composites[key]:
+                self._pending_composites[key].append(item_index)
         else:
-            thumb = utils.create_overlayed_publish_thumbnail(image)
-        item.setIcon(QtGui.QIcon(thumb))
+            self._pending_composites[key] = [item_index]
+            # thumbnails composited before, e.g. in a previous session, are read from
+            # the disk cache, others are composited in the background.
+            self._thumbnail_cache.request_thumbnail(
+                key[0], key[1], lambda thumb: self._on_thumbnail_composited(key, thumb)
+            )
+        return None
+
+    def _on_thumbnail_composited(self, key, thumb):
+        """
+        Called when a thumbnail has been composited. Signals the views to fetch
+        the thumbnail of the items waiting for it.
+
+        :param key: Tuple with the compositing style and the path to the source thumbnail.
+        :param thumb: Composited QPixmap, or None if the thumbnail could not be composited.
+        """
+        for item_index in self._pending_composites.pop(key, []):
+            if not item_index.isValid():
+                continue
+            index = QtCore.QModelIndex(item_index)
+            if thumb is not None:
+                self.dataChanged.emit(index, index)
+                continue
+            item = self.itemFromIndex(index)
+            if item.data(SgLatestPublishModel.THUMBNAIL_PATH_ROLE) == key[1]:
+                # the item keeps its default thumbnail rather than asking for it again
+                item.setData(None, SgLatestPublishModel.THUMBNAIL_PATH_ROLE)
 
     def _before_data_processing(self, sg_data_list):
         """
@@ -439,6 +1407,18 @@ class SgLatestPublishModel(ShotgunModel):
         """
         app = sgtk.platform.current_bundle()
 
+        # publishes merged in by incremental refreshes are not known by the base
+        # class. Remove them, the full data set will include them if they still apply.
+        self._remove_merged_items()
+        self._delta_refresh_count = 0
+
+        if self._publish_store:
+            # resolve the full records known by the store. The rows of the others only
+            # hold the key fields, which are enough to pick the latest versions. Their
+            # records are requested from Shotgun and the items are updated once they
+            # have arrived, see _on_store_records_updated().
+            sg_data_list = self._publish_store.resolve(sg_data_list)
+
         # First, let the filter_publishes hook have a chance to filter the list
         # of publishes:
         sg_data_list = utils.filter_publishes(app, sg_data_list)
@@ -449,18 +1429,13 @@ class SgLatestPublishModel(ShotgunModel):
 
         if len(sg_data_list) == 0 and len(self._treeview_folder_items) == 0:
             # tell publish type setup that there is nothing to display
-            self._publish_type_model.set_active_types({})
+            self._set_active_types({})
+            self._version_index = {}
             return []
 
         # and process sg publish data
 
-        # add data to our model and also collect a distinct
-        # list of type ids contained within this data set.
-        # count the number of times each type is used
-        type_id_aggregates = defaultdict(int)
-
-        # FIRST PASS!
-        # get a dict with only the latest versions, grouped by type and task
+        # get only the latest versions, grouped by name, type and task.
         # rely on the fact that versions are returned in asc order from sg.
         # (see filter query above)
         #
@@ -478,62 +1453,54 @@ class SgLatestPublishModel(ShotgunModel):
         # - Foo v3 (type XXX)
         # - Foo v2 (type YYY, task ANIM)
         # - Foo v7 (type YYY, task LAY)
-                
-        # also, if there are cases where there are two items with the same name and the same type, 
-        # but with different tasks, indicate this with a special boolean flag
-                
-        unique_data = {}
-        name_type_aggregates = defaultdict(int)
-        
-        for sg_item in sg_data_list:
-            
-            # get the associated type
-            type_id = None
-            type_link = sg_item[self._publish_type_field]
-            if type_link:
-                type_id = type_link["id"]
-
-            # also get the associated task
-            task_id = None
-            task_link = sg_item["task"]
-            if task_link:
-                task_id = task_link["id"]  
-
-            # key publishes in dict by type and name
-            unique_data[ (sg_item["name"], type_id, task_id) ] = {"sg_item": sg_item, "type_id": type_id}
-            
-            # count how many items of this type we have
-            name_type_aggregates[ (sg_item["name"], type_id) ] += 1
-        
-        # SECOND PASS
-        # We now have the latest versions only
-        # Go ahead count types for the aggregate
-        # and assemble filtered sg data set
-        new_sg_data = []
-        for second_pass_data in unique_data.values():
-
-            # get the shotgun data for this guy
-            sg_item = second_pass_data["sg_item"]
-            
-            # now add a flag to indicate if this item is "task unique" or not
-            # e.g. if there are other items in the listing with the same name 
-            # and same type but with a different task
-            if name_type_aggregates[ (sg_item["name"], second_pass_data["type_id"]) ] > 1:
-                # there are more than one item with this same name/type combo!
-                sg_item["task_uniqueness"] = False
-            else: 
-                # no other item with this task/name/type combo
-                sg_item["task_uniqueness"] = True
-                
-            # append to new sg data
-            new_sg_data.append(sg_item)
-
-            # update our aggregate counts for the publish type view
-            type_id = second_pass_data["type_id"]
-            type_id_aggregates[type_id] += 1
+
+        # also, if there are cases where there are two items with the same name and the same type,
+        # but with different tasks, this is indicated with a special boolean flag, task_uniqueness.
+        # The number of latest publishes of each type is counted for the publish type view.
+        (new_sg_data, name_type_aggregates, type_id_aggregates, version_index) = \
+            publish_collapse.collapse_latest_versions(sg_data_list, self._publish_type_field)
+
+        # keep the counts so that incremental refreshes can update the flags, and
+        # all the versions for the history view.
+        self._name_type_aggregates = defaultdict(int, name_type_aggregates)
+        self._version_index = version_index
 
         # tell the type model to reshuffle and reformat itself
         # based on the types contained in this search
-        self._publish_type_model.set_active_types( type_id_aggregates )
+        self._set_active_types(type_id_aggregates)
+
+        if self._publish_store:
+            # only cache the key fields for this query
+            return [self._publish_store.make_key_row(x, self._publish_type_field) for x in new_sg_data]
 
         return new_sg_data
+
+    def _on_store_records_updated(self, publish_ids):
+        """
+        Updates the items displaying publishes for which the publish store
+        has received new records.
+
+        :param publish_ids: List of ids of the publishes which were updated.
+        """
+        publish_ids = set(publish_ids)
+
+        for x in range(self.invisibleRootItem().rowCount()):
+            item = self.invisibleRootItem().child(x)
+            sg_data = item.get_sg_data()
+            if sg_data and sg_data.get("id") in publish_ids and not item.data(SgLatestPublishModel.IS_FOLDER_ROLE):
+                self._update_publish_item(item, self._publish_store.get_item_data(sg_data))
+
+    def _remove_merged_items(self):
+        """
+        Removes the items which were created by incremental refreshes.
+        """
+        if not self._merged_ids:
+            return
+
+        for x in reversed(range(self.invisibleRootItem().rowCount())):
+            sg_data = self.invisibleRootItem().child(x).get_sg_data()
+            if sg_data and sg_data.get("id") in self._merged_ids and \
+                    not self.invisibleRootItem().child(x).data(SgLatestPublishModel.IS_FOLDER_ROLE):
+                self._search_index.remove(self.invisibleRootItem().child(x).data(SgLatestPublishModel.SEARCH_KEY_ROLE))
+                self.invisibleRootItem().removeRow(x)
+        self._merged_ids = set()
@@ -9,12 +9,15 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import sgtk
+import datetime
 from sgtk.platform.qt import QtCore, QtGui
 
 from . import utils, constants
+from . import publish_record
 
 # import the shotgun_model module from the shotgun utils framework
 shotgun_model = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_model")
+shotgun_data = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_data")
 ShotgunModel = shotgun_model.ShotgunModel
 
 class SgPublishHistoryModel(ShotgunModel):
@@ -25,30 +28,68 @@ class SgPublishHistoryModel(ShotgunModel):
     USER_THUMB_ROLE = QtCore.Qt.UserRole + 101
     PUBLISH_THUMB_ROLE = QtCore.Qt.UserRole + 102
 
-    def __init__(self, parent, bg_task_manager):
+    def __init__(self, parent, bg_task_manager, publish_store=None, thumbnail_cache=None):
         """
         Constructor
+
+        :param parent: Parent QObject.
+        :param bg_task_manager: Background task manager to use for the queries.
+        :param publish_store: Optional PublishStore to resolve the publish records through.
+        :param thumbnail_cache: Optional CompositedThumbnailCache to composite the thumbnails
+                                with. Thumbnails are composited in the main thread otherwise.
         """
+        self._publish_store = publish_store
+        self._thumbnail_cache = thumbnail_cache
+        # layout and shared values of the publish records of the current data set
+        self._record_layout = publish_record.RecordLayout()
         # folder icon
-        self._loading_icon = QtGui.QPixmap(":/res/loading_100x100.png")
+        self._loading_image = QtGui.QImage(":/res/loading_100x100.png")
+        self._loading_thumb = None
         app = sgtk.platform.current_bundle()
+        self._download_thumbs = app.get_setting("download_thumbnails")
         ShotgunModel.__init__(self,
                               parent,
-                              download_thumbs=app.get_setting("download_thumbnails"),
+                              download_thumbs=self._download_thumbs,
                               schema_generation=2,
-                              bg_load_thumbs=True,
+                              bg_load_thumbs=False,
                               bg_task_manager=bg_task_manager)
 
+        # the current query, used to merge in changed publishes
+        self._publish_entity_type = None
+        self._sg_filters = None
+        self._fields = None
+        self._publish_type_field = None
+        self._merged_ids = set()
+        self._pending_updates = {}
+
+        if self._publish_store:
+            self._publish_store.records_updated.connect(self._on_store_records_updated)
+
+        self._sg_data_retriever = shotgun_data.ShotgunDataRetriever(self, bg_task_manager=bg_task_manager)
+        self._sg_data_retriever.work_completed.connect(self._on_update_completed)
+        self._sg_data_retriever.work_failure.connect(self._on_update_failed)
+        self._sg_data_retriever.start()
+
+    def destroy(self):
+        """
+        Call this method prior to destroying this object.
+        """
+        self._cancel_pending_updates()
+        self._sg_data_retriever.stop()
+        ShotgunModel.destroy(self)
 
     ############################################################################################
     # public interface
 
-    def load_data(self, sg_data):
+    def load_data(self, sg_data, known_versions=None):
         """
         Load the details for the shotgun publish entity described by sg_data.
         
         :param sg_data: dictionary describing a publish in shotgun, including all the common 
                         publish fields.
+        :param known_versions: Optional list of shotgun dictionaries for versions of the publish
+                               which are already in memory. These are displayed straight away
+                               while the version history is retrieved from Shotgun.
         """
         
         app = sgtk.platform.current_bundle()
@@ -78,12 +119,34 @@ class SgPublishHistoryModel(ShotgunModel):
         pub_filters = app.get_setting("publish_filters", [])
         filters.extend(pub_filters)
 
+        self._cancel_pending_updates()
+        self._merged_ids = set()
+        self._publish_entity_type = publish_entity_type
+        self._publish_type_field = publish_type_field
+        self._sg_filters = filters
+        self._fields = fields
+
+        if self._publish_store:
+            # only the key fields are retrieved and cached for this query,
+            # the records are resolved through the store.
+            fields = self._publish_store.get_key_fields(publish_type_field)
+
         ShotgunModel._load_data(self,
                                 entity_type=publish_entity_type,
                                 filters=filters,
                                 hierarchy=["version_number"],
                                 fields=fields)
 
+        if known_versions:
+            # display the versions we know of which are not in the cache, the
+            # query below confirms them.
+            cached_ids = set()
+            for x in range(self.invisibleRootItem().rowCount()):
+                cached_sg_data = self.invisibleRootItem().child(x).get_sg_data()
+                if cached_sg_data:
+                    cached_ids.add(cached_sg_data["id"])
+            self._merge_publishes([dict(x) for x in known_versions if x["id"] not in cached_ids])
+
         self._refresh_data()
 
 
@@ -93,9 +156,163 @@ class SgPublishHistoryModel(ShotgunModel):
         """
         self._refresh_data()
 
+    def update_publishes(self, publish_ids):
+        """
+        Retrieves the given publishes in the background and merges the ones
+        belonging to the current version history into the model.
+
+        :param publish_ids: List of ids of publishes which were created or changed.
+        """
+        if not self._sg_filters:
+            return
+
+        uid = self._sg_data_retriever.execute_find(
+            self._publish_entity_type,
+            list(self._sg_filters) + [["id", "in", list(publish_ids)]],
+            self._fields
+        )
+        self._pending_updates[str(uid)] = uid
+
+    def remove_publishes(self, publish_ids):
+        """
+        Removes the given publishes, which were retired, from the model.
+
+        The items merged in by update_publishes() are removed straight away, the
+        data set is refreshed if any other item is affected.
+
+        :param publish_ids: List of ids of publishes which were retired.
+        """
+        for x in reversed(range(self.invisibleRootItem().rowCount())):
+            sg_data = self.invisibleRootItem().child(x).get_sg_data()
+            if not sg_data or sg_data.get("id") not in publish_ids:
+                continue
+            if sg_data["id"] not in self._merged_ids:
+                # the items created by the base class can't be removed without
+                # it losing track of them.
+                self._refresh_data()
+                return
+            self._merged_ids.discard(sg_data["id"])
+            self.invisibleRootItem().removeRow(x)
+
+    ############################################################################################
+    # internal methods
+
+    def _cancel_pending_updates(self):
+        """
+        Stops any background query for changed publishes.
+        """
+        for uid in self._pending_updates.values():
+            self._sg_data_retriever.stop_work(uid)
+        self._pending_updates = {}
+
+    def _on_update_completed(self, uid, request_type, data):
+        """
+        Signaled whenever the data retriever completes a query for changed publishes.
+
+        :param uid: Unique id of the request.
+        :param request_type: Type of the request.
+        :param data: Dictionary holding the query results.
+        """
+        uid = str(shotgun_model.sanitize_qt(uid))
+        if self._pending_updates.pop(uid, None) is None:
+            return
+
+        app = sgtk.platform.current_bundle()
+        sg_data_list = utils.filter_publishes(app, data["sg"])
+
+        if self._publish_store:
+            # let the other views know about the changes
+            self._publish_store.update(sg_data_list)
+
+        self._merge_publishes(sg_data_list)
+        if sg_data_list:
+            self.data_refreshed.emit(True)
+
+    def _merge_publishes(self, sg_data_list):
+        """
+        Adds or updates the items for the given publishes, without rebuilding the model.
+        These items are removed the next time the base class processes a full data set.
+
+        The items created by the base class can't be modified without it losing
+        track of them, the data set is refreshed instead if any of them is affected.
+
+        :param sg_data_list: List of Shotgun publish dictionaries.
+        """
+        items_by_id = {}
+        for x in range(self.invisibleRootItem().rowCount()):
+            item = self.invisibleRootItem().child(x)
+            if item.get_sg_data():
+                items_by_id[item.get_sg_data()["id"]] = item
+
+        if any(x["id"] in items_by_id and x["id"] not in self._merged_ids for x in sg_data_list):
+            self._refresh_data()
+            return
+
+        for sg_data in sg_data_list:
+            # the model caches date values as unix timestamps
+            for (field, value) in sg_data.items():
+                if isinstance(value, datetime.datetime):
+                    sg_data[field] = utils.get_unix_timestamp(value)
+
+            item = items_by_id.get(sg_data["id"])
+            previous_image = item.get_sg_data().get("image") if item else None
+            if item is None:
+                item = shotgun_model.ShotgunStandardItem(str(sg_data.get("version_number")))
+                item.setEditable(False)
+                item.setData({"name": "version_number", "value": sg_data.get("version_number")},
+                             SgPublishHistoryModel.SG_ASSOCIATED_FIELD_ROLE)
+                self._populate_default_thumbnail(item)
+                self.appendRow(item)
+                self._merged_ids.add(sg_data["id"])
+
+            item.setData(sg_data, SgPublishHistoryModel.SG_DATA_ROLE)
+            self._populate_item(item, sg_data)
+            if self._download_thumbs and sg_data.get("image") and sg_data["image"] != previous_image:
+                self._request_thumbnail_download(item, "image", sg_data["image"], sg_data["type"], sg_data["id"])
+
+    def _on_store_records_updated(self, publish_ids):
+        """
+        Updates the items displaying publishes for which the publish store
+        has received new records.
+
+        :param publish_ids: List of ids of the publishes which were updated.
+        """
+        publish_ids = set(publish_ids)
+
+        for x in range(self.invisibleRootItem().rowCount()):
+            item = self.invisibleRootItem().child(x)
+            sg_data = item.get_sg_data()
+            if sg_data and sg_data.get("id") in publish_ids:
+                previous_image = sg_data.get("image")
+                sg_data = self._publish_store.get_item_data(sg_data)
+                item.setData(sg_data, SgPublishHistoryModel.SG_DATA_ROLE)
+                self._populate_item(item, sg_data)
+                if self._download_thumbs and sg_data.get("image") and sg_data["image"] != previous_image:
+                    self._request_thumbnail_download(item, "image", sg_data["image"], sg_data["type"], sg_data["id"])
+
+    def _on_update_failed(self, uid, msg):
+        """
+        Signaled whenever the data retriever fails a query for changed publishes.
+
+        :param uid: Unique id of the request.
+        :param msg: Error message.
+        """
+        uid = str(shotgun_model.sanitize_qt(uid))
+        if self._pending_updates.pop(uid, None) is not None:
+            app = sgtk.platform.current_bundle()
+            app.log_warning("Could not retrieve changed publishes: %s" % msg)
+
     ############################################################################################
     # subclassed methods
 
+    def _load_external_data(self):
+        """
+        Called whenever the model needs to be rebuilt from scratch. This is called prior
+        to any shotgun data is added to the model.
+        """
+        # release the values shared by the records of the previous data set
+        self._record_layout = publish_record.RecordLayout()
+
     def _populate_item(self, item, sg_data):
         """
         Whenever an item is constructed, this methods is called. It allows subclasses to intercept
@@ -108,6 +325,18 @@ class SgPublishHistoryModel(ShotgunModel):
                         and other settings specified in load_data()
         """
 
+        if self._publish_store and self._publish_store.is_key_row(sg_data, self._publish_type_field):
+            # associate the full record with the item
+            item_data = self._publish_store.get_item_data(sg_data)
+            if item_data:
+                sg_data = item_data
+                item.setData(sg_data, SgPublishHistoryModel.SG_DATA_ROLE)
+                if self._download_thumbs and sg_data.get("image"):
+                    self._request_thumbnail_download(item, "image", sg_data["image"], sg_data["type"], sg_data["id"])
+            else:
+                # the item will be updated once the record has arrived
+                self._publish_store.fetch([sg_data["id"]])
+
         # note that when the sg model creates the name field for each item,
         # it creates a string value. In our case, we use version number as the name
         # and use this for automatic sorting, meaning that QT will auto sort
@@ -130,6 +359,10 @@ class SgPublishHistoryModel(ShotgunModel):
                                              sg_data["created_by"]["type"],
                                              sg_data["created_by"]["id"])
 
+        # hold the publish data as a compact record rather than a full dictionary
+        item.setData(publish_record.make_publish_record(sg_data, self._record_layout),
+                     SgPublishHistoryModel.SG_DATA_ROLE)
+
 
     def _before_data_processing(self, sg_data_list):
         """
@@ -143,7 +376,24 @@ class SgPublishHistoryModel(ShotgunModel):
         """
         app = sgtk.platform.current_bundle()
 
-        return utils.filter_publishes(app, sg_data_list)
+        # publishes merged in by update_publishes() are not known by the base
+        # class. Remove them, the full data set will include them if they still apply.
+        for x in reversed(range(self.invisibleRootItem().rowCount())):
+            sg_data = self.invisibleRootItem().child(x).get_sg_data()
+            if sg_data and sg_data.get("id") in self._merged_ids:
+                self.invisibleRootItem().removeRow(x)
+        self._merged_ids = set()
+
+        if not self._publish_store:
+            return utils.filter_publishes(app, sg_data_list)
+
+        # resolve the full records known by the store. The records of the other
+        # publishes are requested from Shotgun and the items are updated once
+        # they have arrived, see _on_store_records_updated().
+        sg_data_list = utils.filter_publishes(app, self._publish_store.resolve(sg_data_list))
+
+        # only cache the key fields for this query
+        return [self._publish_store.make_key_row(x, self._publish_type_field) for x in sg_data_list]
 
 
     def _populate_default_thumbnail(self, item):
@@ -154,13 +404,15 @@ class SgPublishHistoryModel(ShotgunModel):
         on a call to _populate_thumbnail will follow where the subclassing implementation
         can populate the real image.
         """
-        # set up publishes with a "thumbnail loading" icon
-        item.setData(self._loading_icon, SgPublishHistoryModel.PUBLISH_THUMB_ROLE)
-        thumb = utils.create_overlayed_user_publish_thumbnail(item.data(SgPublishHistoryModel.PUBLISH_THUMB_ROLE),
-                                                              None)
-        item.setIcon(QtGui.QIcon(thumb))
-
-    def _populate_thumbnail_image(self, item, field, image, path):
+        # set up publishes with a "thumbnail loading" icon, which is the same for all items
+        item.setData(None, SgPublishHistoryModel.PUBLISH_THUMB_ROLE)
+        if self._loading_thumb is None:
+            self._loading_thumb = QtGui.QIcon(
+                QtGui.QPixmap.fromImage(utils.create_user_publish_thumbnail_image(self._loading_image, None))
+            )
+        item.setIcon(self._loading_thumb)
+
+    def _populate_thumbnail(self, item, field, path):
         """
         Called whenever a thumbnail for an item has arrived on disk. In the case of
         an already cached thumbnail, this may be called very soon after data has been
@@ -182,16 +434,62 @@ class SgPublishHistoryModel(ShotgunModel):
         :param field: The Shotgun field which the thumbnail is associated with.
         :param path: A path on disk to the thumbnail. This is a file in jpeg format.
         """
+        # the thumbnails are loaded by us rather than by the base class so that
+        # they are decoded no larger than they are displayed.
         if field == "image":
-            thumb = QtGui.QPixmap.fromImage(image)
-            item.setData(thumb, SgPublishHistoryModel.PUBLISH_THUMB_ROLE)
+            item.setData(path, SgPublishHistoryModel.PUBLISH_THUMB_ROLE)
         else:
-            thumb = QtGui.QPixmap.fromImage(image)
-            item.setData(thumb, SgPublishHistoryModel.USER_THUMB_ROLE)
+            item.setData(path, SgPublishHistoryModel.USER_THUMB_ROLE)
 
         # composite the user thumbnail and the publish thumb into a single image
-        thumb = utils.create_overlayed_user_publish_thumbnail(item.data(SgPublishHistoryModel.PUBLISH_THUMB_ROLE),
-                                                              item.data(SgPublishHistoryModel.USER_THUMB_ROLE))
+        publish_path = item.data(SgPublishHistoryModel.PUBLISH_THUMB_ROLE)
+        user_path = item.data(SgPublishHistoryModel.USER_THUMB_ROLE)
+
+        if not self._thumbnail_cache:
+            thumb = QtGui.QPixmap.fromImage(utils.create_user_publish_thumbnail_image(
+                utils.load_thumbnail_image(publish_path, 75, 75, QtCore.Qt.KeepAspectRatioByExpanding)
+                if publish_path else self._loading_image,
+                utils.load_thumbnail_image(user_path, 30, 30, QtCore.Qt.KeepAspectRatioByExpanding)
+                if user_path else None
+            ))
+            item.setIcon(QtGui.QIcon(thumb))
+            return
+
+        if not item.index().isValid():
+            # not part of the model yet
+            thumb = self._thumbnail_cache.get_user_publish_thumbnail(publish_path, user_path, self._loading_image)
+            item.setIcon(QtGui.QIcon(thumb))
+            return
+
+        # composite in the background
+        item_index = QtCore.QPersistentModelIndex(item.index())
+        self._thumbnail_cache.request_user_publish_thumbnail(
+            publish_path,
+            user_path,
+            self._loading_image,
+            lambda thumb: self._on_thumbnail_composited(item_index, publish_path, user_path, thumb)
+        )
+
+    def _on_thumbnail_composited(self, item_index, publish_path, user_path, thumb):
+        """
+        Called when a thumbnail has been composited in the background.
+
+        :param item_index: QPersistentModelIndex of the item the thumbnail is for.
+        :param publish_path: Path to the publish thumbnail the thumbnail was composited from.
+        :param user_path: Path to the user thumbnail the thumbnail was composited from.
+        :param thumb: Composited QPixmap, or None if the thumbnail could not be composited.
+        """
+        if thumb is None:
+            # the item keeps the thumbnail it has
+            return
+        if not item_index.isValid():
+            # the item has been removed in the meantime
+            return
+        item = self.itemFromIndex(QtCore.QModelIndex(item_index))
+        if (item.data(SgPublishHistoryModel.PUBLISH_THUMB_ROLE) != publish_path or
+                item.data(SgPublishHistoryModel.USER_THUMB_ROLE) != user_path):
+            # another thumbnail arrived for the item in the meantime and is being composited
+            return
         item.setIcon(QtGui.QIcon(thumb))
 
 
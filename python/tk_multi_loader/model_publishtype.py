@@ -158,13 +158,16 @@ class SgPublishTypeModel(ShotgunModel):
         return type_ids
         
         
-    def set_active_types(self, type_aggregates):
+    def set_active_types(self, type_aggregates, changed_type_ids=None):
         """
         Specifies which types are currently active. Also adjust the sort role,
         so that the view puts enabled items at the top of the list!
         
         :param type_aggregates: dict keyed by type id with value being the number of 
                                 of occurances of that type in the currently displayed result
+        :param changed_type_ids: Optional list of type ids for which the number of occurences
+                                 changed. When specified, only the entries for these types
+                                 are updated. Otherwise all entries are updated.
         """
         # iterate over all types in the list        
         for idx in range(self.rowCount()):
@@ -177,6 +180,11 @@ class SgPublishTypeModel(ShotgunModel):
             
             # get list of shotgun publish type ids associated with this 
             sg_type_ids = shotgun_model.get_sg_data(item)["ids"] 
+
+            if changed_type_ids is not None and not set(sg_type_ids).intersection(changed_type_ids):
+                # the aggregate for this entry hasn't changed
+                continue
+
             display_name = shotgun_model.get_sanitized_data(item, self.DISPLAY_NAME_ROLE)
             
             # check if any of the ids associated with this entry is in the the type_aggregates list
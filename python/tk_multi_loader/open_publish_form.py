@@ -20,6 +20,7 @@ from sgtk.platform.qt import QtCore, QtGui
 from .dialog import AppDialog
 from .ui.open_publish_form import Ui_OpenPublishForm
 from .open_publish_action_manager import OpenPublishActionManager
+from . import publish_record
 
 def open_publish_browser(app, title, action, publish_types=None):
     """
@@ -163,7 +164,7 @@ class OpenPublishForm(QtGui.QWidget):
         if not sg_data:
             return
         # keep track of the publish:
-        self.__selected_publishes = [sg_data]
+        self.__selected_publishes = [publish_record.as_dict(sg_data)]
         # and close the dialog returning the accepted exit code.
         self.__exit_code = QtGui.QDialog.Accepted
         self.close()
@@ -0,0 +1,223 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import time
+from collections import OrderedDict
+
+import sgtk
+from sgtk.platform.qt import QtCore
+
+from .model_latestpublish import SgLatestPublishModel
+
+task_manager = sgtk.platform.import_framework("tk-framework-shotgunutils", "task_manager")
+
+
+class PublishPrefetcher(QtCore.QObject):
+    """
+    Warms the publish cache on disk for the entity tree nodes a user is likely
+    to select next, so that their publishes show up straight away.
+
+    The publishes are retrieved through hidden publish models, which use the same
+    queries and therefore the same cache files as the main publish model. The
+    prefetches run on a dedicated background task manager so they never hold up
+    the queries of the main views, are only started once the UI has been idle
+    for a moment and are all cancelled whenever the selection changes.
+    """
+
+    # how long the selection needs to be stable before prefetching starts
+    IDLE_DELAY_MS = 750
+
+    # maximum number of nodes queued for a single selection
+    MAX_QUEUED_ITEMS = 8
+
+    # maximum number of prefetched nodes remembered, least recently used ones are forgotten first
+    MAX_PREFETCHED_KEYS = 500
+
+    # after how long a prefetch is considered stale and is run again
+    PREFETCH_EXPIRY_SECS = 300
+
+    def __init__(self, parent, max_concurrent, publish_store=None):
+        """
+        Constructor
+
+        :param parent: Parent QObject.
+        :param max_concurrent: Maximum number of nodes to prefetch at the same time.
+        :param publish_store: Optional PublishStore the publish models resolve their records through.
+        """
+        QtCore.QObject.__init__(self, parent)
+
+        self._max_concurrent = max_concurrent
+        self._publish_store = publish_store
+        self._queue = []
+        self._active_models = {}
+        self._idle_models = []
+        self._prefetched_keys = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+        self._task_manager = task_manager.BackgroundTaskManager(self,
+                                                                start_processing=True,
+                                                                max_threads=1)
+
+        self._idle_timer = QtCore.QTimer(self)
+        self._idle_timer.setSingleShot(True)
+        self._idle_timer.setInterval(self.IDLE_DELAY_MS)
+        self._idle_timer.timeout.connect(self._start_prefetches)
+
+    def shut_down(self):
+        """
+        Cancels all prefetches and releases the resources used.
+        """
+        self._idle_timer.stop()
+        self._queue = []
+        for model in self._active_models.keys() + self._idle_models:
+            model.destroy()
+        self._active_models = {}
+        self._idle_models = []
+        self._task_manager.shut_down()
+
+    def get_hit_rate(self):
+        """
+        Returns the ratio of selections for which the publishes had been prefetched.
+
+        :returns: Float between 0 and 1.
+        """
+        total = self._hits + self._misses
+        return float(self._hits) / total if total else 0.0
+
+    def record_selection(self, item, show_sub_items, publish_filters):
+        """
+        Registers that publishes are loaded for the given node and updates the
+        hit rate accordingly.
+
+        :param item: Selected item in the treeview, or None.
+        :param show_sub_items: Whether the sub items mode is on.
+        :param publish_filters: Publish filters of the entity tab.
+        """
+        if item is None:
+            return
+
+        if self._is_prefetched(self._get_key(item, show_sub_items, publish_filters)):
+            self._hits += 1
+        else:
+            self._misses += 1
+
+        app = sgtk.platform.current_bundle()
+        app.log_debug("Publish prefetch hit rate: %d%% (%d hits, %d misses)" % (
+            self.get_hit_rate() * 100, self._hits, self._misses
+        ))
+
+    def schedule(self, items, show_sub_items, publish_filters):
+        """
+        Cancels the prefetches in progress and queues the given nodes for prefetching
+        once the UI is idle. Nodes are prefetched in the order given.
+
+        :param items: List of treeview items, most likely selected next first.
+        :param show_sub_items: Whether the sub items mode is on.
+        :param publish_filters: Publish filters of the entity tab.
+        """
+        self._cancel()
+
+        self._queue = []
+        for item in items:
+            key = self._get_key(item, show_sub_items, publish_filters)
+            if not self._is_prefetched(key):
+                self._queue.append((key, item, show_sub_items, publish_filters))
+            if len(self._queue) == self.MAX_QUEUED_ITEMS:
+                break
+
+        if self._queue:
+            self._idle_timer.start()
+
+    def _cancel(self):
+        """
+        Cancels all the prefetches in progress.
+        """
+        self._idle_timer.stop()
+        if self._active_models:
+            self._task_manager.stop_all_tasks()
+            self._idle_models.extend(self._active_models.keys())
+            self._active_models = {}
+
+    def _is_prefetched(self, key):
+        """
+        Checks whether the publishes of a node were prefetched recently. Stale
+        entries are forgotten, and used ones are marked as most recently used.
+
+        :param key: Key returned by _get_key.
+        :returns: True if the publishes were prefetched, False otherwise.
+        """
+        prefetch_time = self._prefetched_keys.pop(key, None)
+        if prefetch_time is None or time.time() - prefetch_time > self.PREFETCH_EXPIRY_SECS:
+            return False
+        self._prefetched_keys[key] = prefetch_time
+        return True
+
+    def _get_key(self, item, show_sub_items, publish_filters):
+        """
+        Returns a key identifying the publishes loaded for a node.
+
+        :param item: Treeview item.
+        :param show_sub_items: Whether the sub items mode is on.
+        :param publish_filters: Publish filters of the entity tab.
+        :returns: Hashable key.
+        """
+        path = []
+        parent = item
+        while parent:
+            path.append(parent.text())
+            parent = parent.parent()
+        return (id(item.model()), tuple(path), show_sub_items, str(publish_filters))
+
+    def _start_prefetches(self):
+        """
+        Starts prefetching queued nodes, up to the maximum number of concurrent prefetches.
+        """
+        while self._queue and len(self._active_models) < self._max_concurrent:
+            (key, item, show_sub_items, publish_filters) = self._queue.pop(0)
+
+            if self._idle_models:
+                model = self._idle_models.pop()
+            else:
+                model = SgLatestPublishModel(self,
+                                             None,
+                                             self._task_manager,
+                                             download_thumbs=False,
+                                             publish_store=self._publish_store)
+                model.data_refreshed.connect(lambda _, m=model: self._on_prefetch_completed(m, True))
+                model.data_refresh_fail.connect(lambda _, m=model: self._on_prefetch_completed(m, False))
+                model.lookup_failed.connect(lambda _, m=model: self._on_prefetch_completed(m, False))
+
+            self._active_models[model] = key
+            model.load_data(item, [], show_sub_items, publish_filters)
+
+            if not model.has_query():
+                # nothing to retrieve for this node
+                self._on_prefetch_completed(model, True)
+
+    def _on_prefetch_completed(self, model, success):
+        """
+        Called when a hidden model has retrieved the publishes of a node.
+
+        :param model: Hidden model used for the prefetch.
+        :param success: Whether the publishes were retrieved.
+        """
+        key = self._active_models.pop(model, None)
+        if key is None:
+            # cancelled
+            return
+
+        if success:
+            self._prefetched_keys.pop(key, None)
+            self._prefetched_keys[key] = time.time()
+            while len(self._prefetched_keys) > self.MAX_PREFETCHED_KEYS:
+                self._prefetched_keys.popitem(last=False)
+        self._idle_models.append(model)
+        self._start_prefetches()
@@ -12,6 +12,8 @@ import sgtk
 from sgtk.platform.qt import QtCore, QtGui
 
 from . import constants
+from .search_index import extends_query
+from .model_entity import find_search_paths
 
 shotgun_model = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_model")
 
@@ -21,9 +23,22 @@ class SgEntityProxyModel(QtGui.QSortFilterProxyModel):
     left hand side loader tree views and the search input box
     in the UI. This proxy model sorts items in alphabetical order
     and culls entries based on the current search phrase.
+
+    When a background task manager is given, searches are resolved in a
+    background task and applied all at once when done, a new search
+    cancelling the one in progress.
     """
 
-    def __init__(self, parent):
+    # signal emitted when a search has been applied to the tree
+    search_applied = QtCore.Signal()
+
+    def __init__(self, parent, bg_task_manager=None):
+        """
+        Constructor
+
+        :param parent: Parent QObject.
+        :param bg_task_manager: Optional background task manager to resolve the searches with.
+        """
         QtGui.QSortFilterProxyModel.__init__(self, parent)
 
         # to avoid n^2 characteristics, cache computations
@@ -31,12 +46,86 @@ class SgEntityProxyModel(QtGui.QSortFilterProxyModel):
         self._cache = {}
         self._cache_hits = 0
 
+        # the search currently applied. While the user keeps typing, the nodes
+        # culled for that search are culled for the new one as well and don't
+        # need to be evaluated again.
+        self._search_pattern = None
+
+        # when the source model has indexed its nodes, the paths of the nodes
+        # to show for the current search and the items to expand to show them.
+        self._search_paths = None
+        self._search_parent_items = None
+        # (path index, pattern, paths) for the last search resolved from the index
+        self._applied_search = None
+
+        # search being resolved in the background
+        self._bg_task_manager = bg_task_manager
+        self._search_task_id = None
+        self._pending_search = None
+        if self._bg_task_manager:
+            self._bg_task_manager.task_completed.connect(self._on_search_task_completed)
+            self._bg_task_manager.task_failed.connect(self._on_search_task_failed)
+
         # set proxy to auto sort alphabetically
         self.setSortCaseSensitivity(QtCore.Qt.CaseInsensitive)
         self.setDynamicSortFilter(True)
         self.sort(0, QtCore.Qt.AscendingOrder)
 
 
+    def setSourceModel(self, model):
+        """
+        Overridden from base class.
+        """
+        previous_model = self.sourceModel()
+        if previous_model:
+            for signal in self._get_structure_signals(previous_model):
+                signal.disconnect(self._reset_search_session)
+            previous_model.data_refreshed.disconnect(self._on_source_data_refreshed)
+
+        QtGui.QSortFilterProxyModel.setSourceModel(self, model)
+
+        self._reset_search_session()
+        if model:
+            for signal in self._get_structure_signals(model):
+                signal.connect(self._reset_search_session)
+            model.data_refreshed.connect(self._on_source_data_refreshed)
+
+    def _get_structure_signals(self, model):
+        """
+        :param model: Source model.
+        :returns: The signals of the model emitted when nodes are added, removed or moved.
+        """
+        return [model.modelReset, model.layoutChanged, model.rowsInserted, model.rowsRemoved]
+
+    def _reset_search_session(self, *args):
+        """
+        Forgets about the current search, so that the next one evaluates all
+        the nodes. Called whenever the tree structure changes, since nodes
+        culled so far may now have matching children.
+        """
+        self._search_pattern = None
+
+    def _on_source_data_refreshed(self, changed):
+        """
+        Called when the source model has been refreshed. A search resolved from
+        the previous index of the model is run again, so that new matching nodes
+        are displayed.
+
+        :param changed: True if the data of the model has changed.
+        """
+        if not changed:
+            return
+
+        if self._pending_search:
+            (search_index, pattern) = self._pending_search
+        elif self._applied_search:
+            (search_index, pattern, _) = self._applied_search
+        else:
+            return
+
+        if search_index is not self.sourceModel().get_path_index():
+            self.setFilterFixedString(pattern)
+
     def _matching_r(self, search_exp, item):
         """
         Recursive matching.
@@ -65,7 +154,7 @@ class SgEntityProxyModel(QtGui.QSortFilterProxyModel):
             child_item = item.child(idx)
             if self._matching_r(search_exp, child_item):
                 # exit early as soon as we find a match for performance
-                self._cache[item] = True
+                self._cache[item_hash] = True
                 return True
 
         # no sub nodes matches. Keep this result in the cache so that next
@@ -86,24 +175,136 @@ class SgEntityProxyModel(QtGui.QSortFilterProxyModel):
             app.log_debug("Search efficiency: %s items %4f%% cache hit ratio." % (cache_len, ratio))
 
         self._cache_hits = 0
+        previous_cache = self._cache
         self._cache = {}
 
+        # a search still running in the background is now obsolete
+        self._cancel_search_task()
+
         if len(pattern) >= constants.TREE_SEARCH_TRIGGER_LENGTH:
             # we have a search filter that is longer than one character.
-            # start filtering. Before we can filter, ensure that the entire
-            # data set is loaded in the tree.
+            # start filtering.
+
+            path_index = self.sourceModel().get_path_index()
+            if path_index is not None:
+                # the model knows which nodes match from its index, only load
+                # the branches leading to them.
+                candidates = None
+                if self._applied_search:
+                    (applied_index, applied_pattern, applied_paths) = self._applied_search
+                    if applied_index is path_index and extends_query(applied_pattern, pattern):
+                        # the user kept typing, only the previous matches can still match
+                        candidates = applied_paths
+
+                if self._bg_task_manager:
+                    # resolve the matches in the background, the current search
+                    # stays displayed in the meantime.
+                    self._pending_search = (path_index, pattern)
+                    self._search_task_id = self._bg_task_manager.add_task(
+                        find_search_paths,
+                        group="tree_search",
+                        task_args=[path_index, pattern, candidates]
+                    )
+                    return
+
+                search_paths = find_search_paths(path_index, pattern, candidates)
+                self._apply_search_paths(path_index, pattern, search_paths)
+                return
 
+            self._search_paths = None
+            self._search_parent_items = None
+            self._applied_search = None
+
+            # the nodes are not indexed yet. Before we can filter, ensure that
+            # the entire data set is loaded in the tree.
             # ensure model is fully loaded before we attempt any searching
             app.log_debug("Loading up all nodes in tree so we can search...")
             self.sourceModel().ensure_data_is_loaded()
             app.log_debug("...done")
 
+            if extends_query(self._search_pattern, pattern):
+                # the user kept typing: nodes with no match for the previous
+                # pattern can't match this one, only re-test the ones which did.
+                self._cache = dict((k, v) for (k, v) in previous_cache.iteritems() if v is False)
+            self._search_pattern = pattern
+
             # call base class
-            return QtGui.QSortFilterProxyModel.setFilterFixedString(self, pattern)
+            QtGui.QSortFilterProxyModel.setFilterFixedString(self, pattern)
+            self.search_applied.emit()
 
         else:
+            self._search_pattern = None
+            self._search_paths = None
+            self._search_parent_items = None
+            self._applied_search = None
             return QtGui.QSortFilterProxyModel.setFilterFixedString(self, "")
 
+    def _apply_search_paths(self, path_index, pattern, search_paths):
+        """
+        Applies a search resolved from the index of the source model.
+
+        :param path_index: Index the search was resolved from.
+        :param pattern: Search string.
+        :param search_paths: Set of the paths of the nodes to show.
+        """
+        self._search_parent_items = self.sourceModel().ensure_paths_are_loaded(search_paths)
+        self._search_paths = search_paths
+        self._search_pattern = pattern
+        self._applied_search = (path_index, pattern, search_paths)
+        QtGui.QSortFilterProxyModel.setFilterFixedString(self, pattern)
+        self.search_applied.emit()
+
+    def _cancel_search_task(self):
+        """
+        Stops the search running in the background, if any.
+        """
+        if self._search_task_id is not None:
+            self._bg_task_manager.stop_task(self._search_task_id)
+        self._search_task_id = None
+        self._pending_search = None
+
+    def _on_search_task_completed(self, uid, group, result):
+        """
+        Called when a background task has completed.
+
+        :param uid: Unique id of the task.
+        :param group: Group of the task.
+        :param result: For the search task, the set of the paths of the nodes to show.
+        """
+        if uid != self._search_task_id:
+            return
+        (path_index, pattern) = self._pending_search
+        self._search_task_id = None
+        self._pending_search = None
+        self._apply_search_paths(path_index, pattern, result)
+
+    def _on_search_task_failed(self, uid, group, msg, stack_trace):
+        """
+        Called when a background task has failed.
+
+        :param uid: Unique id of the task.
+        :param group: Group of the task.
+        :param msg: Error message.
+        :param stack_trace: Stack trace of the error.
+        """
+        if uid != self._search_task_id:
+            return
+        app = sgtk.platform.current_bundle()
+        app.log_warning("Background tree search failed, searching in the UI thread: %s" % msg)
+        (path_index, pattern) = self._pending_search
+        self._search_task_id = None
+        self._pending_search = None
+        self._apply_search_paths(path_index, pattern, find_search_paths(path_index, pattern))
+
+    def get_search_parent_items(self):
+        """
+        Returns the items to expand to show all the nodes matching the current search.
+
+        :returns: List of source model items, or None if all the items need
+                  to be expanded.
+        """
+        return self._search_parent_items
+
     def filterAcceptsRow(self, source_row, source_parent_idx):
         """
         Overridden from base class.
@@ -128,6 +329,10 @@ class SgEntityProxyModel(QtGui.QSortFilterProxyModel):
             item_model_idx = source_parent_idx.child(source_row, 0)
             item = model.itemFromIndex(item_model_idx)
 
+        if self._search_paths is not None:
+            # resolved from the index of the model
+            return model.get_item_path(item) in self._search_paths
+
         # evaluate recursive match
         return self._matching_r(search_exp, item)
 
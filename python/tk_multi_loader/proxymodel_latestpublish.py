@@ -42,12 +42,21 @@ class SgLatestPublishProxyModel(QtGui.QSortFilterProxyModel):
     def set_filter_by_type_ids(self, type_ids, show_folders):
         """
         Specify which type ids the publish model should allow through
+
+        :param type_ids: List of type ids to allow through.
+        :param show_folders: Whether folders should be shown.
+        :returns: False if the filters were already set and nothing changed.
         """
+        if self._valid_type_ids is not None and set(type_ids) == set(self._valid_type_ids) \
+                and show_folders == self._show_folders:
+            return False
+
         self._valid_type_ids = type_ids
         self._show_folders = show_folders
         # tell model to repush data
         self.invalidateFilter()
         self.filter_changed.emit()
+        return True
         
     def filterAcceptsRow(self, source_row, source_parent_idx):
         """
@@ -68,15 +77,11 @@ class SgLatestPublishProxyModel(QtGui.QSortFilterProxyModel):
         # first analyze any search filtering
         if self._search_filter:
             
-            # there is a search filter entered
-            field_data = shotgun_model.get_sanitized_data(current_item, SgLatestPublishModel.SEARCHABLE_NAME)
-                        
-            # all input we are getting from pyside is as unicode objects
-            # all data from shotgun is utf-8. By converting to utf-8,
-            # filtering on items containing unicode text also work.
-            search_str = self._search_filter.encode("UTF-8") 
+            # there is a search filter entered. The model resolves the items
+            # matching it through its search index.
+            search_matches = model.find_search_matches(self._search_filter)
             
-            if search_str.lower() not in field_data.lower(): 
+            if current_item.data(SgLatestPublishModel.SEARCH_KEY_ROLE) not in search_matches:
                 # item text is not matching search filter
                 return False
         
@@ -0,0 +1,77 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Collapsing of publish lists into the latest version of each publish.
+
+Note: this module doesn't depend on Toolkit so that it can be benchmarked
+outside of an engine, see benchmarks/publish_collapse_benchmark.py
+"""
+
+from collections import defaultdict
+from itertools import count, izip
+from operator import itemgetter
+
+
+def collapse_latest_versions(sg_data_list, publish_type_field):
+    """
+    Collapses a list of publishes into the latest version of each publish, where
+    publishes are grouped by name, type and task.
+
+    Rather than processing the publishes one by one, the grouping keys are extracted
+    into columns, the latest versions are picked in bulk and the counts are aggregated
+    per group rather than per publish.
+
+    The latest publishes are given a "task_uniqueness" flag, which is False when
+    more than one publish shares the same name and type.
+
+    :param sg_data_list: List of shotgun publish dictionaries, in ascending creation order.
+    :param publish_type_field: Field holding the publish type.
+    :returns: Tuple with:
+              - the list of latest publishes, in ascending creation order,
+              - a dict keyed by (name, type id) holding the number of publishes
+                with that name and type,
+              - a dict keyed by type id holding the number of latest publishes
+                of that type,
+              - a dict keyed by (name, type id, task id) holding the list of all the
+                versions of that publish, in ascending creation order.
+    """
+    if not sg_data_list:
+        return ([], {}, {}, {})
+
+    # extract the grouping columns
+    names = map(itemgetter("name"), sg_data_list)
+    type_ids = [x["id"] if x else None for x in map(itemgetter(publish_type_field), sg_data_list)]
+    task_ids = [x["id"] if x else None for x in map(itemgetter("task"), sg_data_list)]
+    keys = zip(names, type_ids, task_ids)
+
+    # rows are in ascending creation order, so the last row seen for
+    # each key is the latest version.
+    latest_indices = sorted(dict(izip(keys, count())).itervalues())
+
+    # group all the versions of each publish
+    version_index = defaultdict(list)
+    for (key, sg_item) in izip(keys, sg_data_list):
+        version_index[key].append(sg_item)
+
+    # the counts are then aggregated per group rather than per row
+    name_type_aggregates = defaultdict(int)
+    for (key, versions) in version_index.iteritems():
+        name_type_aggregates[key[:2]] += len(versions)
+
+    latest_data = map(sg_data_list.__getitem__, latest_indices)
+    latest_keys = map(keys.__getitem__, latest_indices)
+
+    type_id_aggregates = defaultdict(int)
+    for (sg_item, key) in izip(latest_data, latest_keys):
+        sg_item["task_uniqueness"] = name_type_aggregates[key[:2]] <= 1
+        type_id_aggregates[key[1]] += 1
+
+    return (latest_data, dict(name_type_aggregates), dict(type_id_aggregates), dict(version_index))
@@ -0,0 +1,242 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Compact representation of the publish data held by the model items.
+"""
+
+import copy
+
+# top level fields whose values are repeated across many publishes
+INTERNED_FIELDS = frozenset([
+    "type",
+    "name",
+    "sg_status_list",
+    "task.Task.sg_status_list",
+    "task.Task.content",
+    "version.Version.sg_status_list",
+])
+
+# keys of the Shotgun dictionaries which only link to an entity
+LINK_KEYS = frozenset(["type", "id", "name"])
+
+# marks a field missing from a record
+_MISSING = object()
+
+
+class _Interner(object):
+    """
+    Keeps a single copy of repeated values, such as the strings for type names,
+    user names, status codes and storage names, and the dictionaries linking
+    to entities, so that all the records can share them.
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._strings = {}
+        self._links = {}
+
+    def intern_string(self, value):
+        """
+        :param value: String to intern.
+        :returns: The shared copy of the string.
+        """
+        return self._strings.setdefault(value, value)
+
+    def intern_value(self, value):
+        """
+        Interns the strings and entity links found in a Shotgun value.
+
+        :param value: Shotgun field value.
+        :returns: Value which may be shared with other records and must not be modified.
+        """
+        if isinstance(value, dict):
+            if LINK_KEYS.issuperset(value):
+                # entity link, share a single dictionary per entity
+                key = (value.get("type"), value.get("id"), value.get("name"))
+                link = self._links.get(key)
+                if link is None:
+                    link = dict(
+                        (self.intern_string(k), self.intern_string(v) if isinstance(v, basestring) else v)
+                        for (k, v) in value.iteritems()
+                    )
+                    self._links[key] = link
+                return link
+            # e.g. the path field, only share its keys and nested links
+            return dict((self.intern_string(k), self.intern_value(v)) for (k, v) in value.iteritems())
+
+        if isinstance(value, list):
+            return [self.intern_value(x) for x in value]
+
+        return value
+
+
+class RecordLayout(object):
+    """
+    Field layout and shared values of a set of records, typically the records
+    of the data set loaded in a model. A new layout should be used whenever the
+    data set is rebuilt, so that the values which were shared by the previous
+    records are released along with them.
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        # field name -> index in the values tuple of the records
+        self.field_indices = {}
+        self.fields = []
+        self.interner = _Interner()
+
+
+class PublishRecord(object):
+    """
+    Read-mostly dictionary-like view of a publish, holding its values in a tuple
+    whose layout is shared by the records of the same RecordLayout, instead of a
+    dictionary per publish. Repeated values are shared between these records.
+
+    Records are pickled and copied as plain dictionaries.
+
+    Records support the dictionary methods used to read Shotgun data (get,
+    [], in, keys, iteritems...). Use to_dict() to get a full dictionary, e.g.
+    to pass to a hook as sg_publish_data.
+    """
+
+    __slots__ = ("_layout", "_values")
+
+    def __init__(self, sg_data, layout):
+        """
+        Constructor
+
+        :param sg_data: Shotgun publish dictionary.
+        :param layout: RecordLayout shared with the other records of the data set.
+        """
+        self._layout = layout
+        field_indices = layout.field_indices
+        interner = layout.interner
+        for field in sg_data:
+            if field not in field_indices:
+                field_indices[field] = len(layout.fields)
+                layout.fields.append(interner.intern_string(field))
+
+        values = [_MISSING] * len(layout.fields)
+        for (field, value) in sg_data.iteritems():
+            if field in INTERNED_FIELDS and isinstance(value, basestring):
+                value = interner.intern_string(value)
+            else:
+                value = interner.intern_value(value)
+            values[field_indices[field]] = value
+        self._values = tuple(values)
+
+    def get(self, field, default=None):
+        """
+        :param field: Field name.
+        :param default: Value to return if the record doesn't hold the field.
+        :returns: The field value.
+        """
+        idx = self._layout.field_indices.get(field)
+        if idx is None or idx >= len(self._values):
+            return default
+        value = self._values[idx]
+        return default if value is _MISSING else value
+
+    def __getitem__(self, field):
+        value = self.get(field, _MISSING)
+        if value is _MISSING:
+            raise KeyError(field)
+        return value
+
+    def __setitem__(self, field, value):
+        sg_data = dict(self.iteritems())
+        sg_data[field] = value
+        self._values = PublishRecord(sg_data, self._layout)._values
+
+    def __contains__(self, field):
+        return self.get(field, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, PublishRecord):
+            other = dict(other.iteritems())
+        return dict(self.iteritems()) == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # records are pickled (e.g. in the model cache files) and copied as plain
+        # dictionaries, so that nothing depends on this class to read them back.
+        return (dict, (dict(self.iteritems()),))
+
+    def __repr__(self):
+        return "<PublishRecord %r>" % dict(self.iteritems())
+
+    def keys(self):
+        """
+        :returns: List of the fields held by the record.
+        """
+        return [field for (field, _) in self.iteritems()]
+
+    def iteritems(self):
+        """
+        :returns: Iterator over the (field, value) pairs held by the record.
+        """
+        for (field, value) in zip(self._layout.fields, self._values):
+            if value is not _MISSING:
+                yield (field, value)
+
+    def items(self):
+        """
+        :returns: List of the (field, value) pairs held by the record.
+        """
+        return list(self.iteritems())
+
+    def to_dict(self):
+        """
+        :returns: A Shotgun dictionary for the publish, which can be freely modified.
+        """
+        return copy.deepcopy(dict(self.iteritems()))
+
+
+def as_dict(sg_data):
+    """
+    Returns the Shotgun dictionary for publish data held by a model item.
+
+    :param sg_data: PublishRecord, Shotgun dictionary or None.
+    :returns: Shotgun dictionary, or None.
+    """
+    if isinstance(sg_data, PublishRecord):
+        return sg_data.to_dict()
+    return sg_data
+
+
+def make_publish_record(sg_data, layout):
+    """
+    Returns a compact record for the given publish data.
+
+    :param sg_data: Shotgun dictionary or PublishRecord.
+    :param layout: RecordLayout of the data set the record is for.
+    :returns: PublishRecord.
+    """
+    if isinstance(sg_data, PublishRecord):
+        if sg_data._layout is layout:
+            return sg_data
+        # don't keep the values of a previous data set alive
+        sg_data = dict(sg_data.iteritems())
+    return PublishRecord(sg_data, layout)
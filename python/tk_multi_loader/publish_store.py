@@ -0,0 +1,413 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import datetime
+import cPickle
+
+import sgtk
+from sgtk.platform.qt import QtCore
+
+from . import utils, constants
+
+# import the shotgun_model module from the shotgun utils framework
+shotgun_model = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_model")
+shotgun_data = sgtk.platform.import_framework("tk-framework-shotgunutils", "shotgun_data")
+
+
+def _load_records(cache_path):
+    """
+    Reads the records stored on disk by a previous session. This is executed
+    in a worker thread.
+
+    :param cache_path: Path to the file holding the records.
+    :returns: (list of the fields of the records, dict of records keyed by publish id),
+              or None if there is no such file.
+    """
+    if not os.path.exists(cache_path):
+        return None
+    with open(cache_path, "rb") as fh:
+        return cPickle.load(fh)
+
+
+class PublishStore(QtCore.QObject):
+    """
+    Holds a single copy of each publish record, keyed by publish id, shared by
+    all the publish models.
+
+    The publish models only retrieve and cache the few fields they need to
+    decide which publishes to display (see STORE_KEY_FIELDS) and resolve the
+    full records through the store. The same publish is therefore only stored
+    once, whichever selections, views and modes it shows up in, and an update
+    to a record refreshes every view displaying it.
+
+    Records are kept with their date values as unix timestamps, the same way
+    the Shotgun models cache them. The records stored on disk by the previous
+    session are loaded in the background, and at most MAX_STORED_RECORDS records
+    are stored on disk, the ones used in the session first.
+    """
+
+    # fields retrieved by the publish model queries when they resolve their records through the store.
+    STORE_KEY_FIELDS = ["code", "name", "version_number", "task", "created_at", "updated_at"]
+
+    # maximum number of records retrieved by a single query
+    MAX_RECORDS_PER_QUERY = 500
+
+    # maximum number of records stored on disk
+    MAX_STORED_RECORDS = 20000
+
+    # version of the file format on disk
+    FORMAT_GENERATION = 1
+
+    # signal emitted with the ids of the records which were added or updated
+    records_updated = QtCore.Signal(list)
+
+    def __init__(self, parent, bg_task_manager):
+        """
+        Constructor
+
+        :param parent: Parent QObject.
+        :param bg_task_manager: Background task manager to use for the queries.
+        """
+        QtCore.QObject.__init__(self, parent)
+
+        app = sgtk.platform.current_bundle()
+        self._publish_entity_type = sgtk.util.get_published_file_entity_type(app.sgtk)
+        if self._publish_entity_type == "PublishedFile":
+            self._publish_type_field = "published_file_type"
+        else:
+            self._publish_type_field = "tank_type"
+
+        self._fields = [self._publish_type_field] + constants.PUBLISHED_FILES_FIELDS \
+                       + app.get_setting("additional_publish_fields") + ["updated_at"]
+
+        self._records = {}
+        self._pending_ids = set()
+        self._pending_requests = {}
+
+        # ids of the records used in this session, which are stored on disk first
+        self._used_ids = set()
+        # whether records were added or updated since they were loaded
+        self._modified = False
+
+        # while the records are loaded from disk, the records which are requested are
+        # only retrieved from Shotgun once the loading has completed, if they were not
+        # found on disk. These are keyed by publish id, with the updated_at value the
+        # record is needed for, or None if any record will do.
+        self._bg_task_manager = bg_task_manager
+        self._bg_task_manager.task_completed.connect(self._on_load_completed)
+        self._bg_task_manager.task_failed.connect(self._on_load_failed)
+        self._load_task_id = None
+        self._deferred_requests = {}
+
+        self._cache_path = os.path.join(
+            app.cache_location,
+            "publish_store_%s_%s.pickle" % (self._publish_entity_type, self.FORMAT_GENERATION)
+        )
+
+        self._sg_data_retriever = shotgun_data.ShotgunDataRetriever(self, bg_task_manager=bg_task_manager)
+        self._sg_data_retriever.work_completed.connect(self._on_worker_completed)
+        self._sg_data_retriever.work_failure.connect(self._on_worker_failed)
+        self._sg_data_retriever.start()
+
+    def get_key_fields(self, publish_type_field):
+        """
+        Returns the fields which the publish models need to retrieve themselves
+        when resolving their records through the store.
+
+        :param publish_type_field: Field holding the publish type.
+        :returns: List of field names.
+        """
+        return [publish_type_field] + self.STORE_KEY_FIELDS
+
+    def make_key_row(self, sg_data, publish_type_field):
+        """
+        Returns the subset of a record which the publish models cache themselves.
+
+        :param sg_data: Shotgun publish dictionary.
+        :param publish_type_field: Field holding the publish type.
+        :returns: Shotgun publish dictionary holding the key fields only, as well
+                  as any view specific values.
+        """
+        key_row = dict((field, sg_data.get(field)) for field in self.get_key_fields(publish_type_field))
+        for (field, value) in sg_data.iteritems():
+            if field in ("id", "type") or field not in self._fields:
+                key_row[field] = value
+        return key_row
+
+    def is_key_row(self, sg_data, publish_type_field):
+        """
+        Returns whether the given data only holds the key fields of a publish.
+
+        :param sg_data: Shotgun publish dictionary.
+        :param publish_type_field: Field holding the publish type.
+        :returns: True if full record needs to be resolved through the store.
+        """
+        key_fields = self.get_key_fields(publish_type_field)
+        return all(field in key_fields or field not in self._fields for field in sg_data)
+
+    def get_item_data(self, sg_data):
+        """
+        Returns the full data to associate with a model item.
+
+        :param sg_data: Shotgun publish dictionary, holding at least the publish id.
+        :returns: Copy of the record, including any view specific values found in
+                  sg_data, or None if the record is not known.
+        """
+        record = self._records.get(sg_data["id"])
+        if record is None:
+            return None
+        self._used_ids.add(sg_data["id"])
+        item_data = dict(sg_data)
+        item_data.update(record)
+        return item_data
+
+    def load(self):
+        """
+        Starts loading the records stored on disk by a previous session in the background.
+        """
+        self._load_task_id = self._bg_task_manager.add_task(_load_records, task_args=[self._cache_path])
+
+    def save(self):
+        """
+        Stores the records on disk for the next session, if they have changed.
+        """
+        app = sgtk.platform.current_bundle()
+        if self._load_task_id is not None:
+            # the records on disk haven't been loaded, don't overwrite them
+            app.log_debug("The publish store is still loading, not saving it.")
+            return
+        if not self._modified:
+            return
+
+        try:
+            cache_folder = os.path.dirname(self._cache_path)
+            if not os.path.exists(cache_folder):
+                os.makedirs(cache_folder)
+            with open(self._cache_path, "wb") as fh:
+                cPickle.dump((self._fields, self._get_records_to_store()), fh, cPickle.HIGHEST_PROTOCOL)
+            self._modified = False
+        except Exception, e:
+            app.log_warning("Could not save the publish store to %s: %s" % (self._cache_path, e))
+
+    def shut_down(self):
+        """
+        Stops any query in progress and saves the records to disk.
+        """
+        for (uid, _) in self._pending_requests.values():
+            self._sg_data_retriever.stop_work(uid)
+        self._pending_requests = {}
+        self._sg_data_retriever.stop()
+        self.save()
+        if self._load_task_id is not None:
+            self._bg_task_manager.stop_task(self._load_task_id)
+            self._load_task_id = None
+
+    def get(self, publish_id):
+        """
+        Returns the record for the given publish.
+
+        :param publish_id: Id of the publish.
+        :returns: Shotgun publish dictionary or None if the record is not known.
+                  This is shared by all the views and must not be modified.
+        """
+        return self._records.get(publish_id)
+
+    def resolve(self, sg_data_list):
+        """
+        Resolves the given rows into the full records they refer to, as far as these
+        are known. Rows for which the record is not known, or is older than the row,
+        are returned as they are and their records are requested from Shotgun.
+        records_updated is emitted once they are available.
+
+        :param sg_data_list: List of rows holding at least the key fields.
+        :returns: List of Shotgun publish dictionaries, one per row, in the same order.
+        """
+        resolved_data = []
+        missing_ids = []
+        for sg_data in sg_data_list:
+            updated_at = utils.get_unix_timestamp(sg_data.get("updated_at"))
+            record = self._records.get(sg_data["id"])
+            if record and record.get("updated_at") == updated_at:
+                self._used_ids.add(sg_data["id"])
+                resolved_data.append(dict(record))
+            else:
+                if self._load_task_id is not None:
+                    # this may be resolved by the records being loaded
+                    self._deferred_requests[sg_data["id"]] = updated_at
+                missing_ids.append(sg_data["id"])
+                resolved_data.append(sg_data)
+
+        self.fetch(missing_ids)
+        return resolved_data
+
+    def fetch(self, publish_ids):
+        """
+        Retrieves the records for the given publishes in the background.
+        records_updated is emitted once they are available.
+
+        :param publish_ids: List of publish ids.
+        """
+        if self._load_task_id is not None:
+            # wait until we know which records were stored on disk
+            for publish_id in publish_ids:
+                self._deferred_requests.setdefault(publish_id, None)
+            return
+
+        publish_ids = [x for x in publish_ids if x not in self._pending_ids]
+        for idx in range(0, len(publish_ids), self.MAX_RECORDS_PER_QUERY):
+            batch = publish_ids[idx:idx + self.MAX_RECORDS_PER_QUERY]
+            uid = self._sg_data_retriever.execute_find(
+                self._publish_entity_type,
+                [["id", "in", batch]],
+                self._fields
+            )
+            self._pending_requests[str(uid)] = (uid, batch)
+            self._pending_ids.update(batch)
+
+    def update(self, sg_data_list):
+        """
+        Adds or updates records in the store. The rows need to hold all the publish fields.
+
+        :param sg_data_list: List of Shotgun publish dictionaries.
+        """
+        updated_ids = []
+        for sg_data in sg_data_list:
+            record = {}
+            for (field, value) in sg_data.iteritems():
+                if isinstance(value, datetime.datetime):
+                    value = utils.get_unix_timestamp(value)
+                record[field] = value
+            # view specific data is not stored
+            record.pop("task_uniqueness", None)
+
+            if self._records.get(record["id"]) != record:
+                self._records[record["id"]] = record
+                updated_ids.append(record["id"])
+
+        if updated_ids:
+            self._modified = True
+            self.records_updated.emit(updated_ids)
+
+    def _get_records_to_store(self):
+        """
+        Returns the records to store on disk, at most MAX_STORED_RECORDS of them:
+        the records used in this session first, then the most recently updated ones.
+
+        :returns: dict of records keyed by publish id.
+        """
+        if len(self._records) <= self.MAX_STORED_RECORDS:
+            return self._records
+
+        publish_ids = sorted(
+            self._records,
+            key=lambda x: (x in self._used_ids, self._records[x].get("updated_at") or 0),
+            reverse=True
+        )
+        return dict((x, self._records[x]) for x in publish_ids[:self.MAX_STORED_RECORDS])
+
+    def _on_load_completed(self, uid, group, result):
+        """
+        Called when the records stored on disk have been loaded.
+
+        :param uid: Unique id of the task.
+        :param group: Group of the task.
+        :param result: Tuple of the fields and the records, or None.
+        """
+        if uid != self._load_task_id:
+            return
+        self._load_task_id = None
+
+        if result is not None:
+            (fields, records) = result
+            if fields == self._fields:
+                # records retrieved in this session are more recent. Records
+                # retrieved with a different configuration are discarded.
+                records.update(self._records)
+                self._records = records
+                if len(records) > self.MAX_STORED_RECORDS:
+                    # prune the records stored on disk
+                    self._modified = True
+            else:
+                self._modified = True
+
+        self._process_deferred_requests()
+
+    def _on_load_failed(self, uid, group, msg, stack_trace):
+        """
+        Called when the records stored on disk could not be loaded.
+
+        :param uid: Unique id of the task.
+        :param group: Group of the task.
+        :param msg: Error message.
+        :param stack_trace: Stack trace of the error.
+        """
+        if uid != self._load_task_id:
+            return
+        self._load_task_id = None
+
+        app = sgtk.platform.current_bundle()
+        app.log_warning("Could not load the publish store from %s: %s" % (self._cache_path, msg))
+        # don't keep a corrupted file around
+        self._modified = True
+
+        self._process_deferred_requests()
+
+    def _process_deferred_requests(self):
+        """
+        Notifies the views about the requested records which were found on disk,
+        and retrieves the others from Shotgun.
+        """
+        (deferred_requests, self._deferred_requests) = (self._deferred_requests, {})
+
+        found_ids = []
+        missing_ids = []
+        for (publish_id, updated_at) in deferred_requests.iteritems():
+            record = self._records.get(publish_id)
+            if record and (updated_at is None or record.get("updated_at") == updated_at):
+                found_ids.append(publish_id)
+            else:
+                missing_ids.append(publish_id)
+
+        if found_ids:
+            self.records_updated.emit(found_ids)
+        self.fetch(missing_ids)
+
+    def _on_worker_completed(self, uid, request_type, data):
+        """
+        Signaled whenever the data retriever completes a query.
+
+        :param uid: Unique id of the request.
+        :param request_type: Type of the request.
+        :param data: Dictionary holding the query results.
+        """
+        request = self._pending_requests.pop(str(shotgun_model.sanitize_qt(uid)), None)
+        if request is None:
+            return
+
+        self._pending_ids.difference_update(request[1])
+        self.update(data["sg"])
+
+    def _on_worker_failed(self, uid, msg):
+        """
+        Signaled whenever a query fails.
+
+        :param uid: Unique id of the request.
+        :param msg: Error message.
+        """
+        request = self._pending_requests.pop(str(shotgun_model.sanitize_qt(uid)), None)
+        if request is None:
+            return
+
+        # allow the records to be requested again
+        self._pending_ids.difference_update(request[1])
+
+        app = sgtk.platform.current_bundle()
+        app.log_warning("Could not retrieve publish records: %s" % msg)
@@ -0,0 +1,167 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Substring search index for the names displayed in the views.
+
+Note: this module doesn't depend on Toolkit.
+"""
+
+from collections import defaultdict
+
+
+def normalize_search_text(text):
+    """
+    Normalizes a string for case insensitive matching.
+
+    All input we are getting from pyside is as unicode objects and
+    all data from shotgun is utf-8, so both end up as lower case unicode.
+
+    :param text: Unicode or utf-8 encoded string, or None.
+    :returns: Lower case unicode string.
+    """
+    if not text:
+        return u""
+    if isinstance(text, str):
+        text = text.decode("utf-8", "replace")
+    return text.lower()
+
+
+def extends_query(previous_query, query):
+    """
+    Checks if a query narrows down a previous one, i.e. if everything matching
+    the query also matches the previous query. This is the case when characters
+    have been added at the end of the previous query, as users type.
+
+    :param previous_query: Previous query, or None.
+    :param query: New query.
+    :returns: True if the query extends the previous one.
+    """
+    if not previous_query or not query:
+        return False
+    return normalize_search_text(query).startswith(normalize_search_text(previous_query))
+
+
+class SearchIndex(object):
+    """
+    Index of the searchable text of a set of keys, resolving which keys contain
+    a given string without testing every one of them.
+
+    The text of each key is broken into trigrams. The keys containing a query of
+    three characters or more are found by intersecting the keys of its trigrams,
+    starting with the rarest one, and only these candidates are tested against
+    the full query. Shorter queries are tested against the normalized text of all
+    the keys.
+    """
+
+    GRAM_SIZE = 3
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._texts = {}
+        self._keys_per_gram = defaultdict(set)
+        # bumped whenever the index content changes
+        self.generation = 0
+
+    def __len__(self):
+        return len(self._texts)
+
+    def __contains__(self, key):
+        return key in self._texts
+
+    def clear(self):
+        """
+        Removes all the keys from the index.
+        """
+        self._texts = {}
+        self._keys_per_gram = defaultdict(set)
+        self.generation += 1
+
+    def add(self, key, text):
+        """
+        Adds a key to the index, replacing any text previously indexed for it.
+
+        :param key: Hashable key.
+        :param text: Searchable text for the key.
+        """
+        text = normalize_search_text(text)
+        if self._texts.get(key) == text:
+            return
+        self.remove(key)
+        self._texts[key] = text
+        for gram in self._get_grams(text):
+            self._keys_per_gram[gram].add(key)
+        self.generation += 1
+
+    def remove(self, key):
+        """
+        Removes a key from the index.
+
+        :param key: Key to remove, ignored if not indexed.
+        """
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+        for gram in self._get_grams(text):
+            keys = self._keys_per_gram.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_per_gram[gram]
+        self.generation += 1
+
+    def find(self, query, candidates=None):
+        """
+        Returns the keys whose text contains the query, case insensitive.
+
+        :param query: Unicode or utf-8 encoded string.
+        :param candidates: Optional set of keys to restrict the search to, e.g. the
+                           keys matching a query this one extends.
+        :returns: Set of keys.
+        """
+        query = normalize_search_text(query)
+        if candidates is not None:
+            texts = self._texts
+            return set(key for key in candidates if key in texts and query in texts[key])
+
+        if not query:
+            return set(self._texts)
+
+        if len(query) < self.GRAM_SIZE:
+            return set(key for (key, text) in self._texts.iteritems() if query in text)
+
+        # intersect starting from the smallest key sets
+        key_sets = []
+        for gram in self._get_grams(query):
+            keys = self._keys_per_gram.get(gram)
+            if not keys:
+                return set()
+            key_sets.append(keys)
+        key_sets.sort(key=len)
+
+        candidates = set(key_sets[0])
+        for keys in key_sets[1:]:
+            candidates &= keys
+            if not candidates:
+                return candidates
+
+        # the trigrams may appear in a different order in the text
+        texts = self._texts
+        return set(key for key in candidates if query in texts[key])
+
+    def _get_grams(self, text):
+        """
+        :param text: Normalized text.
+        :returns: Set of the trigrams of the text.
+        """
+        size = self.GRAM_SIZE
+        return set(text[x:x + size] for x in xrange(len(text) - size + 1))
@@ -0,0 +1,355 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import hashlib
+from collections import OrderedDict
+
+import sgtk
+from sgtk.platform.qt import QtCore, QtGui
+
+from . import utils
+
+task_manager = sgtk.platform.import_framework("tk-framework-shotgunutils", "task_manager")
+
+# compositing function for each style, working on QImages so that they can
+# run in background threads, and the largest size the source thumbnail is
+# displayed at in the composited thumbnail.
+STYLES = {
+    "publish": (utils.create_publish_thumbnail_image, 512, 400),
+    "folder": (utils.create_folder_thumbnail_image, 460, 280),
+}
+
+# size of the thumbnails of the history view, and of the user thumbnails overlayed on them
+USER_PUBLISH_THUMB_SIZE = 75
+USER_THUMB_SIZE = 30
+
+# bump this whenever the compositing functions change, to invalidate the files on disk.
+STYLE_GENERATION = 1
+
+
+def _get_source_key(path):
+    """
+    :param path: Path to a source thumbnail, or None.
+    :returns: Cache key for the source thumbnail, or None if it can't be read.
+    """
+    if not path:
+        return None
+    try:
+        with open(path, "rb") as fh:
+            source_hash = hashlib.md5(fh.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+    return "%s_%s" % (source_hash, STYLE_GENERATION)
+
+
+def _composite_thumbnail(cache_root, style, path):
+    """
+    Returns the composited thumbnail for a source thumbnail, read from disk if it
+    was composited before, composited and saved to disk otherwise. The source
+    thumbnail is decoded no larger than it is displayed.
+
+    Only QImages are used so that this can run in a background thread.
+
+    :param cache_root: Directory where composited thumbnails are stored.
+    :param style: Compositing style, one of the keys of STYLES.
+    :param path: Path to the source thumbnail on disk.
+    :returns: Composited QImage.
+    """
+    (composite_fn, width, height) = STYLES[style]
+
+    key = _get_source_key(path)
+    if key is None:
+        # can't read the source thumbnail, composite a null image
+        return composite_fn(QtGui.QImage())
+
+    cache_path = os.path.join(cache_root, style, key[:2], "%s.png" % key)
+    if os.path.exists(cache_path):
+        composited_image = QtGui.QImage(cache_path)
+        if not composited_image.isNull():
+            return composited_image
+
+    composited_image = composite_fn(utils.load_thumbnail_image(path, width, height))
+    try:
+        cache_dir = os.path.dirname(cache_path)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        # write to a temporary file first so that other sessions never
+        # see a partially written file.
+        tmp_path = "%s.%s.%s.tmp" % (cache_path, os.getpid(), id(composited_image))
+        if composited_image.save(tmp_path, "PNG"):
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            os.rename(tmp_path, cache_path)
+    except (IOError, OSError):
+        # caching is only an optimization
+        pass
+    return composited_image
+
+
+def _composite_user_publish_thumbnail(publish_path, user_path, default_image):
+    """
+    Composites a user thumbnail over a publish thumbnail, both decoded no larger
+    than they are displayed.
+
+    Only QImages are used so that this can run in a background thread.
+
+    :param publish_path: Path to the publish thumbnail on disk, or None.
+    :param user_path: Path to the user thumbnail on disk, or None.
+    :param default_image: QImage to use when there is no publish thumbnail.
+    :returns: Composited QImage.
+    """
+    if publish_path:
+        publish_image = utils.load_thumbnail_image(publish_path,
+                                                   USER_PUBLISH_THUMB_SIZE,
+                                                   USER_PUBLISH_THUMB_SIZE,
+                                                   QtCore.Qt.KeepAspectRatioByExpanding)
+    else:
+        publish_image = default_image
+
+    user_image = None
+    if user_path:
+        user_image = utils.load_thumbnail_image(user_path,
+                                                USER_THUMB_SIZE,
+                                                USER_THUMB_SIZE,
+                                                QtCore.Qt.KeepAspectRatioByExpanding)
+
+    return utils.create_user_publish_thumbnail_image(publish_image, user_image)
+
+
+class CompositedThumbnailCache(QtCore.QObject):
+    """
+    Composites the thumbnails displayed by the publish models.
+
+    The decoding of the source thumbnails, scaled down to the size they are
+    displayed at, and the compositing run on a pool of background threads,
+    working on QImages, and only the final conversion to a pixmap happens in
+    the main thread. The publish and folder thumbnails are also cached on disk
+    as png files, keyed by the md5 hash of the source thumbnail and the
+    compositing style, so that the same source thumbnail is only ever composited
+    once. An in-memory LRU cache, bounded by the number of bytes of pixel data
+    it holds, sits in front of the disk cache.
+    """
+
+    def __init__(self, parent, cache_root, max_threads, max_memory_bytes):
+        """
+        Constructor
+
+        :param parent: Parent QObject.
+        :param cache_root: Directory where composited thumbnails are stored.
+        :param max_threads: Number of background threads compositing thumbnails. When 0,
+                            thumbnails are composited in the main thread.
+        :param max_memory_bytes: Maximum number of bytes of pixel data held by the
+                                 composited thumbnails kept in memory.
+        """
+        QtCore.QObject.__init__(self, parent)
+
+        self._cache_root = cache_root
+        self._memory_cache = OrderedDict()
+        self._max_memory_bytes = max_memory_bytes
+        self._memory_bytes = 0
+        # (memory cache key, callbacks) for each task in progress
+        self._pending_tasks = {}
+        # ids of the tasks in progress, keyed by memory cache key
+        self._pending_task_ids = {}
+
+        self._task_manager = None
+        if max_threads > 0:
+            self._task_manager = task_manager.BackgroundTaskManager(self,
+                                                                    start_processing=True,
+                                                                    max_threads=max_threads)
+            self._task_manager.task_completed.connect(self._on_task_completed)
+            self._task_manager.task_failed.connect(self._on_task_failed)
+
+    def shut_down(self):
+        """
+        Stops all the compositing in progress and releases the composited thumbnails.
+        """
+        self._pending_tasks = {}
+        self._pending_task_ids = {}
+        self._memory_cache = OrderedDict()
+        self._memory_bytes = 0
+        if self._task_manager:
+            self._task_manager.shut_down()
+
+    def get_cached_thumbnail(self, style, path):
+        """
+        Returns the composited thumbnail for a source thumbnail if it is held in memory.
+
+        :param style: Compositing style, one of the keys of STYLES.
+        :param path: Path to the source thumbnail on disk.
+        :returns: QPixmap, or None if the thumbnail needs to be requested.
+        """
+        return self._get_from_memory((style, path))
+
+    def log_memory_usage(self):
+        """
+        Reports the memory used by the composited thumbnails in the debug log.
+        """
+        app = sgtk.platform.current_bundle()
+        app.log_debug(
+            "Composited thumbnails: %d held in memory, %.1f MB of %.1f MB used."
+            % (len(self._memory_cache), self._memory_bytes / 1048576.0, self._max_memory_bytes / 1048576.0)
+        )
+
+    def get_thumbnail(self, style, path):
+        """
+        Returns the composited thumbnail for a source thumbnail, compositing
+        it in the main thread if needed.
+
+        :param style: Compositing style, one of the keys of STYLES.
+        :param path: Path to the source thumbnail on disk.
+        :returns: QPixmap
+        """
+        pixmap = self._get_from_memory((style, path))
+        if pixmap is None:
+            pixmap = QtGui.QPixmap.fromImage(_composite_thumbnail(self._cache_root, style, path))
+            self._add_to_memory((style, path), pixmap)
+        return pixmap
+
+    def request_thumbnail(self, style, path, callback):
+        """
+        Requests the composited thumbnail for a source thumbnail. It is composited in
+        the background if not cached, the callback is then called in the main thread.
+
+        :param style: Compositing style, one of the keys of STYLES.
+        :param path: Path to the source thumbnail on disk.
+        :param callback: Callable taking the composited QPixmap, or None if the
+                         thumbnail could not be composited.
+        """
+        key = (style, path)
+        pixmap = self._get_from_memory(key)
+        if pixmap is not None:
+            callback(pixmap)
+        elif not self._task_manager:
+            callback(self.get_thumbnail(style, path))
+        elif key in self._pending_task_ids:
+            # already being composited
+            self._pending_tasks[self._pending_task_ids[key]][1].append(callback)
+        else:
+            task_id = self._task_manager.add_task(_composite_thumbnail,
+                                                  task_args=[self._cache_root, style, path])
+            self._pending_tasks[task_id] = (key, [callback])
+            self._pending_task_ids[key] = task_id
+
+    def get_user_publish_thumbnail(self, publish_path, user_path, default_image):
+        """
+        Returns a user thumbnail composited over a publish thumbnail, compositing
+        it in the main thread.
+
+        :param publish_path: Path to the publish thumbnail on disk, or None.
+        :param user_path: Path to the user thumbnail on disk, or None.
+        :param default_image: QImage to use when there is no publish thumbnail.
+        :returns: QPixmap
+        """
+        return QtGui.QPixmap.fromImage(_composite_user_publish_thumbnail(publish_path, user_path, default_image))
+
+    def request_user_publish_thumbnail(self, publish_path, user_path, default_image, callback):
+        """
+        Requests a user thumbnail composited over a publish thumbnail. It is
+        composited in the background, the callback is then called in the main thread.
+
+        :param publish_path: Path to the publish thumbnail on disk, or None.
+        :param user_path: Path to the user thumbnail on disk, or None.
+        :param default_image: QImage to use when there is no publish thumbnail.
+        :param callback: Callable taking the composited QPixmap, or None if the
+                         thumbnail could not be composited.
+        """
+        if not self._task_manager:
+            callback(self.get_user_publish_thumbnail(publish_path, user_path, default_image))
+            return
+        task_id = self._task_manager.add_task(_composite_user_publish_thumbnail,
+                                              task_args=[publish_path, user_path, default_image])
+        self._pending_tasks[task_id] = (None, [callback])
+
+    def _get_from_memory(self, key):
+        """
+        :param key: Memory cache key.
+        :returns: The cached QPixmap, or None.
+        """
+        if not key or not key[1]:
+            return None
+        pixmap = self._memory_cache.pop(key, None)
+        if pixmap is not None:
+            # most recently used last
+            self._memory_cache[key] = pixmap
+        return pixmap
+
+    def _add_to_memory(self, key, pixmap):
+        """
+        :param key: Memory cache key.
+        :param pixmap: QPixmap to cache.
+        """
+        if not key or not key[1]:
+            # the source thumbnail is not identified
+            return
+        previous_pixmap = self._memory_cache.pop(key, None)
+        if previous_pixmap is not None:
+            self._memory_bytes -= self._get_pixmap_bytes(previous_pixmap)
+        self._memory_cache[key] = pixmap
+        self._memory_bytes += self._get_pixmap_bytes(pixmap)
+
+        num_evicted = 0
+        while self._memory_bytes > self._max_memory_bytes and len(self._memory_cache) > 1:
+            (_, evicted_pixmap) = self._memory_cache.popitem(last=False)
+            self._memory_bytes -= self._get_pixmap_bytes(evicted_pixmap)
+            num_evicted += 1
+        if num_evicted:
+            self.log_memory_usage()
+
+    def _get_pixmap_bytes(self, pixmap):
+        """
+        :param pixmap: QPixmap
+        :returns: Number of bytes of pixel data held by the pixmap.
+        """
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+    def _on_task_completed(self, uid, group, result):
+        """
+        Called in the main thread when a thumbnail has been composited.
+
+        :param uid: Unique id of the task.
+        :param group: Group of the task.
+        :param result: Composited QImage.
+        """
+        if uid not in self._pending_tasks:
+            return
+        (key, callbacks) = self._pending_tasks.pop(uid)
+        self._pending_task_ids.pop(key, None)
+
+        # the only conversion done in the main thread
+        pixmap = QtGui.QPixmap.fromImage(result)
+        self._add_to_memory(key, pixmap)
+        for callback in callbacks:
+            callback(pixmap)
+
+        if key is not None and not self._pending_task_ids:
+            # a burst of requests has been processed
+            self.log_memory_usage()
+
+    def _on_task_failed(self, uid, group, msg, stack_trace):
+        """
+        Called in the main thread when a thumbnail could not be composited.
+
+        :param uid: Unique id of the task.
+        :param group: Group of the task.
+        :param msg: Error message.
+        :param stack_trace: Stack trace of the error.
+        """
+        if uid not in self._pending_tasks:
+            return
+        (key, callbacks) = self._pending_tasks.pop(uid)
+        self._pending_task_ids.pop(key, None)
+        app = sgtk.platform.current_bundle()
+        app.log_warning("Could not composite thumbnail: %s" % msg)
+
+        # let the requesters know that no thumbnail is coming
+        for callback in callbacks:
+            callback(None)
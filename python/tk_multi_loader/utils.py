@@ -9,6 +9,9 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import sgtk
+import calendar
+import datetime
+import time
 from sgtk.platform.qt import QtCore, QtGui
 
 
@@ -59,43 +62,127 @@ class ResizeEventFilter(QtCore.QObject):
         return False
 
 
+def get_rows_near_viewport(view, margin):
+    """
+    Returns the rows of a list view which are displayed in its viewport, or
+    within a margin above or below it.
+
+    The rows of a list view are laid out from top to bottom in order, so the first
+    row reaching the area is found with a binary search and only the rows in the
+    area are looked at, however many rows the view holds.
+
+    :param view: QListView to inspect.
+    :param margin: Height in pixels of the area above and below the viewport.
+    :returns: List of row numbers, the rows in the viewport first.
+    """
+    model = view.model()
+    num_rows = model.rowCount() if model else 0
+    if num_rows == 0:
+        return []
+
+    viewport_rect = view.viewport().rect()
+    top = viewport_rect.top() - margin
+    bottom = viewport_rect.bottom() + margin
+
+    (low, high) = (0, num_rows)
+    while low < high:
+        middle = (low + high) // 2
+        if view.visualRect(model.index(middle, 0)).bottom() < top:
+            low = middle + 1
+        else:
+            high = middle
+
+    visible_rows = []
+    nearby_rows = []
+    for row in xrange(low, num_rows):
+        rect = view.visualRect(model.index(row, 0))
+        if rect.top() > bottom:
+            break
+        if rect.intersects(viewport_rect):
+            visible_rows.append(row)
+        else:
+            nearby_rows.append(row)
+    return visible_rows + nearby_rows
+
+
+def load_thumbnail_image(path, width, height, aspect_mode=QtCore.Qt.KeepAspectRatio):
+    """
+    Loads a thumbnail from disk, decoding it no larger than needed to display it
+    at the given size, rather than decoding it at full resolution and then
+    scaling it down. Images smaller than the given size are loaded as is.
+
+    Only QImages are used, so this can be called from a background thread.
+
+    :param path: Path to the thumbnail on disk.
+    :param width: Width the thumbnail is displayed at.
+    :param height: Height the thumbnail is displayed at.
+    :param aspect_mode: How the thumbnail is fitted into the display size, either
+                        QtCore.Qt.KeepAspectRatio or QtCore.Qt.KeepAspectRatioByExpanding.
+    :returns: QImage, which is null if the thumbnail could not be loaded.
+    """
+    reader = QtGui.QImageReader(path)
+    size = reader.size()
+    if size.isValid():
+        if aspect_mode == QtCore.Qt.KeepAspectRatioByExpanding:
+            too_large = size.width() > width and size.height() > height
+        else:
+            too_large = size.width() > width or size.height() > height
+        if too_large:
+            # supported by the jpeg reader at a fraction of the cost of a full decode
+            reader.setScaledSize(size.scaled(width, height, aspect_mode))
+    return reader.read()
+
+
 def create_overlayed_user_publish_thumbnail(publish_pixmap, user_pixmap):
     """
     Creates a sqaure 75x75 thumbnail with an optional overlayed pixmap.
     """
+    publish_image = publish_pixmap.toImage()
+    user_image = user_pixmap.toImage() if user_pixmap is not None else None
+    return QtGui.QPixmap.fromImage(create_user_publish_thumbnail_image(publish_image, user_image))
+
+
+def create_user_publish_thumbnail_image(publish_image, user_image):
+    """
+    Creates a sqaure 75x75 thumbnail with an optional overlayed image.
+
+    Only QImages are used, so this can be called from a background thread.
+
+    :param publish_image: QImage containing the publish thumbnail
+    :param user_image: QImage containing the user thumbnail, or None
+    :returns: QImage with a 75x75 px image
+    """
     # create a 100x100 base image
-    base_image = QtGui.QPixmap(75, 75)
+    base_image = QtGui.QImage(75, 75, QtGui.QImage.Format_ARGB32_Premultiplied)
     base_image.fill(QtCore.Qt.transparent)
 
     painter = QtGui.QPainter(base_image)
     painter.setRenderHint(QtGui.QPainter.Antialiasing)
 
     # scale down the thumb
-    if not publish_pixmap.isNull():
-        thumb_scaled = publish_pixmap.scaled(
+    if not publish_image.isNull():
+        thumb_scaled = publish_image.scaled(
             75, 75,
             QtCore.Qt.KeepAspectRatioByExpanding,
             QtCore.Qt.SmoothTransformation)
 
         # now composite the thumbnail on top of the base image
         # bottom align it to make it look nice
-        thumb_img = thumb_scaled.toImage()
-        brush = QtGui.QBrush(thumb_img)
+        brush = QtGui.QBrush(thumb_scaled)
         painter.save()
         painter.setBrush(brush)
         painter.setPen(QtGui.QPen(QtCore.Qt.NoPen))
         painter.drawRect(0, 0, 75, 75)
         painter.restore()
 
-    if user_pixmap and not user_pixmap.isNull():
+    if user_image is not None and not user_image.isNull():
 
         # overlay the user picture on top of the thumbnail
-        user_scaled = user_pixmap.scaled(
+        user_scaled = user_image.scaled(
             30, 30,
             QtCore.Qt.KeepAspectRatioByExpanding,
             QtCore.Qt.SmoothTransformation)
-        user_img = user_scaled.toImage()
-        user_brush = QtGui.QBrush(user_img)
+        user_brush = QtGui.QBrush(user_scaled)
         painter.save()
         painter.translate(42, 42)
         painter.setBrush(user_brush)
@@ -117,6 +204,24 @@ def create_overlayed_folder_thumbnail(image):
     :param image: QImage containing a thumbnail
     :returns: QPixmap with a 512x400 px image
     """
+    return QtGui.QPixmap.fromImage(create_folder_thumbnail_image(image))
+
+
+# folder graphic the folder thumbnails are composited on, only loaded once
+_folder_base_image = None
+
+
+def create_folder_thumbnail_image(image):
+    """
+    Given a shotgun thumbnail, create a folder icon
+    with the thumbnail composited on top. This will return a
+    512x400 image object.
+
+    Only QImages are used, so this can be called from a background thread.
+
+    :param image: QImage containing a thumbnail
+    :returns: QImage with a 512x400 px image
+    """
     # folder icon size
     CANVAS_WIDTH = 512
     CANVAS_HEIGHT = 400
@@ -132,22 +237,22 @@ def create_overlayed_folder_thumbnail(image):
     # looks like there are some pyside related memory issues here relating to
     # referencing a resource and then operating on it. Just to be sure, make
     # make a full copy of the resource before starting to manipulate.
-    base_image = QtGui.QPixmap(":/res/folder_512x400.png")
+    global _folder_base_image
+    if _folder_base_image is None:
+        _folder_base_image = QtGui.QImage(":/res/folder_512x400.png").convertToFormat(
+            QtGui.QImage.Format_ARGB32_Premultiplied
+        )
+    base_image = _folder_base_image.copy()
 
-    # now attempt to load the image
-    # pixmap will be a null pixmap if load fails
-    thumb = QtGui.QPixmap.fromImage(image)
+    if not image.isNull():
 
-    if not thumb.isNull():
-
-        thumb_scaled = thumb.scaled(MAX_THUMB_WIDTH,
+        thumb_scaled = image.scaled(MAX_THUMB_WIDTH,
                                     MAX_THUMB_HEIGHT,
                                     QtCore.Qt.KeepAspectRatio,
                                     QtCore.Qt.SmoothTransformation)
 
         # now composite the thumbnail
-        thumb_img = thumb_scaled.toImage()
-        brush = QtGui.QBrush(thumb_img)
+        brush = QtGui.QBrush(thumb_scaled)
 
         painter = QtGui.QPainter(base_image)
         painter.setRenderHint(QtGui.QPainter.Antialiasing)
@@ -186,31 +291,40 @@ def create_overlayed_publish_thumbnail(image):
     :param image: QImage containing a thumbnail
     :returns: QPixmap with a 512x400 px image
     """
+    return QtGui.QPixmap.fromImage(create_publish_thumbnail_image(image))
+
+
+def create_publish_thumbnail_image(image):
+    """
+    Given a shotgun thumbnail, create a publish icon
+    with the thumbnail composited onto a centered otherwise empty canvas.
+    This will return a 512x400 image object.
+
+    Only QImages are used, so this can be called from a background thread.
+
+    :param image: QImage containing a thumbnail
+    :returns: QImage with a 512x400 px image
+    """
 
     CANVAS_WIDTH = 512
     CANVAS_HEIGHT = 400
     CORNER_RADIUS = 10
 
     # get the 512 base image
-    base_image = QtGui.QPixmap(CANVAS_WIDTH, CANVAS_HEIGHT)
+    base_image = QtGui.QImage(CANVAS_WIDTH, CANVAS_HEIGHT, QtGui.QImage.Format_ARGB32_Premultiplied)
     base_image.fill(QtCore.Qt.transparent)
 
-    # now attempt to load the image
-    # pixmap will be a null pixmap if load fails
-    thumb = QtGui.QPixmap.fromImage(image)
-
-    if not thumb.isNull():
+    if not image.isNull():
 
         # scale it down to fit inside a frame of maximum 512x512
-        thumb_scaled = thumb.scaled(CANVAS_WIDTH,
+        thumb_scaled = image.scaled(CANVAS_WIDTH,
                                     CANVAS_HEIGHT,
                                     QtCore.Qt.KeepAspectRatio,
                                     QtCore.Qt.SmoothTransformation)
 
         # now composite the thumbnail on top of the base image
         # bottom align it to make it look nice
-        thumb_img = thumb_scaled.toImage()
-        brush = QtGui.QBrush(thumb_img)
+        brush = QtGui.QBrush(thumb_scaled)
 
         painter = QtGui.QPainter(base_image)
         painter.setRenderHint(QtGui.QPainter.Antialiasing)
@@ -319,3 +433,81 @@ def resolve_filters(filters):
                 resolved_filter.append(field)
         resolved_filters.append(resolved_filter)
     return resolved_filters
+
+
+def get_deep_link_filters(link_field, entity_type, filters):
+    """
+    Translates filters on a given entity type into filters on publishes linked to
+    entities of that type. This allows a single publish query to return all the
+    publishes for entities matching the filters, without having to retrieve the
+    entities first. For example:
+
+    [["sg_sequence", "is", {"type": "Sequence", "id": 23}]]
+
+    for Shot entities linked via the entity field becomes
+
+    [["entity", "type_is", "Shot"],
+     ["entity.Shot.sg_sequence", "is", {"type": "Sequence", "id": 23}]]
+
+    :param link_field: Publish field linking to the entities, e.g. 'entity' or 'task'.
+    :param entity_type: Entity type the filters apply to, e.g. 'Shot'.
+    :param filters: List of standard Shotgun API filters on the entity type.
+                    Supports complex filters as well.
+    :returns: List of filters to apply to the publish query or None if the
+              filters cannot be translated.
+    """
+    deep_filters = _get_deep_link_filters_r(link_field, entity_type, filters)
+    if deep_filters is None:
+        return None
+
+    if link_field == "entity":
+        # the entity field can link to any entity type, only keep the requested one.
+        deep_filters.insert(0, [link_field, "type_is", entity_type])
+    else:
+        deep_filters.insert(0, [link_field, "is_not", None])
+
+    return deep_filters
+
+
+def _get_deep_link_filters_r(link_field, entity_type, filters):
+    """
+    Recursive implementation of :meth:`get_deep_link_filters`.
+
+    :returns: List of translated filters or None if the filters cannot be translated.
+    """
+    deep_filters = []
+    for sg_filter in filters:
+        if isinstance(sg_filter, dict):
+            sub_filters = _get_deep_link_filters_r(link_field, entity_type, sg_filter.get("filters", []))
+            if sub_filters is None:
+                return None
+            deep_filters.append({
+                "filter_operator": sg_filter["filter_operator"],
+                "filters": sub_filters
+            })
+        elif isinstance(sg_filter, (list, tuple)) and len(sg_filter) >= 2 and isinstance(sg_filter[0], basestring):
+            if "." in sg_filter[0]:
+                # already a deep link, these cannot be chained reliably.
+                return None
+            deep_field = "%s.%s.%s" % (link_field, entity_type, sg_filter[0])
+            deep_filters.append([deep_field] + list(sg_filter[1:]))
+        else:
+            # unknown filter syntax
+            return None
+
+    return deep_filters
+
+
+def get_unix_timestamp(value):
+    """
+    Converts a Shotgun date time value into a unix timestamp. The Shotgun models
+    cache date time values as unix timestamps, so these are returned as is.
+
+    :param value: datetime, unix timestamp or None.
+    :returns: Unix timestamp or None.
+    """
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            return float(time.mktime(value.timetuple()))
+        return float(calendar.timegm(value.utctimetuple()))
+    return value